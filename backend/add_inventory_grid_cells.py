@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# Adds produce_inventory.grid_cell (spatial bucket for /api/produce/available distance
+# queries) to an existing database and fills it for rows that already have coordinates.
+from sqlalchemy import inspect, text
+
+from app.db.database import engine
+from app.utils.geo import grid_cell
+
+with engine.connect() as conn:
+    columns = {column["name"] for column in inspect(conn).get_columns("produce_inventory")}
+    if "grid_cell" not in columns:
+        conn.execute(text("ALTER TABLE produce_inventory ADD COLUMN grid_cell INTEGER"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_produce_inventory_grid_cell ON produce_inventory (grid_cell)"))
+
+    rows = conn.execute(text(
+        "SELECT id, latitude, longitude FROM produce_inventory "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).all()
+    for row_id, latitude, longitude in rows:
+        conn.execute(
+            text("UPDATE produce_inventory SET grid_cell = :cell WHERE id = :id"),
+            {"cell": grid_cell(latitude, longitude), "id": row_id}
+        )
+    conn.commit()
+    print(f"Assigned grid cells to {len(rows)} inventory rows")
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Checkout waits kept for the percentile; older ones only count towards the totals
+CHECKOUT_SAMPLE_SIZE = 1000
+
+
+class PoolMetrics:
+    """Checkout latency, exhaustion and slow-query counts for one engine."""
+
+    def __init__(self, slow_query_ms: float):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._waits: deque[float] = deque(maxlen=CHECKOUT_SAMPLE_SIZE)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._counters = {
+            "checkouts": 0,
+            "exhausted": 0,  # Every connection was in use, so the checkout had to queue
+            "timeouts": 0,  # Queued longer than pool_timeout
+            "slow_queries": 0,
+        }
+
+    def record_checkout(self, seconds: float, exhausted: bool) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+            self._counters["checkouts"] += 1
+            self._counters["exhausted"] += exhausted
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._counters["timeouts"] += 1
+
+    def record_query(self, seconds: float, statement: str) -> None:
+        if seconds * 1000 < self.slow_query_ms:
+            return
+        with self._lock:
+            self._counters["slow_queries"] += 1
+        logger.warning(f"Slow query ({seconds * 1000:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            checkouts = self._counters["checkouts"]
+            return {
+                **self._counters,
+                "checkout_ms_avg": round(1000 * self._wait_total / checkouts, 2) if checkouts else None,
+                "checkout_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else None,
+                "checkout_ms_max": round(1000 * self._wait_max, 2),
+                "slow_query_ms": self.slow_query_ms,
+            }
+
+
+class _TimedCheckout:
+    """Times each checkout; there is no pool event that fires before one starts waiting."""
+
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        exhausted = self.checkedin() == 0 and -1 < self._max_overflow <= self.overflow()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.record_timeout()
+            raise
+        if self.metrics:
+            self.metrics.record_checkout(time.perf_counter() - started, exhausted)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine: Engine, metrics: PoolMetrics) -> None:
+    """Report engine's checkouts and slow statements to metrics (pass async_engine.sync_engine)."""
+    if isinstance(engine.pool, _TimedCheckout):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        metrics.record_query(time.perf_counter() - conn.info["query_started"].pop(), statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(context):
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+
+
+def pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
@@ -1,19 +1,59 @@
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import uvicorn
 from app.core.config import setup_cors
-from app.routes import route, views, user, produce, requests, delivery, webhooks, analytics, menurithm
+from app.db.database import async_engine
+from app.routes import route, views, user, produce, requests, delivery, webhooks, analytics, menurithm, jobs
+from app.services.geocode import flush_geocode_hits
+from app.services.http_clients import http_clients
+from app.services.optimization_jobs import TooManyJobs, optimization_jobs
+from app.services.request_geocoding import request_geocoder
+from app.services.request_matching import request_matcher
+from app.services.solver_pool import SolverBusy, SolverTimeout, solver_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled upstream clients live for the whole process and close on shutdown
+    await http_clients.start()
+    await solver_pool.start()
+    await request_geocoder.start()
+    await request_matcher.start()
+    yield
+    await request_matcher.close()
+    await request_geocoder.close()
+    await optimization_jobs.close()
+    await flush_geocode_hits()
+    await solver_pool.close()
+    await http_clients.close()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Routecast API",
     description="AI-powered Route & Logistics Optimizer with Produce Management",
     version="1.0.0",
-    redirect_slashes=False  # Prevent 307 redirects that break CORS
+    redirect_slashes=False,  # Prevent 307 redirects that break CORS
+    lifespan=lifespan
 )
 
 # Add CORS, middleware, etc
 setup_cors(app)
 
+@app.exception_handler(SolverBusy)
+async def solver_busy_handler(request: Request, exc: SolverBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(SolverTimeout)
+async def solver_timeout_handler(request: Request, exc: SolverTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.exception_handler(TooManyJobs)
+async def too_many_jobs_handler(request: Request, exc: TooManyJobs):
+    return JSONResponse(status_code=429, content={"detail": str(exc)})
+
 # Register routers
 app.include_router(views.router)
 app.include_router(route.router)
@@ -24,6 +64,7 @@ app.include_router(delivery.router)
 app.include_router(webhooks.router)
 app.include_router(analytics.router)
 app.include_router(menurithm.router)
+app.include_router(jobs.router)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, Integer, String, Float, func
+from app.db.database import Base
+
+class GeocodeCacheEntry(Base):
+    __tablename__ = "geocode_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    normalized_address = Column(String, unique=True, index=True, nullable=False)
+    address = Column(String, nullable=False)  # First spelling we geocoded
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, func, Text, Boolean
+from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, func, Text, Boolean, event
 from sqlalchemy.orm import relationship
 from app.db.database import Base
+from app.models.user import User
+from app.utils import geo
 
 class ProduceInventory(Base):
     __tablename__ = "produce_inventory"
@@ -17,6 +19,7 @@ class ProduceInventory(Base):
     location = Column(String, nullable=False)  # Farm/warehouse location
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    grid_cell = Column(Integer, nullable=True, index=True)  # Spatial bucket of latitude/longitude
     organic = Column(Boolean, default=False)
     description = Column(Text, nullable=True)
     is_available = Column(Boolean, default=True)
@@ -24,7 +27,13 @@ class ProduceInventory(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationship
-    seller = relationship("User", back_populates="produce_inventory")
+    seller = relationship(User, back_populates="produce_inventory")
+
+@event.listens_for(ProduceInventory, "before_insert")
+@event.listens_for(ProduceInventory, "before_update")
+def set_inventory_grid_cell(mapper, connection, target):
+    # Kept in step with the coordinates on every write, whichever code path made it
+    target.grid_cell = geo.grid_cell(target.latitude, target.longitude)
 
 class ProduceRequest(Base):
     __tablename__ = "produce_requests"
@@ -49,8 +58,8 @@ class ProduceRequest(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    restaurant = relationship("User", foreign_keys=[restaurant_id], back_populates="restaurant_requests")
-    assigned_seller = relationship("User", foreign_keys=[assigned_seller_id], back_populates="assigned_requests")
+    restaurant = relationship(User, foreign_keys=[restaurant_id], back_populates="restaurant_requests")
+    assigned_seller = relationship(User, foreign_keys=[assigned_seller_id], back_populates="assigned_requests")
 
 class DeliveryRoute(Base):
     __tablename__ = "delivery_routes"
@@ -69,7 +78,7 @@ class DeliveryRoute(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    seller = relationship("User", back_populates="delivery_routes")
+    seller = relationship(User, back_populates="delivery_routes")
     stops = relationship("DeliveryStop", back_populates="route")
 
 class DeliveryStop(Base):
@@ -1,22 +1,53 @@
-from pydantic import BaseModel
-from typing import List, Dict
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal
+from datetime import datetime
 
 class Stop(BaseModel):
     address: str
+    window_start: datetime | None = None  # Delivery window; enables time-window routing
+    window_end: datetime | None = None
+    location: tuple[float, float] | None = None  # [lng, lat] if already known; skips geocoding
 
 class RouteRequest(BaseModel):
     pickup: str
+    pickup_location: tuple[float, float] | None = None  # [lng, lat] if already known; skips geocoding
     stops: List[Stop]
+    # Local-search budget, defaults to env setting; capped at OPTIMIZER_MAX_BUDGET_SECONDS
+    time_budget_seconds: float | None = Field(None, gt=0)
+    departure_time: datetime | None = None  # Defaults to now when stops have windows
+    routing_backend: Literal["osrm", "osrm-local", "offline"] | None = None  # Defaults to env setting
+    include_geometry: bool = False  # Attach the road geometry of the optimized route
 
 class OptimizedStop(BaseModel):
     address: str
     location: tuple[float, float]  # [lng, lat]
     eta_minutes: int
     distance_miles: float
+    arrival_time: datetime | None = None
 
 class RouteResponse(BaseModel):
     stops: list[OptimizedStop]
     total_eta: int
     total_distance_miles: float
     map_url: str | None = None
+    initial_distance_miles: float | None = None  # Before local-search improvement
+    improvement_percent: float | None = None
+    unscheduled_stops: list[str] = []  # Stops that cannot be reached inside their window
+    ungeocoded_stops: list[str] = []  # Stop addresses the geocoder could not resolve
+    routing_backend: str | None = None  # Backend whose matrix was used (after any fallback)
+    solver: str | None = None  # held_karp, local_search or time_windows
+    optimal: bool | None = None  # True when the stop order is proven shortest
+    geometry: dict | None = None  # GeoJSON LineString when include_geometry is set
 
+class BatchRouteRequest(BaseModel):
+    routes: List[RouteRequest] = Field(..., min_length=1, max_length=200)
+
+class BatchRouteResult(BaseModel):
+    index: int  # Position in the request's routes list
+    route: RouteResponse | None = None
+    error: str | None = None
+
+class BatchRouteResponse(BaseModel):
+    results: list[BatchRouteResult]
+    succeeded: int
+    failed: int
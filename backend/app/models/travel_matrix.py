@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, Integer, String, Float, Index, UniqueConstraint, func
+from app.db.database import Base
+
+class TravelLeg(Base):
+    __tablename__ = "travel_legs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)  # Routing backend that produced the leg
+    origin_key = Column(String, nullable=False)  # Quantized "lng,lat"
+    destination_key = Column(String, nullable=False)
+    distance_meters = Column(Float, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("source", "origin_key", "destination_key", name="uq_travel_leg"),
+        Index("ix_travel_legs_source_origin", "source", "origin_key"),
+    )
@@ -1,51 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, select
 from typing import List
 from datetime import datetime, timedelta
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.models.produce import ProduceRequest, ProduceInventory, DeliveryRoute, DeliveryStop
-from app.models.user import User
 from app.schemas.produce import DemandAnalytics, SellerPerformanceAnalytics
-from app.utils.auth_dependency import verify_firebase_token
+from app.utils.principal import Principal, get_principal
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 @router.get("/demand", response_model=List[DemandAnalytics])
 async def get_demand_analytics(
     days: int = Query(30, description="Number of days to analyze"),
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Get produce demand trends and analytics"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
     start_date = datetime.now() - timedelta(days=days)
     
     # Aggregate demand data by produce type
-    demand_data = db.query(
+    demand_data = (await db.execute(select(
         ProduceRequest.produce_type,
         func.count(ProduceRequest.id).label('total_requests'),
         func.avg(ProduceRequest.quantity_needed).label('average_quantity'),
         func.avg(ProduceRequest.max_price_per_unit).label('average_price')
-    ).filter(
+    ).where(
         ProduceRequest.created_at >= start_date
-    ).group_by(ProduceRequest.produce_type).all()
+    ).group_by(ProduceRequest.produce_type))).all()
 
     # Calculate trends (simplified - would need more complex analysis in production)
     analytics = []
     for item in demand_data:
         # Compare with previous period to determine trend
         prev_period_start = start_date - timedelta(days=days)
-        prev_requests = db.query(func.count(ProduceRequest.id)).filter(
+        prev_requests = await db.scalar(select(func.count(ProduceRequest.id)).where(
             and_(
                 ProduceRequest.produce_type == item.produce_type,
                 ProduceRequest.created_at >= prev_period_start,
                 ProduceRequest.created_at < start_date
             )
-        ).scalar() or 0
+        )) or 0
         
         current_requests = item.total_requests
         trend = "stable"
@@ -66,27 +62,24 @@ async def get_demand_analytics(
 
 @router.get("/routes/efficiency")
 async def get_route_efficiency_metrics(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Get route efficiency metrics"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
     # Get route statistics
-    route_stats = db.query(
+    route_stats = (await db.execute(select(
         func.count(DeliveryRoute.id).label('total_routes'),
         func.avg(DeliveryRoute.total_distance_miles).label('avg_distance'),
         func.avg(DeliveryRoute.estimated_duration_minutes).label('avg_duration'),
         func.sum(DeliveryRoute.total_distance_miles).label('total_distance')
-    ).filter(DeliveryRoute.seller_id == user.id).first()
+    ).where(DeliveryRoute.seller_id == user.id))).first()
 
     # Get completion rate
-    completed_routes = db.query(func.count(DeliveryRoute.id)).filter(
+    completed_routes = await db.scalar(select(func.count(DeliveryRoute.id)).where(
         DeliveryRoute.seller_id == user.id,
         DeliveryRoute.status == "completed"
-    ).scalar() or 0
+    )) or 0
 
     total_routes = route_stats.total_routes or 0
     completion_rate = (completed_routes / total_routes * 100) if total_routes > 0 else 0
@@ -102,13 +95,10 @@ async def get_route_efficiency_metrics(
 
 @router.get("/seller/performance", response_model=SellerPerformanceAnalytics)
 async def get_seller_performance(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get seller performance analytics"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can view performance analytics")
@@ -117,32 +107,32 @@ async def get_seller_performance(
     start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
     # Count completed deliveries
-    completed_deliveries = db.query(func.count(DeliveryRoute.id)).filter(
+    completed_deliveries = await db.scalar(select(func.count(DeliveryRoute.id)).where(
         DeliveryRoute.seller_id == seller.id,
         DeliveryRoute.status == "completed",
         DeliveryRoute.created_at >= start_of_month
-    ).scalar() or 0
+    )) or 0
 
     # Calculate on-time delivery rate (simplified)
-    on_time_deliveries = db.query(func.count(DeliveryStop.id)).join(DeliveryRoute).filter(
+    on_time_deliveries = await db.scalar(select(func.count(DeliveryStop.id)).join(DeliveryRoute).where(
         DeliveryRoute.seller_id == seller.id,
         DeliveryStop.status == "delivered",
         DeliveryRoute.created_at >= start_of_month
-    ).scalar() or 0
+    )) or 0
 
-    total_deliveries = db.query(func.count(DeliveryStop.id)).join(DeliveryRoute).filter(
+    total_deliveries = await db.scalar(select(func.count(DeliveryStop.id)).join(DeliveryRoute).where(
         DeliveryRoute.seller_id == seller.id,
         DeliveryRoute.created_at >= start_of_month
-    ).scalar() or 0
+    )) or 0
 
     on_time_rate = (on_time_deliveries / total_deliveries * 100) if total_deliveries > 0 else 0
 
     # Calculate revenue (simplified - would need actual pricing data)
-    fulfilled_requests = db.query(ProduceRequest).filter(
+    fulfilled_requests = (await db.scalars(select(ProduceRequest).where(
         ProduceRequest.assigned_seller_id == seller.id,
         ProduceRequest.status == "completed",
         ProduceRequest.created_at >= start_of_month
-    ).all()
+    ))).all()
 
     revenue = sum([
         (req.quantity_needed * (req.max_price_per_unit or 0)) 
@@ -159,16 +149,13 @@ async def get_seller_performance(
 
 @router.get("/market/insights")
 async def get_market_insights(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Get market insights and pricing trends"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
     # Get top requested produce types
-    top_produce = db.query(
+    top_produce = (await db.execute(select(
         ProduceRequest.produce_type,
         func.count(ProduceRequest.id).label('request_count'),
         func.avg(ProduceRequest.max_price_per_unit).label('avg_price')
@@ -176,15 +163,15 @@ async def get_market_insights(
         ProduceRequest.produce_type
     ).order_by(
         func.count(ProduceRequest.id).desc()
-    ).limit(10).all()
+    ).limit(10))).all()
 
     # Get supply vs demand by produce type
     supply_demand = []
     for produce in top_produce:
-        supply_count = db.query(func.count(ProduceInventory.id)).filter(
+        supply_count = await db.scalar(select(func.count(ProduceInventory.id)).where(
             ProduceInventory.produce_type == produce.produce_type,
             ProduceInventory.is_available == True
-        ).scalar() or 0
+        )) or 0
 
         supply_demand.append({
             "produce_type": produce.produce_type,
@@ -200,10 +187,10 @@ async def get_market_insights(
             "high_demand_low_supply": [p for p in supply_demand if p["supply_demand_ratio"] < 0.5],
             "oversupplied": [p for p in supply_demand if p["supply_demand_ratio"] > 2.0]
         },
-        "total_active_requests": db.query(func.count(ProduceRequest.id)).filter(
+        "total_active_requests": await db.scalar(select(func.count(ProduceRequest.id)).where(
             ProduceRequest.status == "pending"
-        ).scalar() or 0,
-        "total_available_inventory": db.query(func.count(ProduceInventory.id)).filter(
+        )) or 0,
+        "total_available_inventory": await db.scalar(select(func.count(ProduceInventory.id)).where(
             ProduceInventory.is_available == True
-        ).scalar() or 0
+        )) or 0
     }
@@ -1,38 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
-from app.db.database import get_db
+from datetime import timedelta, timezone
+from app.db.database import get_async_db
 from app.models.produce import DeliveryRoute, DeliveryStop, ProduceRequest
-from app.models.user import User
+from app.models.route import RouteResponse
 from app.schemas.produce import (
+    DailyPlanCreate,
+    DailyPlanResponse,
     DeliveryRouteCreate, 
     DeliveryRouteResponse,
-    DeliveryStopResponse
+    DeliveryStopResponse,
+    FleetRouteCreate,
+    RouteEditResponse,
+    RouteStopInsert
 )
-from app.utils.auth_dependency import verify_firebase_token
-from app.services.route_optimizer import optimize_route_from_requests
+from app.utils.principal import Principal, get_principal
+from app.services.daily_planner import DAILY_PLAN_MAX_STOPS, as_utc, plan_deliveries, planned_request_ids
+from app.services.geocode import geocode_address, geocode_many
+from app.services.optimizer import get_travel_matrix, route_stops_from_order
+from app.services.route_cache import route_cache_headers
+from app.services.route_edits import insert_stop, remove_stop, schedule_order
+from app.services.route_optimizer import (
+    delivery_route_request,
+    optimize_route_from_requests,
+    optimized_stop_rows,
+    stored_coordinates
+)
+from app.services.solver_pool import capped_budget, solver_pool
+from app.services.vrp import demand_in_kg, solve_cvrp
 
 router = APIRouter(prefix="/api/routes", tags=["routes"])
 
 @router.post("/from-requests", response_model=DeliveryRouteResponse)
 async def create_route_from_requests(
     route_data: DeliveryRouteCreate,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Generate route from selected produce requests"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can create delivery routes")
 
     # Verify all requests are assigned to this seller
-    requests = db.query(ProduceRequest).filter(
+    requests = (await db.scalars(select(ProduceRequest).where(
         ProduceRequest.id.in_(route_data.request_ids),
         ProduceRequest.assigned_seller_id == seller.id
-    ).all()
+    ))).all()
     
     if len(requests) != len(route_data.request_ids):
         raise HTTPException(status_code=400, detail="Some requests are not assigned to you")
@@ -47,133 +64,449 @@ async def create_route_from_requests(
         delivery_date=route_data.delivery_date
     )
     db.add(new_route)
-    db.commit()
-    db.refresh(new_route)
+    await db.commit()
+    await db.refresh(new_route)
 
     # Create delivery stops and optimize route
-    await create_optimized_stops(new_route, requests, db)
+    unscheduled = await create_optimized_stops(new_route, requests, db)
+    await db.refresh(new_route)
+    new_route.unscheduled_request_ids = unscheduled
 
     return new_route
 
-async def create_optimized_stops(route: DeliveryRoute, requests: List[ProduceRequest], db: Session):
-    """Create and optimize delivery stops for a route"""
-    # Use the existing route optimizer
-    from app.models.route import RouteRequest, Stop
-    
-    stops_data = [Stop(address=req.delivery_address) for req in requests]
-    route_request = RouteRequest(pickup=route.pickup_location, stops=stops_data)
+@router.post("/from-requests/fleet", response_model=List[DeliveryRouteResponse])
+async def create_fleet_routes_from_requests(
+    route_data: FleetRouteCreate,
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
+):
+    """Split selected produce requests across several vehicles by capacity"""
     
-    # Get optimized route
-    optimized = await optimize_route_from_requests(route_request)
+    if seller.role != "farmer":
+        raise HTTPException(status_code=403, detail="Only farmers can create delivery routes")
+
+    requests = (await db.scalars(select(ProduceRequest).where(
+        ProduceRequest.id.in_(route_data.request_ids),
+        ProduceRequest.assigned_seller_id == seller.id
+    ))).all()
     
-    # Create delivery stops in optimized order
-    for i, optimized_stop in enumerate(optimized.stops):
-        # Find matching request by address
-        matching_request = next(
-            (req for req in requests if req.delivery_address == optimized_stop.address),
-            None
+    if len(requests) != len(route_data.request_ids):
+        raise HTTPException(status_code=400, detail="Some requests are not assigned to you")
+
+    if route_data.pickup_latitude is not None and route_data.pickup_longitude is not None:
+        pickup_coords = (route_data.pickup_longitude, route_data.pickup_latitude)
+    else:
+        pickup_coords = await geocode_address(route_data.pickup_location)
+    if not pickup_coords:
+        raise HTTPException(status_code=400, detail="Failed to geocode pickup location")
+
+    pending = [
+        req.delivery_address for req in requests
+        if req.delivery_latitude is None or req.delivery_longitude is None
+    ]
+    locations = await geocode_many(pending)
+
+    entries = [{"address": route_data.pickup_location, "location": pickup_coords}]
+    failed = []
+    for req in requests:
+        if req.delivery_latitude is not None and req.delivery_longitude is not None:
+            coords = (req.delivery_longitude, req.delivery_latitude)
+        else:
+            coords = locations.get(req.delivery_address)
+        if not coords:
+            failed.append(req.delivery_address)
+        elif req.delivery_latitude is None or req.delivery_longitude is None:
+            req.delivery_longitude, req.delivery_latitude = coords
+        entries.append({"address": req.delivery_address, "location": coords})
+
+    if failed:
+        raise HTTPException(status_code=400, detail=f"Could not geocode: {', '.join(failed)}")
+
+    matrix = await get_travel_matrix([entry["location"] for entry in entries])
+    demands = [0.0] + [demand_in_kg(req.quantity_needed, req.unit) for req in requests]
+
+    try:
+        vehicle_routes = await solver_pool.run(
+            solve_cvrp,
+            matrix["distances"],
+            demands,
+            route_data.vehicle_count,
+            route_data.vehicle_capacity,
+            capped_budget(route_data.time_budget_seconds)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    created_routes = []
+    for vehicle_number, order in enumerate(vehicle_routes, start=1):
+        stops, total_distance, total_eta = route_stops_from_order(
+            entries, order, matrix["distances"], matrix["durations"]
+        )
+        new_route = DeliveryRoute(
+            seller_id=seller.id,
+            route_name=f"{route_data.route_name} - Vehicle {vehicle_number}",
+            pickup_location=route_data.pickup_location,
+            pickup_latitude=pickup_coords[1],
+            pickup_longitude=pickup_coords[0],
+            total_distance_miles=total_distance,
+            estimated_duration_minutes=total_eta,
+            delivery_date=route_data.delivery_date
         )
-        
-        if matching_request:
-            stop = DeliveryStop(
-                route_id=route.id,
-                request_id=matching_request.id,
-                stop_order=i + 1,
-                address=optimized_stop.address,
-                latitude=optimized_stop.location[1],
-                longitude=optimized_stop.location[0],
-                estimated_arrival=None  # Could calculate based on route timing
+        db.add(new_route)
+        await db.flush()
+
+        for stop_order, idx in enumerate(order, start=1):
+            req = requests[idx - 1]
+            db.add(DeliveryStop(
+                route_id=new_route.id,
+                request_id=req.id,
+                stop_order=stop_order,
+                address=req.delivery_address,
+                latitude=entries[idx]["location"][1],
+                longitude=entries[idx]["location"][0],
+                estimated_arrival=route_data.delivery_date + timedelta(
+                    minutes=stops[stop_order].eta_minutes
+                )
+            ))
+        created_routes.append(new_route)
+
+    await db.commit()
+    for new_route in created_routes:
+        await db.refresh(new_route)
+
+    return created_routes
+
+@router.post("/daily-plan", response_model=DailyPlanResponse)
+async def create_daily_plan(
+    plan_data: DailyPlanCreate,
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
+):
+    """Cluster all of the day's accepted requests into routes and optimize each one"""
+    
+    if seller.role != "farmer":
+        raise HTTPException(status_code=403, detail="Only farmers can create delivery routes")
+
+    pickup_coords = stored_coordinates(plan_data.pickup_latitude, plan_data.pickup_longitude)
+    if pickup_coords is None:
+        pickup_coords = await geocode_address(plan_data.pickup_location)
+    if not pickup_coords:
+        raise HTTPException(status_code=400, detail="Failed to geocode pickup location")
+
+    return await plan_deliveries(
+        db,
+        as_utc(plan_data.delivery_date),
+        {seller.id: (plan_data.pickup_location, pickup_coords)},
+        plan_data.route_name,
+        plan_data.max_stops_per_route or DAILY_PLAN_MAX_STOPS,
+        plan_data.vehicle_capacity
+    )
+
+async def create_optimized_stops(
+    route: DeliveryRoute,
+    requests: List[ProduceRequest],
+    db: AsyncSession,
+    optimized: RouteResponse | None = None
+):
+    """Create delivery stops for a route, optimizing it unless an optimized result is given"""
+    if optimized is None:
+        optimized = await optimize_route_from_requests(
+            delivery_route_request(
+                route.pickup_location,
+                route.delivery_date,
+                requests,
+                stored_coordinates(route.pickup_latitude, route.pickup_longitude)
             )
-            db.add(stop)
+        )
+    
+    # Create delivery stops in optimized order
+    rows, unmatched = optimized_stop_rows(route.id, optimized, requests)
+    for row in rows:
+        db.add(DeliveryStop(**row))
     
     # Update route with optimization results
+    if route.pickup_latitude is None or route.pickup_longitude is None:
+        route.pickup_longitude, route.pickup_latitude = optimized.stops[0].location
     route.total_distance_miles = optimized.total_distance_miles
     route.estimated_duration_minutes = optimized.total_eta
     
-    db.commit()
+    await db.commit()
+
+    # Requests that could not be geocoded or served inside their window
+    return [req.id for req in unmatched]
 
 @router.get("/active", response_model=List[DeliveryRouteResponse])
 async def get_active_routes(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get active delivery routes for seller"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    routes = db.query(DeliveryRoute).filter(
+    routes = await db.scalars(select(DeliveryRoute).where(
         DeliveryRoute.seller_id == seller.id,
         DeliveryRoute.status.in_(["planned", "active"])
-    ).all()
+    ))
     
-    return routes
+    return routes.all()
 
 @router.get("/all", response_model=List[DeliveryRouteResponse])
 async def get_all_routes(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get all delivery routes for seller (including completed)"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    routes = db.query(DeliveryRoute).filter(
+    routes = await db.scalars(select(DeliveryRoute).where(
         DeliveryRoute.seller_id == seller.id
-    ).order_by(DeliveryRoute.created_at.desc()).all()
+    ).order_by(DeliveryRoute.created_at.desc()))
     
-    return routes
+    return routes.all()
 
 @router.post("/{route_id}/optimize")
 async def re_optimize_route(
     route_id: int,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Re-optimize existing route"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    route = db.query(DeliveryRoute).filter(
+    route = await db.scalar(select(DeliveryRoute).where(
         DeliveryRoute.id == route_id,
         DeliveryRoute.seller_id == seller.id
-    ).first()
+    ))
     
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
 
     # Get current stops and requests
-    stops = db.query(DeliveryStop).filter(DeliveryStop.route_id == route_id).all()
+    stops = (await db.scalars(select(DeliveryStop).where(DeliveryStop.route_id == route_id))).all()
     request_ids = [stop.request_id for stop in stops]
-    requests = db.query(ProduceRequest).filter(ProduceRequest.id.in_(request_ids)).all()
+    requests = (await db.scalars(select(ProduceRequest).where(ProduceRequest.id.in_(request_ids)))).all()
 
     # Delete old stops
     for stop in stops:
-        db.delete(stop)
+        await db.delete(stop)
     
     # Re-create optimized stops
-    await create_optimized_stops(route, requests, db)
+    unscheduled = await create_optimized_stops(route, requests, db)
+    response.headers.update(route_cache_headers())
+
+    return {
+        "message": "Route re-optimized successfully",
+        "unscheduled_request_ids": unscheduled
+    }
+
+async def get_seller_route(route_id: int, db: AsyncSession, seller: Principal) -> DeliveryRoute:
+    route = await db.scalar(select(DeliveryRoute).where(
+        DeliveryRoute.id == route_id,
+        DeliveryRoute.seller_id == seller.id
+    ))
     
-    return {"message": "Route re-optimized successfully"}
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return route
+
+def route_stops_query(route_id: int):
+    """A route's stops in order, with their requests loaded for the window checks"""
+    return select(DeliveryStop).where(
+        DeliveryStop.route_id == route_id
+    ).options(selectinload(DeliveryStop.request)).order_by(DeliveryStop.stop_order)
+
+def route_departure(route: DeliveryRoute):
+    departure = route.delivery_date
+    return departure if departure.tzinfo else departure.replace(tzinfo=timezone.utc)
+
+async def route_stop_entries(route: DeliveryRoute, stops: List[DeliveryStop]) -> List[dict]:
+    """Optimizer entries (pickup first) from stored coordinates; geocodes only what is missing"""
+    if route.pickup_latitude is None or route.pickup_longitude is None:
+        pickup_coords = await geocode_address(route.pickup_location)
+        if not pickup_coords:
+            raise HTTPException(status_code=400, detail="Failed to geocode pickup location")
+        route.pickup_longitude, route.pickup_latitude = pickup_coords
+
+    missing = [stop.address for stop in stops if stop.latitude is None or stop.longitude is None]
+    locations = await geocode_many(missing)
+    for stop in stops:
+        if stop.latitude is None or stop.longitude is None:
+            coords = locations.get(stop.address)
+            if not coords:
+                raise HTTPException(status_code=400, detail=f"Could not geocode: {stop.address}")
+            stop.longitude, stop.latitude = coords
+
+    entries = [{"address": route.pickup_location, "location": (route.pickup_longitude, route.pickup_latitude)}]
+    for stop in stops:
+        entries.append({
+            "address": stop.address,
+            "location": (stop.longitude, stop.latitude),
+            "window_start": stop.request.delivery_window_start if stop.request else None,
+            "window_end": stop.request.delivery_window_end if stop.request else None
+        })
+    return entries
+
+def apply_stop_order(
+    route: DeliveryRoute,
+    stops: List[DeliveryStop],
+    entries: List[dict],
+    order: List[int],
+    matrix: dict,
+    fixed: int
+) -> List[int]:
+    """Write new stop_order/ETA values (entries[i] is stops[i - 1]); returns ids of changed stops"""
+    scheduled, total_distance, total_eta = schedule_order(
+        entries, order, matrix, route_departure(route)
+    )
+
+    updated = []
+    for position, (idx, planned) in enumerate(zip(order, scheduled[1:]), start=1):
+        stop = stops[idx - 1]
+        changed = stop.stop_order != position
+        stop.stop_order = position
+        # Stops already under way keep the ETA they were given
+        if position > fixed and stop.estimated_arrival != planned.arrival_time:
+            stop.estimated_arrival = planned.arrival_time
+            changed = True
+        if changed and stop.id is not None:
+            updated.append(stop.id)
+
+    route.total_distance_miles = total_distance
+    route.estimated_duration_minutes = total_eta
+    return updated
+
+def fixed_stop_count(stops: List[DeliveryStop]) -> int:
+    """Leading stops that are delivered, failed or en route; edits never move them"""
+    fixed = 0
+    for stop in stops:
+        if stop.status == "pending":
+            break
+        fixed += 1
+    return fixed
+
+@router.post("/{route_id}/stops", response_model=RouteEditResponse)
+async def insert_route_stop(
+    route_id: int,
+    stop_data: RouteStopInsert,
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
+):
+    """Insert one request at its cheapest position without re-planning the route"""
+    route = await get_seller_route(route_id, db, seller)
+
+    request = await db.scalar(select(ProduceRequest).where(
+        ProduceRequest.id == stop_data.request_id,
+        ProduceRequest.assigned_seller_id == route.seller_id
+    ))
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found or not assigned to you")
+    if request.status != "accepted":
+        raise HTTPException(status_code=400, detail="Only accepted requests can be added to a route")
+
+    stops = list(await db.scalars(route_stops_query(route_id)))
+    if any(stop.request_id == request.id for stop in stops):
+        raise HTTPException(status_code=400, detail="Request is already on this route")
+    # Same rule as daily planning: a request on any live route is already planned
+    if await db.scalar(planned_request_ids().where(DeliveryStop.request_id == request.id).limit(1)) is not None:
+        raise HTTPException(status_code=409, detail="Request is already on another route")
+
+    new_stop = DeliveryStop(
+        route_id=route.id,
+        request_id=request.id,
+        stop_order=len(stops) + 1,
+        address=request.delivery_address,
+        latitude=request.delivery_latitude,
+        longitude=request.delivery_longitude
+    )
+    new_stop.request = request
+    all_stops = stops + [new_stop]
+
+    entries = await route_stop_entries(route, all_stops)
+    if request.delivery_latitude is None:
+        request.delivery_longitude, request.delivery_latitude = new_stop.longitude, new_stop.latitude
+    matrix = await get_travel_matrix([entry["location"] for entry in entries])
+
+    fixed = fixed_stop_count(stops)
+    order = insert_stop(
+        entries,
+        list(range(1, len(stops) + 1)),
+        len(all_stops),
+        matrix,
+        route_departure(route),
+        fixed
+    )
+    if order is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Request cannot be reached inside its delivery window on this route"
+        )
+
+    db.add(new_stop)
+    updated = apply_stop_order(route, all_stops, entries, order, matrix, fixed)
+    await db.commit()
+    await db.refresh(route)
+    await db.refresh(new_stop)
+
+    return {
+        "route": route,
+        "stops": sorted(all_stops, key=lambda stop: stop.stop_order),
+        "updated_stop_ids": sorted(set(updated + [new_stop.id]))
+    }
+
+@router.delete("/{route_id}/stops/{request_id}", response_model=RouteEditResponse)
+async def remove_route_stop(
+    route_id: int,
+    request_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
+):
+    """Remove one request's stop and repair the rest of the route locally"""
+    route = await get_seller_route(route_id, db, seller)
+
+    stops = list(await db.scalars(route_stops_query(route_id)))
+    removed = next((stop for stop in stops if stop.request_id == request_id), None)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Request is not on this route")
+    if removed.status != "pending":
+        raise HTTPException(status_code=400, detail=f"Stop is already {removed.status}")
+
+    entries = await route_stop_entries(route, stops)
+    matrix = await get_travel_matrix([entry["location"] for entry in entries])
+
+    fixed = fixed_stop_count(stops)
+    node = stops.index(removed) + 1
+    order = await remove_stop(
+        entries,
+        list(range(1, len(stops) + 1)),
+        node,
+        matrix,
+        route_departure(route),
+        fixed
+    )
+
+    await db.delete(removed)
+    updated = apply_stop_order(route, stops, entries, order, matrix, fixed)
+    await db.commit()
+    await db.refresh(route)
+
+    remaining = [stop for stop in stops if stop is not removed]
+    return {
+        "route": route,
+        "stops": sorted(remaining, key=lambda stop: stop.stop_order),
+        "updated_stop_ids": sorted(updated)
+    }
 
 @router.put("/{route_id}/status")
 async def update_route_status(
     route_id: int,
     status: str,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Update delivery route status"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    route = db.query(DeliveryRoute).filter(
+    route = await db.scalar(select(DeliveryRoute).where(
         DeliveryRoute.id == route_id,
         DeliveryRoute.seller_id == seller.id
-    ).first()
+    ))
     
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
@@ -182,31 +515,28 @@ async def update_route_status(
         raise HTTPException(status_code=400, detail="Invalid status")
 
     route.status = status
-    db.commit()
+    await db.commit()
     
     return {"message": f"Route status updated to {status}"}
 
 @router.get("/{route_id}/stops", response_model=List[DeliveryStopResponse])
 async def get_route_stops(
     route_id: int,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get stops for a specific route"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    route = db.query(DeliveryRoute).filter(
+    route = await db.scalar(select(DeliveryRoute).where(
         DeliveryRoute.id == route_id,
         DeliveryRoute.seller_id == seller.id
-    ).first()
+    ))
     
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
 
-    stops = db.query(DeliveryStop).filter(
+    stops = await db.scalars(select(DeliveryStop).where(
         DeliveryStop.route_id == route_id
-    ).order_by(DeliveryStop.stop_order).all()
+    ).order_by(DeliveryStop.stop_order))
     
-    return stops
+    return stops.all()
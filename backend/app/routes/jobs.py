@@ -0,0 +1,134 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import AsyncSessionLocal, get_async_db
+from app.models.produce import DeliveryRoute, ProduceRequest
+from app.models.route import RouteRequest, RouteResponse
+from app.schemas.produce import DeliveryRouteJobCreate
+from app.utils.auth_dependency import verify_firebase_token
+from app.utils.principal import Principal, get_principal
+from app.routes.delivery import create_optimized_stops
+from app.services.route_optimizer import delivery_route_request, stored_coordinates
+from app.services.optimization_jobs import OptimizationJob, optimization_jobs
+
+router = APIRouter(prefix="/api/optimization-jobs", tags=["optimization-jobs"])
+
+SSE_KEEPALIVE_SECONDS = 15
+
+def get_job(job_id: str, firebase_user: dict) -> OptimizationJob:
+    job = optimization_jobs.get(job_id)
+    # Someone else's job is reported as missing rather than forbidden
+    if not job or job.owner != firebase_user["uid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("", status_code=202)
+async def submit_route_job(
+    request: RouteRequest,
+    firebase_user: dict = Depends(verify_firebase_token)
+):
+    """Start improving a route in the background; time_budget_seconds is the job's total budget"""
+    job = optimization_jobs.submit(request, request.time_budget_seconds, owner=firebase_user["uid"])
+    return job.snapshot()
+
+@router.post("/delivery-routes", status_code=202)
+async def submit_delivery_route_job(
+    route_data: DeliveryRouteJobCreate,
+    db: AsyncSession = Depends(get_async_db),
+    firebase_user: dict = Depends(verify_firebase_token),
+    seller: Principal = Depends(get_principal)
+):
+    """Plan a delivery route from requests in the background; the best route is saved when the job ends"""
+    if seller.role != "farmer":
+        raise HTTPException(status_code=403, detail="Only farmers can create delivery routes")
+
+    requests = (await db.scalars(select(ProduceRequest).where(
+        ProduceRequest.id.in_(route_data.request_ids),
+        ProduceRequest.assigned_seller_id == seller.id
+    ))).all()
+
+    if len(requests) != len(route_data.request_ids):
+        raise HTTPException(status_code=400, detail="Some requests are not assigned to you")
+
+    seller_id = seller.id
+    route_request = delivery_route_request(
+        route_data.pickup_location,
+        route_data.delivery_date,
+        requests,
+        stored_coordinates(route_data.pickup_latitude, route_data.pickup_longitude)
+    )
+
+    async def save_route(optimized: RouteResponse) -> dict:
+        async with AsyncSessionLocal() as job_db:
+            new_route = DeliveryRoute(
+                seller_id=seller_id,
+                route_name=route_data.route_name,
+                pickup_location=route_data.pickup_location,
+                pickup_latitude=route_data.pickup_latitude,
+                pickup_longitude=route_data.pickup_longitude,
+                delivery_date=route_data.delivery_date
+            )
+            job_db.add(new_route)
+            await job_db.commit()
+            await job_db.refresh(new_route)
+
+            job_requests = (await job_db.scalars(select(ProduceRequest).where(
+                ProduceRequest.id.in_(route_data.request_ids)
+            ))).all()
+            unscheduled = await create_optimized_stops(new_route, job_requests, job_db, optimized)
+            return {"route_id": new_route.id, "unscheduled_request_ids": unscheduled}
+
+    job = optimization_jobs.submit(
+        route_request,
+        route_data.time_budget_seconds,
+        owner=firebase_user["uid"],
+        on_complete=save_route
+    )
+    return job.snapshot()
+
+@router.get("/{job_id}")
+async def get_optimization_job(
+    job_id: str,
+    firebase_user: dict = Depends(verify_firebase_token)
+):
+    """Poll a job: status, rounds so far and the best route found"""
+    return get_job(job_id, firebase_user).snapshot()
+
+@router.post("/{job_id}/stop")
+async def stop_optimization_job(
+    job_id: str,
+    firebase_user: dict = Depends(verify_firebase_token)
+):
+    """Finish the job after its current round, keeping the best route so far"""
+    job = get_job(job_id, firebase_user)
+    if not job.finished:
+        optimization_jobs.stop(job)
+    return job.snapshot()
+
+@router.get("/{job_id}/events")
+async def stream_optimization_job(
+    job_id: str,
+    firebase_user: dict = Depends(verify_firebase_token)
+):
+    """Server-Sent Events: one event per improvement, then a final event when the job ends"""
+    job = get_job(job_id, firebase_user)
+
+    async def events():
+        version = -1
+        while True:
+            if job.version > version:
+                version = job.version
+                snapshot = job.snapshot()
+                yield f"event: {snapshot['status']}\nid: {version}\ndata: {json.dumps(snapshot)}\n\n"
+                if job.finished:
+                    return
+            elif not await job.wait_for_change(version, SSE_KEEPALIVE_SECONDS):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends
 from app.utils.auth_dependency import verify_firebase_token
 from app.models.user import User
-from app.db.database import get_db
-from sqlalchemy.orm import Session
+from app.db.database import get_async_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/api/menurithm", tags=["menurithm-integration"])
 
@@ -135,11 +136,11 @@ async def get_menurithm_integration_guide():
 
 @router.get("/test-connection")
 async def test_menurithm_connection(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     firebase_user: dict = Depends(verify_firebase_token)
 ):
     """Test Menurithm API connection for current user"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
+    user = await db.scalar(select(User).where(User.firebase_uid == firebase_user["uid"]))
     if not user:
         return {"error": "User not found"}
     
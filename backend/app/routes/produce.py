@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.models.produce import ProduceInventory
 from app.models.user import User
 from app.schemas.produce import (
@@ -9,7 +10,8 @@ from app.schemas.produce import (
     ProduceInventoryUpdate, 
     ProduceInventoryResponse
 )
-from app.utils.auth_dependency import verify_firebase_token
+from app.utils.principal import Principal, get_principal
+from app.services.inventory_search import inventory_within, load_hits, nearest_inventory
 from app.services.menurithm_api import menurithm_client
 
 router = APIRouter(prefix="/api/produce", tags=["produce"])
@@ -17,14 +19,10 @@ router = APIRouter(prefix="/api/produce", tags=["produce"])
 @router.post("/inventory", response_model=ProduceInventoryResponse)
 async def create_produce_inventory(
     inventory: ProduceInventoryCreate,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Add new produce items to seller's inventory"""
-    # Get seller from firebase_uid
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can add produce inventory")
@@ -34,41 +32,35 @@ async def create_produce_inventory(
         **inventory.model_dump()
     )
     db.add(new_inventory)
-    db.commit()
-    db.refresh(new_inventory)
+    await db.commit()
+    await db.refresh(new_inventory)
     return new_inventory
 
 @router.get("/inventory", response_model=List[ProduceInventoryResponse])
 async def get_seller_inventory(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get seller's produce inventory"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    inventory = db.query(ProduceInventory).filter(
+    inventory = await db.scalars(select(ProduceInventory).where(
         ProduceInventory.seller_id == seller.id
-    ).all()
-    return inventory
+    ))
+    return inventory.all()
 
 @router.put("/inventory/{inventory_id}", response_model=ProduceInventoryResponse)
 async def update_produce_inventory(
     inventory_id: int,
     updates: ProduceInventoryUpdate,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Update produce inventory item"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    inventory = db.query(ProduceInventory).filter(
+    inventory = await db.scalar(select(ProduceInventory).where(
         ProduceInventory.id == inventory_id,
         ProduceInventory.seller_id == seller.id
-    ).first()
+    ))
     
     if not inventory:
         raise HTTPException(status_code=404, detail="Inventory item not found")
@@ -77,31 +69,28 @@ async def update_produce_inventory(
     for field, value in updates.model_dump(exclude_unset=True).items():
         setattr(inventory, field, value)
 
-    db.commit()
-    db.refresh(inventory)
+    await db.commit()
+    await db.refresh(inventory)
     return inventory
 
 @router.delete("/inventory/{inventory_id}")
 async def delete_produce_inventory(
     inventory_id: int,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Remove produce inventory item"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    inventory = db.query(ProduceInventory).filter(
+    inventory = await db.scalar(select(ProduceInventory).where(
         ProduceInventory.id == inventory_id,
         ProduceInventory.seller_id == seller.id
-    ).first()
+    ))
     
     if not inventory:
         raise HTTPException(status_code=404, detail="Inventory item not found")
 
-    db.delete(inventory)
-    db.commit()
+    await db.delete(inventory)
+    await db.commit()
     return {"message": "Inventory item deleted successfully"}
 
 @router.get("/available", response_model=List[ProduceInventoryResponse])
@@ -110,86 +99,108 @@ async def get_available_produce(
     location: Optional[str] = Query(None),
     organic_only: bool = Query(False),
     max_price: Optional[float] = Query(None),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    nearest: Optional[int] = Query(None, ge=1, le=1000, description="Return the N closest listings"),
     skip: int = Query(0),
     limit: int = Query(50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all available produce (public endpoint)"""
-    query = db.query(ProduceInventory).filter(
+    """
+    Get all available produce (public endpoint).
+    With latitude/longitude, results are sorted by distance and carry distance_km;
+    radius_km and nearest restrict them to a radius and/or the N closest listings.
+    """
+    near = latitude is not None and longitude is not None
+    if not near and (latitude is not None or longitude is not None or radius_km or nearest):
+        raise HTTPException(status_code=400, detail="latitude and longitude are both required for distance queries")
+
+    query = select(ProduceInventory).where(
         ProduceInventory.is_available == True,
         ProduceInventory.quantity_available > 0
     )
 
     if produce_type:
-        query = query.filter(ProduceInventory.produce_type.ilike(f"%{produce_type}%"))
+        query = query.where(ProduceInventory.produce_type.ilike(f"%{produce_type}%"))
     
     if location:
-        query = query.filter(ProduceInventory.location.ilike(f"%{location}%"))
+        query = query.where(ProduceInventory.location.ilike(f"%{location}%"))
     
     if organic_only:
-        query = query.filter(ProduceInventory.organic == True)
+        query = query.where(ProduceInventory.organic == True)
     
     if max_price:
-        query = query.filter(ProduceInventory.price_per_unit <= max_price)
+        query = query.where(ProduceInventory.price_per_unit <= max_price)
 
-    return query.offset(skip).limit(limit).all()
+    if not near:
+        return (await db.scalars(query.offset(skip).limit(limit))).all()
+
+    if radius_km and not nearest:
+        hits = await inventory_within(db, query, latitude, longitude, radius_km)
+    else:
+        hits = await nearest_inventory(db, query, latitude, longitude, nearest or skip + limit, radius_km)
+
+    results = []
+    for distance, item in await load_hits(db, query, hits[skip:skip + limit]):
+        item.distance_km = round(distance, 3)
+        results.append(item)
+    return results
 
 @router.get("/search", response_model=List[ProduceInventoryResponse])
 async def search_produce(
     q: str = Query(..., description="Search query"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Search produce by type, variety, or description"""
-    query = db.query(ProduceInventory).filter(
+    query = select(ProduceInventory).where(
         ProduceInventory.is_available == True,
         ProduceInventory.quantity_available > 0
-    ).filter(
+    ).where(
         ProduceInventory.produce_type.ilike(f"%{q}%") |
         ProduceInventory.variety.ilike(f"%{q}%") |
         ProduceInventory.description.ilike(f"%{q}%")
     )
     
-    return query.all()
+    return (await db.scalars(query)).all()
 
 @router.get("/seller/{seller_id}", response_model=List[ProduceInventoryResponse])
 async def get_seller_produce(
     seller_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific seller's available produce"""
-    seller = db.query(User).filter(User.id == seller_id).first()
+    seller = await db.get(User, seller_id)
     if not seller:
         raise HTTPException(status_code=404, detail="Seller not found")
 
-    inventory = db.query(ProduceInventory).filter(
+    inventory = await db.scalars(select(ProduceInventory).where(
         ProduceInventory.seller_id == seller_id,
         ProduceInventory.is_available == True,
         ProduceInventory.quantity_available > 0
-    ).all()
+    ))
     
-    return inventory
+    return inventory.all()
 
 # Menurithm Integration Endpoints
 
 @router.post("/menurithm/register-supplier")
 async def register_with_menurithm(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Register current user as a supplier with Menurithm"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can register as suppliers")
 
     try:
+        profile = await db.get(User, seller.id)
         supplier_data = {
-            "name": seller.full_name,
+            "name": profile.full_name,
             "email": seller.email,
-            "phone": getattr(seller, 'phone', ''),
-            "address": seller.organization,  # Using organization as address for now
+            "phone": getattr(profile, 'phone', ''),
+            "address": profile.organization,  # Using organization as address for now
             "latitude": None,  # Could be added to user model later
             "longitude": None,
             "categories": ["fresh_produce"],
@@ -211,22 +222,19 @@ async def register_with_menurithm(
 
 @router.post("/menurithm/sync-inventory")
 async def sync_inventory_with_menurithm(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Sync current inventory with Menurithm"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can sync inventory")
 
     # Get seller's inventory
-    inventory = db.query(ProduceInventory).filter(
+    inventory = (await db.scalars(select(ProduceInventory).where(
         ProduceInventory.seller_id == seller.id,
         ProduceInventory.is_available == True
-    ).all()
+    ))).all()
 
     if not inventory:
         return {"message": "No inventory to sync", "synced_items": 0}
@@ -263,13 +271,10 @@ async def sync_inventory_with_menurithm(
 
 @router.get("/menurithm/requests")
 async def get_menurithm_requests(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    seller: Principal = Depends(get_principal)
 ):
     """Get produce requests from Menurithm for this supplier"""
-    seller = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if seller.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can view Menurithm requests")
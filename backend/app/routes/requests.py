@@ -1,17 +1,23 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.models.produce import ProduceRequest
 from app.models.user import User
 from app.schemas.produce import (
     ProduceRequestCreate, 
     ProduceRequestUpdate, 
-    ProduceRequestResponse
+    ProduceRequestResponse,
+    RequestMatchResponse
 )
 from app.utils.auth_dependency import verify_firebase_token
+from app.utils.principal import Principal, get_or_create_principal, get_principal
 from app.services.menurithm_api import menurithm_client
+from app.services.request_geocoding import request_geocoder
+from app.services.request_matching import request_matcher
 
 router = APIRouter(prefix="/api/requests", tags=["requests"])
 
@@ -22,32 +28,12 @@ async def health_check():
 
 @router.get("/test-auth")
 async def test_auth_check(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    firebase_user: dict = Depends(verify_firebase_token),
+    user: Principal = Depends(get_or_create_principal)
 ):
     """Test endpoint to check authentication and auto-user creation"""
-    firebase_uid = firebase_user["uid"]
-    user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
-    
-    if not user:
-        # Auto-create user
-        email = firebase_user.get("email", f"{firebase_uid}@example.com")
-        name = firebase_user.get("name", "Unknown User")
-        
-        user = User(
-            firebase_uid=firebase_uid,
-            email=email,
-            full_name=name,
-            role="farmer",
-            organization="Auto-Generated",
-            country="Unknown"
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    
     return {
-        "firebase_uid": firebase_uid,
+        "firebase_uid": firebase_user["uid"],
         "user_id": user.id,
         "email": user.email,
         "role": user.role,
@@ -57,13 +43,10 @@ async def test_auth_check(
 @router.post("", response_model=ProduceRequestResponse)
 async def create_produce_request(
     request: ProduceRequestCreate,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    restaurant: Principal = Depends(get_principal)
 ):
     """Create new produce request (for restaurants)"""
-    restaurant = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if restaurant.role != "restaurant":
         raise HTTPException(status_code=403, detail="Only restaurants can create produce requests")
@@ -73,8 +56,11 @@ async def create_produce_request(
         **request.model_dump()
     )
     db.add(new_request)
-    db.commit()
-    db.refresh(new_request)
+    await db.commit()
+    await db.refresh(new_request)
+    # Coordinates are filled in the background, not on the request path
+    if new_request.delivery_latitude is None or new_request.delivery_longitude is None:
+        request_geocoder.notify()
     return new_request
 
 @router.get("/debug", response_model=List[ProduceRequestResponse])
@@ -83,19 +69,19 @@ async def debug_get_produce_requests(
     produce_type: Optional[str] = Query(None),
     skip: int = Query(0),
     limit: int = Query(50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Debug endpoint - get requests without authentication"""
     try:
-        query = db.query(ProduceRequest)
+        query = select(ProduceRequest)
 
         if status:
-            query = query.filter(ProduceRequest.status == status)
+            query = query.where(ProduceRequest.status == status)
         
         if produce_type:
-            query = query.filter(ProduceRequest.produce_type.ilike(f"%{produce_type}%"))
+            query = query.where(ProduceRequest.produce_type.ilike(f"%{produce_type}%"))
 
-        requests = query.offset(skip).limit(limit).all()
+        requests = (await db.scalars(query.offset(skip).limit(limit))).all()
         print(f"📊 Found {len(requests)} requests")
         return requests
     except Exception as e:
@@ -108,109 +94,95 @@ async def get_produce_requests(
     produce_type: Optional[str] = Query(None),
     skip: int = Query(0),
     limit: int = Query(50),
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_or_create_principal)
 ):
     """List produce requests with filters"""
     try:
-        firebase_uid = firebase_user["uid"]
-        print(f"🔍 Looking for user with Firebase UID: {firebase_uid}")
-        
-        user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
-        
-        if not user:
-            print(f"❌ User not found in database for Firebase UID: {firebase_uid}")
-            # Let's check how many users are in the database
-            total_users = db.query(User).count()
-            print(f"📊 Total users in database: {total_users}")
-            
-            # Let's see what users exist
-            all_users = db.query(User.firebase_uid, User.email, User.role).limit(5).all()
-            print(f"📋 Sample users: {all_users}")
-            
-            # Auto-create a basic user record for this Firebase user
-            email = firebase_user.get("email", f"{firebase_uid}@example.com")
-            name = firebase_user.get("name", "Unknown User")
-            
-            print(f"🔧 Auto-creating user with email: {email}")
-            
-            user = User(
-                firebase_uid=firebase_uid,
-                email=email,
-                full_name=name,
-                role="farmer",  # Default to farmer, can be changed later
-                organization="Auto-Generated",
-                country="Unknown"
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            
-            print(f"✅ Created new user: {user.email} (ID: {user.id})")
-        
-        print(f"✅ Found/Created user: {user.email} (role: {user.role})")
-
-        query = db.query(ProduceRequest)
+        query = select(ProduceRequest)
 
         # Filter based on user role
         if user.role == "restaurant":
-            query = query.filter(ProduceRequest.restaurant_id == user.id)
+            query = query.where(ProduceRequest.restaurant_id == user.id)
         elif user.role == "farmer":
             # Farmers see unassigned requests or requests assigned to them
-            query = query.filter(
+            query = query.where(
                 (ProduceRequest.assigned_seller_id == None) |
                 (ProduceRequest.assigned_seller_id == user.id)
             )
 
         if status:
-            query = query.filter(ProduceRequest.status == status)
+            query = query.where(ProduceRequest.status == status)
         
         if produce_type:
-            query = query.filter(ProduceRequest.produce_type.ilike(f"%{produce_type}%"))
+            query = query.where(ProduceRequest.produce_type.ilike(f"%{produce_type}%"))
 
-        requests = query.offset(skip).limit(limit).all()
-        print(f"📦 Found {len(requests)} requests for user")
-        return requests
+        return (await db.scalars(query.offset(skip).limit(limit))).all()
     except HTTPException:
         raise
     except Exception as e:
         print(f"❌ Error in get_produce_requests: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.get("/matches", response_model=List[RequestMatchResponse])
+async def get_request_matches(
+    limit: int = Query(20, ge=1, le=200),
+    max_distance_km: Optional[float] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
+):
+    """Open requests that best fit this farmer's available inventory, best first"""
+
+    if user.role != "farmer":
+        raise HTTPException(status_code=403, detail="Only farmers can match requests")
+
+    matches = await asyncio.to_thread(request_matcher.best_requests, user.id, limit, max_distance_km)
+    requests = {
+        req.id: req
+        for req in await db.scalars(select(ProduceRequest).where(
+            ProduceRequest.id.in_([match["request_id"] for match in matches])
+        ))
+    }
+    return [
+        RequestMatchResponse(
+            request=ProduceRequestResponse.model_validate(requests[match["request_id"]]),
+            inventory_id=match["inventory_id"],
+            score=match["score"],
+            distance_km=match["distance_km"],
+            quantity_coverage=match["quantity_coverage"]
+        )
+        for match in matches
+        if match["request_id"] in requests
+    ]
+
 @router.get("/seller/{seller_id}", response_model=List[ProduceRequestResponse])
 async def get_requests_for_seller(
     seller_id: int,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Get requests assigned to specific seller"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
     # Only allow sellers to see their own requests or admin users
     if user.id != seller_id and user.role != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
 
-    requests = db.query(ProduceRequest).filter(
+    requests = await db.scalars(select(ProduceRequest).where(
         ProduceRequest.assigned_seller_id == seller_id
-    ).all()
+    ))
     
-    return requests
+    return requests.all()
 
 @router.put("/{request_id}/status", response_model=ProduceRequestResponse)
 async def update_request_status(
     request_id: int,
     updates: ProduceRequestUpdate,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Update request status (accept/decline) and notify Menurithm"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    request = db.query(ProduceRequest).filter(ProduceRequest.id == request_id).first()
+    request = await db.get(ProduceRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -231,10 +203,11 @@ async def update_request_status(
         # Notify Menurithm if this was a Menurithm request
         if request.menurithm_request_id:
             try:
+                seller_name = await db.scalar(select(User.full_name).where(User.id == user.id))
                 response_data = {
                     "status": updates.status,
                     "supplier_id": user.email,
-                    "message": updates.special_requirements or f"Request {updates.status} by {user.full_name}",
+                    "message": updates.special_requirements or f"Request {updates.status} by {seller_name}",
                     "estimated_delivery_date": None,  # Could be added to updates schema
                     "price_quote": None  # Could be added to updates schema
                 }
@@ -256,22 +229,19 @@ async def update_request_status(
     else:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     return request
 
 @router.get("/{request_id}", response_model=ProduceRequestResponse)
 async def get_produce_request(
     request_id: int,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Get specific produce request"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    request = db.query(ProduceRequest).filter(ProduceRequest.id == request_id).first()
+    request = await db.get(ProduceRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -286,13 +256,10 @@ async def get_produce_request(
 
 @router.post("/menurithm/sync")
 async def sync_requests_with_menurithm(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Pull latest requests from Menurithm for this supplier"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
     
     if user.role != "farmer":
         raise HTTPException(status_code=403, detail="Only farmers can sync Menurithm requests")
@@ -304,9 +271,9 @@ async def sync_requests_with_menurithm(
         synced_count = 0
         for m_request in menurithm_requests:
             # Check if request already exists
-            existing = db.query(ProduceRequest).filter(
+            existing = await db.scalar(select(ProduceRequest).where(
                 ProduceRequest.menurithm_request_id == m_request.get("request_id")
-            ).first()
+            ))
             
             if not existing:
                 # Create new request from Menurithm data
@@ -327,7 +294,9 @@ async def sync_requests_with_menurithm(
                 db.add(new_request)
                 synced_count += 1
         
-        db.commit()
+        await db.commit()
+        if synced_count:
+            request_geocoder.notify()
         
         return {
             "message": f"Synced {synced_count} new requests from Menurithm",
@@ -343,15 +312,12 @@ async def update_delivery_status(
     request_id: int,
     status: str,
     delivery_notes: Optional[str] = None,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_principal)
 ):
     """Update delivery status and notify Menurithm"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    request = db.query(ProduceRequest).filter(ProduceRequest.id == request_id).first()
+    request = await db.get(ProduceRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -384,8 +350,8 @@ async def update_delivery_status(
             print(f"❌ Failed to update Menurithm delivery status: {e}")
             # Don't fail the whole request if Menurithm notification fails
     
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return {
         "message": f"Delivery status updated to {status}",
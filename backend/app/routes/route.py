@@ -1,17 +1,93 @@
-from fastapi import APIRouter
-from app.models.route import RouteRequest, RouteResponse
-from app.services.optimizer import optimize_route_real
+from fastapi import APIRouter, Depends, Response
+from app.models.route import (
+    BatchRouteRequest,
+    BatchRouteResponse,
+    BatchRouteResult,
+    RouteRequest,
+    RouteResponse,
+)
+from app.db.database import database_pool_stats
+from app.services.optimizer import optimize_route_real, optimize_routes_batch
+from app.services.geocode import geocode_cache_stats
+from app.services.matrix_cache import matrix_cache_stats
+from app.services.request_geocoding import request_geocoder
+from app.services.request_matching import request_matcher
+from app.services.route_cache import route_cache, route_cache_headers
+from app.services.routing_backends import ROUTING_BACKEND, backend_health
+from app.services.solver_pool import solver_pool
+from app.utils.auth_dependency import token_cache_stats, verify_firebase_token
+from app.utils.principal import principal_cache_stats
 
 
 router = APIRouter()
 
 @router.post("/api/route")
-async def api_route(request: RouteRequest):
-    return await optimize_route_real(request)
+async def api_route(request: RouteRequest, response: Response):
+    route = await optimize_route_real(request)
+    response.headers.update(route_cache_headers())
+    return route
 
 @router.post("/api/optimize-route", response_model=RouteResponse)
-async def optimize_route(request: RouteRequest):
-    return await optimize_route_real(request)
+async def optimize_route(request: RouteRequest, response: Response):
+    route = await optimize_route_real(request)
+    response.headers.update(route_cache_headers())
+    return route
+
+@router.post("/api/optimize-route/batch", response_model=BatchRouteResponse)
+async def optimize_route_batch(request: BatchRouteRequest):
+    """Optimize many manifests at once; a failing route does not fail the batch."""
+    outcomes = await optimize_routes_batch(request.routes)
+    results = [
+        BatchRouteResult(index=k, error=str(outcome))
+        if isinstance(outcome, Exception)
+        else BatchRouteResult(index=k, route=outcome)
+        for k, outcome in enumerate(outcomes)
+    ]
+    failed = sum(1 for result in results if result.error is not None)
+    return BatchRouteResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+@router.get("/api/geocode/cache-stats", dependencies=[Depends(verify_firebase_token)])
+def get_geocode_cache_stats():
+    return geocode_cache_stats()
+
+@router.get("/api/geocode/request-stats", dependencies=[Depends(verify_firebase_token)])
+async def get_request_geocoding_stats():
+    return await request_geocoder.stats()
+
+@router.get("/api/matching/stats", dependencies=[Depends(verify_firebase_token)])
+def get_matching_stats():
+    return request_matcher.stats()
+
+@router.get("/api/travel-matrix/cache-stats", dependencies=[Depends(verify_firebase_token)])
+def get_travel_matrix_cache_stats():
+    return matrix_cache_stats()
+
+@router.get("/api/route-cache/stats", dependencies=[Depends(verify_firebase_token)])
+def get_route_cache_stats():
+    return route_cache.stats()
+
+@router.get("/api/optimizer/pool-stats", dependencies=[Depends(verify_firebase_token)])
+def get_optimizer_pool_stats():
+    return solver_pool.stats()
+
+@router.get("/api/db/pool-stats", dependencies=[Depends(verify_firebase_token)])
+def get_database_pool_stats():
+    return database_pool_stats()
+
+@router.get("/api/auth/token-cache-stats", dependencies=[Depends(verify_firebase_token)])
+def get_token_cache_stats():
+    return token_cache_stats()
+
+@router.get("/api/auth/principal-cache-stats", dependencies=[Depends(verify_firebase_token)])
+def get_principal_cache_stats():
+    return principal_cache_stats()
+
+@router.get("/api/routing/backends", dependencies=[Depends(verify_firebase_token)])
+async def get_routing_backends():
+    return {
+        "default": ROUTING_BACKEND,
+        "backends": await backend_health(),
+    }
 
 @router.get("/api/example")
 def api_example():
@@ -1,19 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.models.user import User 
 from typing import List
 from app.schemas.user import UserCreate, UserResponse
 from app.utils.auth_dependency import verify_firebase_token
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from app.utils.principal import Principal, get_principal
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -74,13 +67,11 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 @router.post("/menurithm/configure")
 async def configure_menurithm_integration(
     menurithm_api_key: str,
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_principal)
 ):
     """Configure Menurithm API integration for user"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await db.get(User, principal.id)
     
     # In a production system, you'd want to encrypt/secure this API key
     # For now, we'll store it as part of the user's organization field or add a new field
@@ -99,7 +90,7 @@ async def configure_menurithm_integration(
         # For demo purposes, we'll store it in a simple way
         # You'd want to add a proper field to the User model
         user.organization = f"{user.organization}|menurithm_key:{menurithm_api_key}"
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Menurithm integration configured successfully",
@@ -111,13 +102,11 @@ async def configure_menurithm_integration(
 
 @router.get("/menurithm/status")
 async def get_menurithm_integration_status(
-    db: Session = Depends(get_db),
-    firebase_user: dict = Depends(verify_firebase_token)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_principal)
 ):
     """Get Menurithm integration status for user"""
-    user = db.query(User).filter(User.firebase_uid == firebase_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await db.get(User, principal.id)
     
     # Check if user has Menurithm integration configured
     has_integration = "menurithm_key:" in (user.organization or "")
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.models.produce import ProduceRequest
 from app.models.user import User
 from app.schemas.produce import MenurithmWebhookRequest, MenurithmWebhookUpdate
 from app.services.menurithm_api import menurithm_client
+from app.services.request_geocoding import clear_request_coordinates, request_geocoder
 from datetime import datetime
 import logging
 import hmac
@@ -33,7 +35,7 @@ def verify_menurithm_signature(payload: bytes, signature: str) -> bool:
 async def receive_menurithm_request(
     webhook_data: MenurithmWebhookRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     x_menurithm_signature: str = Header(None)
 ):
     """Receive new produce request from Menurithm"""
@@ -69,8 +71,9 @@ async def receive_menurithm_request(
         )
         
         db.add(new_request)
-        db.commit()
-        db.refresh(new_request)
+        await db.commit()
+        await db.refresh(new_request)
+        request_geocoder.notify()
         
         # Add background task to notify relevant farmers
         background_tasks.add_task(notify_farmers_of_new_request, new_request.id, db)
@@ -90,13 +93,13 @@ async def receive_menurithm_request(
 @router.post("/menurithm/update")
 async def receive_menurithm_update(
     webhook_data: MenurithmWebhookUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Receive updates to existing requests from Menurithm"""
     try:
-        request = db.query(ProduceRequest).filter(
+        request = await db.scalar(select(ProduceRequest).where(
             ProduceRequest.menurithm_request_id == webhook_data.request_id
-        ).first()
+        ))
         
         if not request:
             raise HTTPException(status_code=404, detail="Request not found")
@@ -105,11 +108,17 @@ async def receive_menurithm_update(
         request.status = webhook_data.status
         
         # Apply any additional updates from the webhook
+        old_address = request.delivery_address
         for field, value in webhook_data.updates.items():
             if hasattr(request, field):
                 setattr(request, field, value)
         
-        db.commit()
+        address_changed = request.delivery_address != old_address
+        if address_changed and "delivery_latitude" not in webhook_data.updates:
+            clear_request_coordinates(request)
+        await db.commit()
+        if address_changed:
+            request_geocoder.notify()
         
         logger.info(f"Updated request from Menurithm: {webhook_data.request_id}")
         
@@ -184,7 +193,7 @@ def parse_quantity(quantity_str: str) -> float:
         return float(match.group(1))
     return 0.0
 
-async def notify_farmers_of_new_request(request_id: int, db: Session):
+async def notify_farmers_of_new_request(request_id: int, db: AsyncSession):
     """Background task to notify farmers of new produce request"""
     # This would implement notification logic (email, push notifications, etc.)
     # For now, just log the event
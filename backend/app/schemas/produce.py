@@ -50,6 +50,7 @@ class ProduceInventoryResponse(BaseModel):
     is_available: bool
     created_at: datetime
     updated_at: datetime
+    distance_km: Optional[float] = None  # Set by distance queries on /available
 
     model_config = {"from_attributes": True}
 
@@ -95,6 +96,13 @@ class ProduceRequestResponse(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class RequestMatchResponse(BaseModel):
+    request: ProduceRequestResponse
+    inventory_id: int  # Listing that best serves the request
+    score: float  # 0-100: quantity coverage, price headroom and distance combined
+    distance_km: float
+    quantity_coverage: float  # Share of the requested quantity the listing can supply
+
 # Delivery Route Schemas
 class DeliveryRouteCreate(BaseModel):
     route_name: str
@@ -104,6 +112,23 @@ class DeliveryRouteCreate(BaseModel):
     delivery_date: datetime
     request_ids: List[int]  # List of produce request IDs to include
 
+class FleetRouteCreate(DeliveryRouteCreate):
+    vehicle_count: int = Field(..., ge=1)
+    vehicle_capacity: float = Field(..., gt=0)  # kg per vehicle
+    time_budget_seconds: Optional[float] = Field(None, gt=0, le=30)  # Also capped at OPTIMIZER_MAX_BUDGET_SECONDS
+
+class DeliveryRouteJobCreate(DeliveryRouteCreate):
+    time_budget_seconds: Optional[float] = Field(None, gt=0)  # How long the job keeps improving
+
+class DailyPlanCreate(BaseModel):
+    delivery_date: datetime  # Plans requests whose window starts on this day; routes depart at this time
+    pickup_location: str
+    pickup_latitude: Optional[float] = None
+    pickup_longitude: Optional[float] = None
+    route_name: Optional[str] = None  # Routes are named "<route_name> - Route N"
+    max_stops_per_route: Optional[int] = Field(None, ge=1)  # Defaults to DAILY_PLAN_MAX_STOPS
+    vehicle_capacity: Optional[float] = Field(None, gt=0)  # kg per route
+
 class DeliveryRouteResponse(BaseModel):
     id: int
     seller_id: int
@@ -117,9 +142,16 @@ class DeliveryRouteResponse(BaseModel):
     delivery_date: datetime
     created_at: datetime
     updated_at: datetime
+    unscheduled_request_ids: List[int] = []  # Set when requests could not be routed
 
     model_config = {"from_attributes": True}
 
+class DailyPlanResponse(BaseModel):
+    routes: List[DeliveryRouteResponse]
+    unscheduled_request_ids: List[int]  # Could not be served inside their window
+    ungeocoded_request_ids: List[int]
+    failed_request_ids: List[int]  # Their route's solve failed (solver busy or timed out); retry later
+
 class DeliveryStopResponse(BaseModel):
     id: int
     route_id: int
@@ -135,6 +167,14 @@ class DeliveryStopResponse(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class RouteStopInsert(BaseModel):
+    request_id: int
+
+class RouteEditResponse(BaseModel):
+    route: DeliveryRouteResponse
+    stops: List[DeliveryStopResponse]  # All stops in their new order
+    updated_stop_ids: List[int]  # Stops whose stop_order or estimated_arrival changed
+
 # Menurithm Integration Schemas
 class MenurithmWebhookRequest(BaseModel):
     request_id: str
@@ -0,0 +1,44 @@
+import random
+import time
+from typing import List, Sequence
+
+from app.services.local_search import Matrix, improve_route, path_cost
+from app.services.time_windows import WindowSchedule
+
+
+def double_bridge(order: List[int], rng: random.Random) -> List[int]:
+    """Split the order into A B C D and reconnect as A C B D; local search cannot undo this in one move."""
+    a, b, c = sorted(rng.sample(range(1, len(order)), 3))
+    return order[:a] + order[b:c] + order[a:b] + order[c:]
+
+
+def iterated_local_search(
+    order: List[int],
+    dist_matrix: Matrix,
+    time_budget_seconds: float,
+    seed: int = 0,
+    windows: tuple[Matrix, Sequence[float], Sequence[float], Sequence[float]] | None = None,
+) -> tuple[List[int], float]:
+    """
+    Kick the best order with a double bridge, re-run local search, keep the
+    result if it is shorter; repeat until the budget is spent. With windows
+    (durations, service, earliest, latest) a shorter order is kept only if
+    every stop is still served inside its window. Returns (order, cost).
+    """
+    rng = random.Random(seed)
+    best = list(order)
+    best_cost = path_cost([0] + best, dist_matrix)
+    deadline = time.perf_counter() + time_budget_seconds
+
+    while len(best) >= 4 and time.perf_counter() < deadline:
+        candidate = improve_route(
+            double_bridge(best, rng), dist_matrix, max(deadline - time.perf_counter(), 0.0)
+        )
+        cost = path_cost([0] + candidate, dist_matrix)
+        if cost >= best_cost - 1e-9:
+            continue
+        if windows is not None and not WindowSchedule([0] + candidate, *windows).feasible():
+            continue
+        best, best_cost = candidate, cost
+
+    return best, best_cost
@@ -0,0 +1,249 @@
+import os
+from datetime import datetime, timedelta, timezone
+from math import atan2, cos, pi, radians
+from typing import List, Sequence
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.produce import DeliveryRoute, DeliveryStop, ProduceInventory, ProduceRequest
+from app.services.geocode import geocode_many
+from app.services.optimizer import Coordinate, optimize_routes_batch, seconds_after
+from app.services.route_optimizer import delivery_route_request, optimized_stop_rows
+from app.services.vrp import demand_in_kg
+
+DAILY_PLAN_MAX_STOPS = int(os.getenv("DAILY_PLAN_MAX_STOPS", "25"))
+# Requests whose windows start in the same band share routes, so a route does not
+# wait hours between a morning stop and an afternoon one
+DAILY_PLAN_WINDOW_BAND_HOURS = float(os.getenv("DAILY_PLAN_WINDOW_BAND_HOURS", "4"))
+# Requests a route cannot serve inside their windows are re-clustered into new routes
+# for up to this many passes
+DAILY_PLAN_MAX_PASSES = int(os.getenv("DAILY_PLAN_MAX_PASSES", "3"))
+
+Depot = tuple[str, Coordinate]  # Pickup address and [lng, lat]
+
+
+def _sweep(depot: Coordinate, locations: Sequence[Coordinate], members: List[int]) -> List[int]:
+    """members ordered by angle around depot, starting after the widest empty sector."""
+    lng0, lat0 = depot
+    scale = cos(radians(lat0))
+    angle = {
+        i: atan2(locations[i][1] - lat0, (locations[i][0] - lng0) * scale) for i in members
+    }
+    ordered = sorted(members, key=angle.get)
+    if len(ordered) < 2:
+        return ordered
+    gaps = [
+        (angle[ordered[k]] - angle[ordered[k - 1]]) % (2 * pi) for k in range(len(ordered))
+    ]
+    start = max(range(len(ordered)), key=gaps.__getitem__)
+    return ordered[start:] + ordered[:start]
+
+
+def sweep_clusters(
+    depot: Coordinate,
+    locations: Sequence[Coordinate],
+    demands: Sequence[float],
+    window_starts: Sequence[datetime | None],
+    day_start: datetime,
+    max_stops: int = DAILY_PLAN_MAX_STOPS,
+    capacity: float | None = None,
+    band_hours: float = DAILY_PLAN_WINDOW_BAND_HOURS,
+) -> List[List[int]]:
+    """
+    Cluster stops (indices into locations) into routes: group by the time band
+    their window starts in, then sweep each band by angle around the depot and
+    close a route when it reaches max_stops or capacity (kg).
+    """
+    bands: dict[int, List[int]] = {}
+    for i, start in enumerate(window_starts):
+        offset = max(seconds_after(day_start, start) or 0.0, 0.0)
+        bands.setdefault(int(offset // (band_hours * 3600)), []).append(i)
+
+    clusters: List[List[int]] = []
+    for band in sorted(bands):
+        current: List[int] = []
+        load = 0.0
+        for i in _sweep(depot, locations, bands[band]):
+            full = len(current) >= max_stops or (capacity and load + demands[i] > capacity)
+            if current and full:
+                clusters.append(current)
+                current, load = [], 0.0
+            current.append(i)
+            load += demands[i]
+        if current:
+            clusters.append(current)
+    return clusters
+
+
+async def seller_depots(db: AsyncSession, seller_ids: List[int]) -> dict[int, Depot]:
+    """
+    Pickup point per seller: their latest route's geocoded pickup, else a
+    geocoded inventory location. Sellers with neither are left out.
+    """
+    depots: dict[int, Depot] = {}
+    for seller_id in seller_ids:
+        route = await db.scalar(select(DeliveryRoute).where(
+            DeliveryRoute.seller_id == seller_id,
+            DeliveryRoute.pickup_latitude.isnot(None),
+            DeliveryRoute.pickup_longitude.isnot(None)
+        ).order_by(DeliveryRoute.created_at.desc()).limit(1))
+        if route:
+            depots[seller_id] = (route.pickup_location, (route.pickup_longitude, route.pickup_latitude))
+            continue
+        item = await db.scalar(select(ProduceInventory).where(
+            ProduceInventory.seller_id == seller_id,
+            ProduceInventory.latitude.isnot(None),
+            ProduceInventory.longitude.isnot(None)
+        ).limit(1))
+        if item:
+            depots[seller_id] = (item.location, (item.longitude, item.latitude))
+    return depots
+
+
+def as_utc(moment: datetime) -> datetime:
+    """moment, read as UTC if it is naive; windows are stored timezone-aware."""
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def day_bounds(delivery_date: datetime) -> tuple[datetime, datetime]:
+    day_start = as_utc(delivery_date).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day_start, day_start + timedelta(days=1)
+
+
+def planned_request_ids():
+    """Subquery of request ids with a stop on a route that is not cancelled."""
+    return select(DeliveryStop.request_id).join(DeliveryRoute).where(
+        DeliveryRoute.status != "cancelled"
+    )
+
+
+async def unplanned_requests(
+    db: AsyncSession, seller_ids: List[int], delivery_date: datetime
+) -> List[ProduceRequest]:
+    """Accepted requests of these sellers due on delivery_date and not yet on a live route."""
+    day_start, day_end = day_bounds(delivery_date)
+    requests = await db.scalars(select(ProduceRequest).where(
+        ProduceRequest.status == "accepted",
+        ProduceRequest.assigned_seller_id.in_(seller_ids),
+        ProduceRequest.delivery_window_start >= day_start,
+        ProduceRequest.delivery_window_start < day_end,
+        ProduceRequest.id.notin_(planned_request_ids())
+    ).order_by(ProduceRequest.id))
+    return requests.all()
+
+
+async def plan_deliveries(
+    db: AsyncSession,
+    delivery_date: datetime,
+    depots: dict[int, Depot],
+    route_name: str | None = None,
+    max_stops: int = DAILY_PLAN_MAX_STOPS,
+    capacity: float | None = None,
+) -> dict:
+    """
+    Build the day's routes for every seller in depots: cluster their unplanned
+    accepted requests, optimize all clusters in one batch (shared matrix fetch,
+    parallel solves) and save routes and stops with bulk inserts. Returns the
+    created routes plus the request ids left unscheduled or ungeocoded, and
+    those whose solve failed (solver busy or timed out) and can be retried.
+    """
+    delivery_date = as_utc(delivery_date)
+    requests = await unplanned_requests(db, list(depots), delivery_date)
+    day_start, _ = day_bounds(delivery_date)
+    route_name = route_name or f"Deliveries {delivery_date:%Y-%m-%d}"
+
+    # Normally filled in the background already; geocode whatever is left in one pass
+    locations = await geocode_many(
+        req.delivery_address for req in requests
+        if req.delivery_latitude is None or req.delivery_longitude is None
+    )
+    by_seller: dict[int, List[ProduceRequest]] = {}
+    ungeocoded: List[int] = []
+    for req in requests:
+        if req.delivery_latitude is None or req.delivery_longitude is None:
+            coords = locations.get(req.delivery_address)
+            if not coords:
+                ungeocoded.append(req.id)
+                continue
+            req.delivery_longitude, req.delivery_latitude = coords
+        by_seller.setdefault(req.assigned_seller_id, []).append(req)
+
+    created = []  # (route, stop rows)
+    unscheduled: List[int] = []
+    failed: List[int] = []
+    route_numbers: dict[int, int] = {}
+    for _ in range(DAILY_PLAN_MAX_PASSES):
+        clusters: List[tuple[int, List[ProduceRequest]]] = []
+        for seller_id, seller_requests in by_seller.items():
+            groups = sweep_clusters(
+                depots[seller_id][1],
+                [(req.delivery_longitude, req.delivery_latitude) for req in seller_requests],
+                [demand_in_kg(req.quantity_needed, req.unit) for req in seller_requests],
+                [req.delivery_window_start for req in seller_requests],
+                day_start,
+                max_stops,
+                capacity,
+            )
+            clusters += [(seller_id, [seller_requests[i] for i in group]) for group in groups]
+
+        outcomes = await optimize_routes_batch([
+            delivery_route_request(depots[seller_id][0], delivery_date, cluster, depots[seller_id][1])
+            for seller_id, cluster in clusters
+        ])
+
+        # Stops a route could not fit inside their windows get another pass of their own
+        by_seller = {}
+        for (seller_id, cluster), optimized in zip(clusters, outcomes):
+            if isinstance(optimized, Exception):
+                # Not a window problem: the solve itself failed, so these can be planned again
+                failed += [req.id for req in cluster]
+                continue
+            rows, unmatched = optimized_stop_rows(None, optimized, cluster)
+            if len(unmatched) == len(cluster):
+                unscheduled += [req.id for req in cluster]
+                continue
+            by_seller.setdefault(seller_id, []).extend(unmatched)
+
+            route_numbers[seller_id] = route_numbers.get(seller_id, 0) + 1
+            pickup, (lng, lat) = depots[seller_id]
+            route = DeliveryRoute(
+                seller_id=seller_id,
+                route_name=f"{route_name} - Route {route_numbers[seller_id]}",
+                pickup_location=pickup,
+                pickup_latitude=lat,
+                pickup_longitude=lng,
+                total_distance_miles=optimized.total_distance_miles,
+                estimated_duration_minutes=optimized.total_eta,
+                delivery_date=delivery_date
+            )
+            route.unscheduled_request_ids = []
+            created.append((route, rows))
+        if not by_seller:
+            break
+    unscheduled += [req.id for seller_requests in by_seller.values() for req in seller_requests]
+
+    db.add_all([route for route, _ in created])
+    await db.flush()
+    stop_rows = [
+        {**row, "route_id": route.id}
+        for route, rows in created
+        for row in rows
+    ]
+    if stop_rows:
+        await db.execute(insert(DeliveryStop), stop_rows)
+    await db.commit()
+
+    # One query reloads the server-set columns of every route
+    routes = [route for route, _ in created]
+    await db.execute(
+        select(DeliveryRoute)
+        .where(DeliveryRoute.id.in_([route.id for route in routes]))
+        .execution_options(populate_existing=True)
+    )
+    return {
+        "routes": routes,
+        "unscheduled_request_ids": unscheduled,
+        "ungeocoded_request_ids": ungeocoded,
+        "failed_request_ids": failed,
+    }
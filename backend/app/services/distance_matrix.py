@@ -0,0 +1,34 @@
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+METERS_PER_MILE = 1609.344
+
+Coordinate = Tuple[float, float]
+
+
+def haversine_distance_array(coordinates: List[Coordinate]) -> np.ndarray:
+    """All-pairs great-circle distances in miles as an (n, n) array."""
+    coords = np.radians(np.asarray(coordinates, dtype=np.float64).reshape(-1, 2))
+    lng = coords[:, 0]
+    lat = coords[:, 1]
+
+    dlng = lng[np.newaxis, :] - lng[:, np.newaxis]
+    dlat = lat[np.newaxis, :] - lat[:, np.newaxis]
+    cos_lat = np.cos(lat)
+
+    a = np.sin(dlat / 2) ** 2 + np.outer(cos_lat, cos_lat) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(coordinates: List[Coordinate], speed_mph: float) -> dict:
+    """
+    Build a travel matrix from straight-line distances at a fixed speed.
+    Returns the same shape as a routing backend matrix: meters and seconds.
+    """
+    miles = haversine_distance_array(coordinates)
+    return {
+        "distances": (miles * METERS_PER_MILE).tolist(),
+        "durations": (miles / speed_mph * 3600).tolist(),
+    }
@@ -0,0 +1,101 @@
+import os
+from typing import List
+
+import numpy as np
+
+from app.services.local_search import (
+    LOCAL_SEARCH_TIME_BUDGET_SECONDS,
+    Matrix,
+    nearest_neighbor_indices,
+    path_cost,
+    solve_stop_order,
+)
+
+# Held-Karp needs 2^n * n memory and 2^n * n^2 time; 15 stops is ~4 MB and ~50 ms
+HELD_KARP_MAX_STOPS = int(os.getenv("HELD_KARP_MAX_STOPS", "15"))
+# Measured cost of one Held-Karp transition, used to check a solve fits the time budget
+HELD_KARP_SECONDS_PER_STEP = float(os.getenv("HELD_KARP_SECONDS_PER_STEP", "1e-8"))
+
+
+def held_karp_seconds(stops: int) -> float:
+    """Expected Held-Karp running time for this many stops (depot excluded)."""
+    return (2 ** stops) * stops * stops * HELD_KARP_SECONDS_PER_STEP
+
+
+def held_karp(dist_matrix: Matrix) -> tuple[List[int], float]:
+    """
+    Exact shortest open path from the depot (index 0) through every other
+    index, by dynamic programming over visited-stop bitmasks. Missing matrix
+    entries (None) are treated as unreachable. Returns the order and its cost.
+    """
+    dist = np.array(
+        [[np.inf if value is None else value for value in row] for row in dist_matrix],
+        dtype=np.float64,
+    )
+    m = len(dist) - 1
+    if m <= 0:
+        return [], 0.0
+
+    legs = dist[1:, 1:]  # legs[k, j]: stop k+1 to stop j+1
+    # cost[mask, j]: cheapest path from the depot over the stops in mask, ending at j
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int8)
+    for j in range(m):
+        cost[1 << j, j] = dist[0, j + 1]
+
+    masks = np.arange(1 << m)
+    sizes = np.zeros(1 << m, dtype=np.int64)
+    for j in range(m):
+        sizes += (masks >> j) & 1
+
+    # Subsets of one size only read the size below, so each size is one set of array ops
+    for size in range(2, m + 1):
+        layer = masks[sizes == size]
+        for j in range(m):
+            ending = layer[(layer >> j) & 1 == 1]
+            previous = ending ^ (1 << j)
+            # Stops outside previous (and j itself) are still inf in cost[previous]
+            candidates = cost[previous] + legs[:, j]
+            best = candidates.argmin(axis=1)
+            cost[ending, j] = candidates[np.arange(len(ending)), best]
+            parent[ending, j] = best
+
+    full = (1 << m) - 1
+    last = int(cost[full].argmin())
+    total = float(cost[full, last])
+    if not np.isfinite(total):
+        raise ValueError("OSRM matrix could not connect all stops")
+
+    order: List[int] = []
+    mask = full
+    while last >= 0:
+        order.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    order.reverse()
+    return order, total
+
+
+def solve_route_order(
+    dist_matrix: Matrix,
+    time_budget_seconds: float | None = None,
+) -> tuple[List[int], float, float, str, bool]:
+    """
+    solve_stop_order, but solved exactly with Held-Karp when the route has at
+    most HELD_KARP_MAX_STOPS stops and the solve is expected to fit the time
+    budget. Returns the order, its nearest-neighbor and final costs, the
+    solver used and whether the order is proven optimal.
+    """
+    stops = len(dist_matrix) - 1
+    budget = (
+        LOCAL_SEARCH_TIME_BUDGET_SECONDS
+        if time_budget_seconds is None
+        else time_budget_seconds
+    )
+    if stops <= HELD_KARP_MAX_STOPS and held_karp_seconds(stops) <= budget:
+        initial = nearest_neighbor_indices(dist_matrix)
+        order, cost = held_karp(dist_matrix)
+        return order, path_cost([0] + initial, dist_matrix), cost, "held_karp", True
+
+    order, initial_cost, cost = solve_stop_order(dist_matrix, time_budget_seconds)
+    # A route this short has only one possible order
+    return order, initial_cost, cost, "local_search", stops <= 1
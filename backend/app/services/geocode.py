@@ -1,12 +1,41 @@
 # app/services/geocode.py
+import asyncio
+import logging
 import os
+import re
+import time
+from collections import Counter
+from typing import Iterable
+
 import httpx
 from dotenv import load_dotenv
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.models.geocode import GeocodeCacheEntry
+from app.services.http_clients import get_http_client
+from app.utils.cache import TTLCache
 
 # Load env variables
 load_dotenv()
 
 MAPBOX_URL = "https://api.mapbox.com/geocoding/v5/mapbox.places"
+GEOCODE_CONCURRENCY = int(os.getenv("GEOCODE_CONCURRENCY", "8"))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+GEOCODE_CACHE_TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Database-tier hits are counted in memory and written to hit_count in one batch once
+# this many have built up or the oldest has waited this long
+GEOCODE_HIT_FLUSH_SIZE = int(os.getenv("GEOCODE_HIT_FLUSH_SIZE", "100"))
+GEOCODE_HIT_FLUSH_SECONDS = float(os.getenv("GEOCODE_HIT_FLUSH_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+# Tier 1: in-process LRU. Tier 2: geocode_cache table shared by all workers.
+_memory_cache = TTLCache(maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL_SECONDS)
+_db_counters = {"hits": 0, "misses": 0}
+_pending_hits: Counter[str] = Counter()  # normalized address -> hits not yet written
+_pending_since = 0.0
 
 
 def get_mapbox_key() -> str | None:
@@ -14,13 +43,152 @@ def get_mapbox_key() -> str | None:
     return os.getenv("GEOCODER_API_KEY")
 
 
+def normalize_address(address: str) -> str:
+    """Cache key for an address: lowercase, punctuation stripped, single spaces."""
+    return " ".join(re.sub(r"[^\w\s]", " ", address.lower()).split())
+
+
+def _load_cached(normalized: str) -> tuple[float, float] | None:
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(GeocodeCacheEntry.longitude, GeocodeCacheEntry.latitude)
+            .where(GeocodeCacheEntry.normalized_address == normalized)
+        ).first()
+        return tuple(row) if row else None
+    finally:
+        db.close()
+
+
+def _write_hits(hits: dict[str, int]) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(GeocodeCacheEntry.__table__)
+            .where(GeocodeCacheEntry.__table__.c.normalized_address == bindparam("normalized"))
+            .values(hit_count=GeocodeCacheEntry.__table__.c.hit_count + bindparam("added")),
+            [{"normalized": normalized, "added": count} for normalized, count in hits.items()],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def flush_geocode_hits() -> None:
+    """Write the buffered database-tier hit counts; a failed write drops them (they are advisory)."""
+    global _pending_since
+    if not _pending_hits:
+        return
+    hits = dict(_pending_hits)
+    _pending_hits.clear()
+    _pending_since = time.monotonic()
+    try:
+        await asyncio.to_thread(_write_hits, hits)
+    except SQLAlchemyError as e:
+        logger.warning(f"Geocode hit count write failed: {e}")
+
+
+async def _count_hit(normalized: str) -> None:
+    global _pending_since
+    if not _pending_hits:
+        _pending_since = time.monotonic()
+    _pending_hits[normalized] += 1
+    if (
+        _pending_hits.total() >= GEOCODE_HIT_FLUSH_SIZE
+        or time.monotonic() - _pending_since >= GEOCODE_HIT_FLUSH_SECONDS
+    ):
+        await flush_geocode_hits()
+
+
+def _store_cached(normalized: str, address: str, coords: tuple[float, float]) -> None:
+    db = SessionLocal()
+    try:
+        db.add(GeocodeCacheEntry(
+            normalized_address=normalized,
+            address=address,
+            longitude=coords[0],
+            latitude=coords[1],
+        ))
+        db.commit()
+    except IntegrityError:
+        # Another worker cached the same address first
+        db.rollback()
+    finally:
+        db.close()
+
+
+def geocode_cache_stats() -> dict:
+    return {
+        "memory": _memory_cache.stats(),
+        "database": {**_db_counters, "unflushed_hits": _pending_hits.total()},
+    }
+
+
 async def geocode_address(address: str) -> tuple[float, float] | None:
     if not address:
         return None
 
+    normalized = normalize_address(address)
+    coords = _memory_cache.get(normalized)
+    if coords:
+        return coords
+
+    try:
+        coords = await asyncio.to_thread(_load_cached, normalized)
+    except SQLAlchemyError as e:
+        logger.warning(f"Geocode cache lookup failed: {e}")
+        coords = None
+    if coords:
+        _db_counters["hits"] += 1
+        _memory_cache.set(normalized, coords)
+        await _count_hit(normalized)
+        return coords
+    _db_counters["misses"] += 1
+
     if os.getenv("GEOCODER_PROVIDER") == "mapbox":
-        return await geocode_mapbox(address)
-    return None
+        coords = await geocode_mapbox(address)
+    if coords:
+        _memory_cache.set(normalized, coords)
+        try:
+            await asyncio.to_thread(_store_cached, normalized, address, coords)
+        except SQLAlchemyError as e:
+            logger.warning(f"Geocode cache write failed: {e}")
+    return coords
+
+
+async def geocode_many(
+    addresses: Iterable[str],
+    concurrency: int = GEOCODE_CONCURRENCY,
+) -> dict[str, tuple[float, float] | None]:
+    """
+    Geocode each distinct address once, at most `concurrency` at a time.
+    Spellings that normalize to the same key share one lookup.
+    Returns address -> coordinates, with None for addresses that failed.
+    """
+    groups: dict[str, list[str]] = {}
+    for address in addresses:
+        if address:
+            spellings = groups.setdefault(normalize_address(address), [])
+            if address not in spellings:
+                spellings.append(address)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(address: str) -> tuple[float, float] | None:
+        async with semaphore:
+            try:
+                return await geocode_address(address)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                logger.warning(f"Geocoding failed for {address!r}: {e}")
+                return None
+
+    results = await asyncio.gather(
+        *(resolve(spellings[0]) for spellings in groups.values())
+    )
+    return {
+        address: coords
+        for spellings, coords in zip(groups.values(), results)
+        for address in spellings
+    }
 
 
 async def geocode_mapbox(address: str) -> tuple[float, float] | None:
@@ -29,12 +197,12 @@ async def geocode_mapbox(address: str) -> tuple[float, float] | None:
         print("WARNING: GEOCODER_API_KEY not set")
         return None
     
-    async with httpx.AsyncClient() as client:
-        url = f"{MAPBOX_URL}/{address}.json"
-        params = {"access_token": mapbox_key, "limit": 1}
-        resp = await client.get(url, params=params)
-        data = resp.json()
-        if data["features"]:
-            lng, lat = data["features"][0]["center"]
-            return (lng, lat)
-        return None
+    client = get_http_client("mapbox")
+    url = f"{MAPBOX_URL}/{address}.json"
+    params = {"access_token": mapbox_key, "limit": 1}
+    resp = await client.get(url, params=params)
+    data = resp.json()
+    if data["features"]:
+        lng, lat = data["features"][0]["center"]
+        return (lng, lat)
+    return None
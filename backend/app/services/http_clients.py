@@ -0,0 +1,66 @@
+import importlib.util
+import logging
+import os
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _limits(prefix: str, max_connections: int, max_keepalive: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", str(max_connections))),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", str(max_keepalive))),
+        keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+# Per-upstream pool settings; each limit can be overridden from the environment
+UPSTREAMS = {
+    "osrm": {"timeout": 10.0, "limits": lambda: _limits("OSRM", 32, 16)},
+    "osrm_local": {"timeout": 30.0, "limits": lambda: _limits("OSRM_LOCAL", 32, 16)},
+    "mapbox": {"timeout": 10.0, "limits": lambda: _limits("MAPBOX", 16, 8)},
+    "menurithm": {"timeout": 15.0, "limits": lambda: _limits("MENURITHM", 10, 5)},
+}
+
+
+class HTTPClientRegistry:
+    """One long-lived AsyncClient per upstream so connections and TLS sessions are reused."""
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        settings = UPSTREAMS[name]
+        return httpx.AsyncClient(
+            timeout=settings["timeout"],
+            limits=settings["limits"](),
+            http2=HTTP2_AVAILABLE,
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        # Created lazily too, so scripts that never run the app lifespan still work
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def start(self) -> None:
+        for name in UPSTREAMS:
+            self.get(name)
+        logger.info(f"HTTP clients ready (http2={HTTP2_AVAILABLE})")
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClientRegistry()
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    return http_clients.get(name)
@@ -0,0 +1,83 @@
+import os
+from typing import List
+
+from sqlalchemy import Select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.produce import ProduceInventory
+from app.utils.geo import bounding_box, grid_cells, haversine_km
+
+# Up to this many grid cells are looked up by index; wider searches filter on the bounding box
+INVENTORY_SEARCH_MAX_CELLS = int(os.getenv("INVENTORY_SEARCH_MAX_CELLS", "400"))
+# Nearest-K searches start at this radius and widen 4x until K listings are found
+INVENTORY_NEAREST_START_RADIUS_KM = float(os.getenv("INVENTORY_NEAREST_START_RADIUS_KM", "10"))
+HALF_EARTH_CIRCUMFERENCE_KM = 20038.0
+
+Hit = tuple[float, int]  # (distance_km, listing id)
+
+
+def _in_box(query: Select, lat: float, lng: float, radius_km: float) -> Select:
+    box = bounding_box(lat, lng, radius_km)
+    cells = grid_cells(box, INVENTORY_SEARCH_MAX_CELLS)
+    if cells is not None:
+        return query.where(ProduceInventory.grid_cell.in_(cells))
+
+    min_lat, max_lat, min_lng, max_lng = box
+    query = query.where(ProduceInventory.latitude.between(min_lat, max_lat))
+    if min_lng <= max_lng:
+        return query.where(ProduceInventory.longitude.between(min_lng, max_lng))
+    return query.where(
+        or_(ProduceInventory.longitude >= min_lng, ProduceInventory.longitude <= max_lng)
+    )
+
+
+async def inventory_within(
+    db: AsyncSession, query: Select, lat: float, lng: float, radius_km: float
+) -> List[Hit]:
+    """
+    Listings from query within radius_km of (lat, lng), nearest first.
+    Candidates come from the grid-cell index and only their coordinates are
+    read; exact distance is checked in Python.
+    """
+    candidates = _in_box(query, lat, lng, radius_km).with_only_columns(
+        ProduceInventory.id, ProduceInventory.latitude, ProduceInventory.longitude
+    )
+    hits = []
+    for item_id, item_lat, item_lng in await db.execute(candidates):
+        distance = haversine_km(lat, lng, item_lat, item_lng)
+        if distance <= radius_km:
+            hits.append((distance, item_id))
+    hits.sort()
+    return hits
+
+
+async def nearest_inventory(
+    db: AsyncSession,
+    query: Select,
+    lat: float,
+    lng: float,
+    k: int,
+    max_radius_km: float | None = None,
+) -> List[Hit]:
+    """The k listings from query nearest to (lat, lng), optionally no further than max_radius_km."""
+    limit = HALF_EARTH_CIRCUMFERENCE_KM if max_radius_km is None else max_radius_km
+    radius = min(INVENTORY_NEAREST_START_RADIUS_KM, limit)
+    while True:
+        # Everything within radius has been seen, so the k closest of these are the k closest overall
+        hits = await inventory_within(db, query, lat, lng, radius)
+        if len(hits) >= k or radius >= limit:
+            return hits[:k]
+        radius = min(radius * 4, limit)
+
+
+async def load_hits(
+    db: AsyncSession, query: Select, hits: List[Hit]
+) -> List[tuple[float, ProduceInventory]]:
+    """Full rows for hits, in the same order."""
+    items = {
+        item.id: item
+        for item in await db.scalars(
+            query.where(ProduceInventory.id.in_([item_id for _, item_id in hits]))
+        )
+    }
+    return [(distance, items[item_id]) for distance, item_id in hits if item_id in items]
@@ -0,0 +1,210 @@
+import os
+import time
+from typing import List, Sequence
+
+LOCAL_SEARCH_TIME_BUDGET_SECONDS = float(
+    os.getenv("LOCAL_SEARCH_TIME_BUDGET_SECONDS", "0.5")
+)
+
+Matrix = Sequence[Sequence[float]]
+
+
+def path_cost(path: Sequence[int], dist_matrix: Matrix) -> float:
+    """Cost of an open path that starts at path[0] and does not return."""
+    return sum(dist_matrix[a][b] for a, b in zip(path, path[1:]))
+
+
+def _prefix_costs(path: List[int], dist_matrix: Matrix) -> tuple[list[float], list[float]]:
+    """Forward and reverse prefix sums so segment reversals cost O(1) to score."""
+    forward = [0.0]
+    reverse = [0.0]
+    for a, b in zip(path, path[1:]):
+        forward.append(forward[-1] + dist_matrix[a][b])
+        reverse.append(reverse[-1] + dist_matrix[b][a])
+    return forward, reverse
+
+
+def two_opt(path: List[int], dist_matrix: Matrix, deadline: float) -> bool:
+    """
+    Apply first-improvement 2-opt moves until none remain or time runs out.
+    path[0] is the depot and stays fixed; the path is open-ended. Matrices
+    may be asymmetric, so reversed segments are re-scored with their reverse
+    edge costs. Returns True if the path was changed.
+    """
+    m = len(path)
+    changed = False
+    improved = True
+
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        forward, reverse = _prefix_costs(path, dist_matrix)
+        for i in range(1, m - 1):
+            a = path[i - 1]
+            for j in range(i + 1, m):
+                old = dist_matrix[a][path[i]] + forward[j] - forward[i]
+                new = dist_matrix[a][path[j]] + reverse[j] - reverse[i]
+                if j + 1 < m:
+                    b = path[j + 1]
+                    old += dist_matrix[path[j]][b]
+                    new += dist_matrix[path[i]][b]
+                if new < old - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    changed = improved = True
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+
+    return changed
+
+
+def _segment_moves(
+    path: List[int],
+    dist_matrix: Matrix,
+    deadline: float,
+    segment_lengths: Sequence[int],
+) -> bool:
+    """Move short segments to their cheapest position; shared by relocate and Or-opt."""
+    changed = False
+    improved = True
+
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        m = len(path)
+        for length in segment_lengths:
+            for i in range(1, m - length + 1):
+                end = i + length - 1
+                a = path[i - 1]
+                first, last = path[i], path[end]
+                b = path[end + 1] if end + 1 < m else None
+
+                removal_gain = dist_matrix[a][first]
+                if b is not None:
+                    removal_gain += dist_matrix[last][b] - dist_matrix[a][b]
+
+                best_delta = -1e-9
+                best_k = None
+                for k in range(m):
+                    if i - 1 <= k <= end:
+                        continue
+                    c = path[k]
+                    e = path[k + 1] if k + 1 < m else None
+                    insert_cost = dist_matrix[c][first]
+                    if e is not None:
+                        insert_cost += dist_matrix[last][e] - dist_matrix[c][e]
+                    delta = insert_cost - removal_gain
+                    if delta < best_delta:
+                        best_delta = delta
+                        best_k = k
+
+                if best_k is not None:
+                    segment = path[i:end + 1]
+                    anchor = path[best_k]
+                    del path[i:end + 1]
+                    insert_at = path.index(anchor) + 1
+                    path[insert_at:insert_at] = segment
+                    changed = improved = True
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+
+    return changed
+
+
+def relocate(path: List[int], dist_matrix: Matrix, deadline: float) -> bool:
+    """Move single stops to their cheapest position in the path."""
+    return _segment_moves(path, dist_matrix, deadline, (1,))
+
+
+def or_opt(path: List[int], dist_matrix: Matrix, deadline: float) -> bool:
+    """Move chains of two or three consecutive stops to a cheaper position."""
+    return _segment_moves(path, dist_matrix, deadline, (2, 3))
+
+
+def improve_route(
+    order: List[int],
+    dist_matrix: Matrix,
+    time_budget_seconds: float | None = None,
+) -> List[int]:
+    """
+    Improve a constructed stop order (indices into dist_matrix, depot 0
+    excluded) with 2-opt, Or-opt and relocate until a local optimum is
+    reached or the time budget is spent.
+    """
+    if len(order) < 2:
+        return list(order)
+
+    budget = (
+        LOCAL_SEARCH_TIME_BUDGET_SECONDS
+        if time_budget_seconds is None
+        else time_budget_seconds
+    )
+    deadline = time.perf_counter() + budget
+    path = [0] + list(order)
+
+    while time.perf_counter() < deadline:
+        changed = two_opt(path, dist_matrix, deadline)
+        changed = or_opt(path, dist_matrix, deadline) or changed
+        changed = relocate(path, dist_matrix, deadline) or changed
+        if not changed:
+            break
+
+    return path[1:]
+
+
+def nearest_neighbor_indices(dist_matrix: Matrix) -> List[int]:
+    n = len(dist_matrix)
+    unvisited = set(range(1, n))
+    order: List[int] = []
+    current = 0
+
+    while unvisited:
+        next_idx = min(
+            unvisited,
+            key=lambda idx: dist_matrix[current][idx]
+            if dist_matrix[current][idx] is not None
+            else float("inf"),
+        )
+        if dist_matrix[current][next_idx] is None:
+            break
+        order.append(next_idx)
+        unvisited.remove(next_idx)
+        current = next_idx
+
+    if unvisited:
+        raise ValueError("OSRM matrix could not connect all stops")
+
+    return order
+
+
+def solve_stop_order(
+    dist_matrix: Matrix,
+    time_budget_seconds: float | None = None,
+) -> tuple[List[int], float, float]:
+    """
+    Build a stop order with nearest neighbor, then improve it with local search.
+    Returns the order plus its cost before and after improvement.
+    """
+    initial = nearest_neighbor_indices(dist_matrix)
+    improved = improve_route(initial, dist_matrix, time_budget_seconds)
+    return (
+        improved,
+        path_cost([0] + initial, dist_matrix),
+        path_cost([0] + improved, dist_matrix),
+    )
+
+
+def improve_suffix(
+    order: List[int],
+    fixed: int,
+    dist_matrix: Matrix,
+    time_budget_seconds: float | None = None,
+) -> List[int]:
+    """
+    improve_route for order[fixed:] only, starting from the last fixed stop
+    (or the depot); the first `fixed` stops keep their positions.
+    """
+    anchor = order[fixed - 1] if fixed else 0
+    nodes = [anchor] + order[fixed:]
+    sub_matrix = [[dist_matrix[a][b] for b in nodes] for a in nodes]
+    improved = improve_route(list(range(1, len(nodes))), sub_matrix, time_budget_seconds)
+    return order[:fixed] + [nodes[i] for i in improved]
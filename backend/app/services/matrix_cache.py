@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.database import SessionLocal, engine
+from app.models.travel_matrix import TravelLeg
+from app.utils.cache import TTLCache
+
+# 5 decimals is ~1 m, so repeat visits to the same farm or restaurant share legs
+TRAVEL_MATRIX_PRECISION = int(os.getenv("TRAVEL_MATRIX_PRECISION", "5"))
+TRAVEL_MATRIX_MEMORY_SIZE = int(os.getenv("TRAVEL_MATRIX_MEMORY_SIZE", "250000"))
+TRAVEL_MATRIX_MEMORY_TTL_SECONDS = float(
+    os.getenv("TRAVEL_MATRIX_MEMORY_TTL_SECONDS", str(6 * 3600))
+)
+TRAVEL_MATRIX_MAX_AGE_DAYS = float(os.getenv("TRAVEL_MATRIX_MAX_AGE_DAYS", "30"))
+
+logger = logging.getLogger(__name__)
+
+Coordinate = Tuple[float, float]
+Leg = Tuple[float, float]  # (distance meters, duration seconds)
+BlockFetcher = Callable[[List[Coordinate], List[int], List[int]], Awaitable[dict | None]]
+
+_memory_cache = TTLCache(
+    maxsize=TRAVEL_MATRIX_MEMORY_SIZE, ttl=TRAVEL_MATRIX_MEMORY_TTL_SECONDS
+)
+_counters = {
+    "memory_pairs": 0,
+    "database_pairs": 0,
+    "fetched_pairs": 0,
+    "fetches": 0,
+    "replaced_pairs": 0,
+}
+# Bumped whenever a leg that was already stored is fetched again with new numbers, so
+# results solved on the old legs (route_cache) can tell they are out of date
+_generation = 0
+_changed_at: Dict[Tuple[str, str], int] = {}  # (source, coordinate key) -> generation
+
+
+def coordinate_key(coordinate: Coordinate) -> str:
+    lng, lat = coordinate
+    return f"{lng:.{TRAVEL_MATRIX_PRECISION}f},{lat:.{TRAVEL_MATRIX_PRECISION}f}"
+
+
+def matrix_cache_stats() -> dict:
+    return {"memory": _memory_cache.stats(), "generation": _generation, **_counters}
+
+
+def matrix_generation() -> int:
+    return _generation
+
+
+def legs_changed_since(source: str, keys: List[str], generation: int) -> bool:
+    """Whether a leg between any of these coordinate keys was replaced after generation."""
+    if generation == _generation:
+        return False
+    return any(_changed_at.get((source, key), 0) > generation for key in keys)
+
+
+def _record_replaced(source: str, pairs: List[Tuple[str, str]]) -> None:
+    global _generation
+    if not pairs:
+        return
+    _generation += 1
+    for origin, destination in pairs:
+        _changed_at[(source, origin)] = _generation
+        _changed_at[(source, destination)] = _generation
+    _counters["replaced_pairs"] += len(pairs)
+
+
+def _load_legs(
+    source: str, keys: List[str]
+) -> tuple[Dict[Tuple[str, str], Leg], Dict[Tuple[str, str], Leg]]:
+    """Stored legs among keys, split into fresh ones and those older than TRAVEL_MATRIX_MAX_AGE_DAYS."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=TRAVEL_MATRIX_MAX_AGE_DAYS)
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            TravelLeg.origin_key,
+            TravelLeg.destination_key,
+            TravelLeg.distance_meters,
+            TravelLeg.duration_seconds,
+            TravelLeg.updated_at,
+        ).filter(
+            TravelLeg.source == source,
+            TravelLeg.origin_key.in_(keys),
+            TravelLeg.destination_key.in_(keys),
+        ).all()
+        legs: Dict[Tuple[str, str], Leg] = {}
+        stale: Dict[Tuple[str, str], Leg] = {}
+        for origin, destination, distance, duration, updated_at in rows:
+            if updated_at is not None and updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            target = stale if updated_at is None or updated_at < cutoff else legs
+            target[(origin, destination)] = (distance, duration)
+        return legs, stale
+    finally:
+        db.close()
+
+
+def _store_legs(source: str, legs: Dict[Tuple[str, str], Leg]) -> None:
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return
+
+    rows = [
+        {
+            "source": source,
+            "origin_key": origin,
+            "destination_key": destination,
+            "distance_meters": distance,
+            "duration_seconds": duration,
+        }
+        for (origin, destination), (distance, duration) in legs.items()
+    ]
+    db = SessionLocal()
+    try:
+        for start in range(0, len(rows), 1000):
+            stmt = insert(TravelLeg).values(rows[start:start + 1000])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["source", "origin_key", "destination_key"],
+                set_={
+                    "distance_meters": stmt.excluded.distance_meters,
+                    "duration_seconds": stmt.excluded.duration_seconds,
+                    "updated_at": func.now(),
+                },
+            )
+            db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _vertex_cover(missing: List[Tuple[int, int]]) -> List[int]:
+    """Greedy cover: a few stops whose rows and columns contain every missing pair."""
+    partners: Dict[int, set] = {}
+    for i, j in missing:
+        partners.setdefault(i, set()).add(j)
+        partners.setdefault(j, set()).add(i)
+
+    cover = []
+    while partners:
+        node = max(partners, key=lambda k: len(partners[k]))
+        cover.append(node)
+        for other in partners.pop(node):
+            partners[other].discard(node)
+            if not partners[other]:
+                del partners[other]
+    return cover
+
+
+async def cached_travel_matrix(
+    coordinates: List[Coordinate],
+    fetch_block: BlockFetcher,
+    source: str,
+) -> dict | None:
+    """
+    Distance/duration matrix assembled from cached legs. Pairs missing from
+    the in-memory and database tiers are fetched as the rows and columns of
+    a small set of stops (one row + one column for a single new stop), then
+    written back to both tiers. Returns None when the fetch fails.
+    """
+    return (await cached_travel_matrices([coordinates], fetch_block, source))[0]
+
+
+async def cached_travel_matrices(
+    coordinate_sets: List[List[Coordinate]],
+    fetch_block: BlockFetcher,
+    source: str,
+) -> List[dict | None]:
+    """
+    cached_travel_matrix for several routes at once: one cache lookup and
+    one write for all of them, and legs shared between routes (a common
+    depot, repeat customers) are fetched only once. Blocks for every route
+    are fetched concurrently; a route whose legs could not all be fetched
+    gets None.
+    """
+    key_sets = [[coordinate_key(c) for c in coords] for coords in coordinate_sets]
+    known: Dict[Tuple[str, str], Leg] = {}
+
+    missing_keys = set()
+    stale: Dict[Tuple[str, str], Leg] = {}
+    hits = 0
+    for keys in key_sets:
+        for a in keys:
+            for b in keys:
+                if a == b or (a, b) in known:
+                    continue
+                leg = _memory_cache.get((source, a, b))
+                if leg is None:
+                    missing_keys.add((a, b))
+                else:
+                    known[(a, b)] = leg
+                    hits += 1
+    _counters["memory_pairs"] += hits
+
+    if missing_keys:
+        try:
+            all_keys = list({key for keys in key_sets for key in keys})
+            stored, stale = await asyncio.to_thread(_load_legs, source, all_keys)
+        except SQLAlchemyError as e:
+            logger.warning(f"Travel matrix lookup failed: {e}")
+            stored = {}
+        for pair in missing_keys:
+            leg = stored.get(pair)
+            if leg is not None:
+                known[pair] = leg
+                _memory_cache.set((source, *pair), leg)
+        _counters["database_pairs"] += len(missing_keys & stored.keys())
+
+    # Plan fetch blocks route by route, skipping pairs an earlier block already covers
+    planned: set = set()
+    requests = []
+    for coordinates, keys in zip(coordinate_sets, key_sets):
+        n = len(keys)
+        missing = [
+            (i, j)
+            for i in range(n)
+            for j in range(n)
+            if keys[i] != keys[j]
+            and (keys[i], keys[j]) not in known
+            and (keys[i], keys[j]) not in planned
+        ]
+        if not missing:
+            continue
+        cover = _vertex_cover(missing)
+        everything = list(range(n))
+        if len(cover) * 2 >= n:
+            blocks = [(everything, everything)]
+        else:
+            blocks = [(cover, everything), (everything, cover)]
+        for rows, cols in blocks:
+            planned.update((keys[i], keys[j]) for i in rows for j in cols)
+            requests.append((coordinates, keys, rows, cols))
+
+    fetched: Dict[Tuple[str, str], Leg] = {}
+    if requests:
+        results = await asyncio.gather(
+            *(fetch_block(coordinates, rows, cols) for coordinates, _, rows, cols in requests)
+        )
+        _counters["fetches"] += len(requests)
+        for (_, keys, rows, cols), result in zip(requests, results):
+            if result is None:
+                continue
+            for r, i in enumerate(rows):
+                for c, j in enumerate(cols):
+                    distance = result["distances"][r][c]
+                    duration = result["durations"][r][c]
+                    if keys[i] == keys[j] or distance is None or duration is None:
+                        continue
+                    fetched[(keys[i], keys[j])] = (distance, duration)
+
+        for (origin, destination), leg in fetched.items():
+            _memory_cache.set((source, origin, destination), leg)
+        _counters["fetched_pairs"] += len(fetched)
+        # Refetched expired legs only invalidate results when the road numbers changed
+        _record_replaced(
+            source, [pair for pair, leg in fetched.items() if pair in stale and stale[pair] != leg]
+        )
+        if fetched:
+            try:
+                await asyncio.to_thread(_store_legs, source, fetched)
+            except SQLAlchemyError as e:
+                logger.warning(f"Travel matrix write failed: {e}")
+        known.update(fetched)
+
+    matrices: List[dict | None] = []
+    for keys in key_sets:
+        n = len(keys)
+        distances: List[List[float]] = [[0.0] * n for _ in range(n)]
+        durations: List[List[float]] = [[0.0] * n for _ in range(n)]
+        complete = True
+        for i in range(n):
+            for j in range(n):
+                if keys[i] == keys[j]:
+                    continue
+                leg = known.get((keys[i], keys[j]))
+                if leg is None:
+                    complete = False
+                    break
+                distances[i][j], durations[i][j] = leg
+            if not complete:
+                break
+        matrices.append({"distances": distances, "durations": durations} if complete else None)
+    return matrices
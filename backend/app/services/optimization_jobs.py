@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List
+
+from app.models.route import RouteRequest, RouteResponse
+from app.services.anytime import iterated_local_search
+from app.services.geocode import geocode_many
+from app.services.local_search import path_cost, solve_stop_order
+from app.services.optimizer import (
+    MILES_PER_METER,
+    get_travel_matrix,
+    improvement_percent,
+    route_addresses,
+    route_entries,
+    route_geometry,
+    route_stops_from_order,
+    window_constraints,
+)
+from app.services.route_edits import has_windows, schedule_order
+from app.services.routing_backends import get_routing_backend
+from app.services.solver_pool import OPTIMIZER_WORKERS, SolverBusy, solver_pool
+from app.services.time_windows import solve_with_time_windows
+from app.utils.cache import TTLCache
+
+OPTIMIZATION_JOB_BUDGET_SECONDS = float(os.getenv("OPTIMIZATION_JOB_BUDGET_SECONDS", "30"))
+OPTIMIZATION_JOB_MAX_BUDGET_SECONDS = float(os.getenv("OPTIMIZATION_JOB_MAX_BUDGET_SECONDS", "300"))
+# Each round is one solver-pool job; the best tour is published between rounds
+OPTIMIZATION_JOB_ROUND_SECONDS = float(os.getenv("OPTIMIZATION_JOB_ROUND_SECONDS", "1.0"))
+OPTIMIZATION_JOB_TTL_SECONDS = float(os.getenv("OPTIMIZATION_JOB_TTL_SECONDS", "3600"))
+# Jobs improving at once; the rest stay queued. Half the pool by default, so interactive
+# solves always find a free worker
+OPTIMIZATION_JOB_MAX_RUNNING = int(
+    os.getenv("OPTIMIZATION_JOB_MAX_RUNNING", str(max(OPTIMIZER_WORKERS // 2, 1)))
+)
+# Unfinished jobs (queued or running) one user may hold
+OPTIMIZATION_JOB_MAX_PER_USER = int(os.getenv("OPTIMIZATION_JOB_MAX_PER_USER", "3"))
+# A round that finds the pool full is retried every 0.5 s this many times, then given up
+OPTIMIZATION_JOB_BUSY_RETRIES = int(os.getenv("OPTIMIZATION_JOB_BUSY_RETRIES", "20"))
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("completed", "stopped", "failed")
+
+OnComplete = Callable[[RouteResponse], Awaitable[dict]]
+
+
+class TooManyJobs(RuntimeError):
+    """Raised when a user already has OPTIMIZATION_JOB_MAX_PER_USER unfinished jobs."""
+
+
+class OptimizationJob:
+    """A route being improved in the background; readers wait on `changed`."""
+
+    def __init__(self, request: RouteRequest, budget: float, owner: str | None):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.budget = budget
+        self.owner = owner
+        self.status = "queued"
+        self.rounds = 0
+        self.best: RouteResponse | None = None
+        self.result: dict | None = None  # Extra output, e.g. the saved route id
+        self.error: str | None = None
+        self.created_at = datetime.now(timezone.utc)
+        self.updated_at = self.created_at
+        self.version = 0
+        self.stop_requested = False
+        self.changed = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    async def publish(self, **changes) -> None:
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.updated_at = datetime.now(timezone.utc)
+        async with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        """Wait until the job moves past version; False on timeout."""
+        async with self.changed:
+            try:
+                await asyncio.wait_for(
+                    self.changed.wait_for(lambda: self.version > version), timeout
+                )
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "rounds": self.rounds,
+            "time_budget_seconds": self.budget,
+            "elapsed_seconds": round((self.updated_at - self.created_at).total_seconds(), 3),
+            "best": self.best.model_dump(mode="json") if self.best else None,
+            "result": self.result,
+            "error": self.error,
+            "version": self.version,
+        }
+
+
+async def _next_round(fn, *args):
+    # A busy pool only delays a background job, up to OPTIMIZATION_JOB_BUSY_RETRIES times
+    for _ in range(OPTIMIZATION_JOB_BUSY_RETRIES):
+        try:
+            return await solver_pool.run(fn, *args)
+        except SolverBusy:
+            await asyncio.sleep(0.5)
+    return await solver_pool.run(fn, *args)
+
+
+async def _run(job: OptimizationJob, on_complete: OnComplete | None) -> None:
+    request = job.request
+    started = time.perf_counter()
+    deadline = started + job.budget
+    await job.publish(status="running")
+
+    locations = await geocode_many(route_addresses(request))
+    entries, failed = route_entries(request, locations)
+    backend = get_routing_backend(request.routing_backend)
+    matrix = await get_travel_matrix([entry["location"] for entry in entries], backend)
+    distances, durations = matrix["distances"], matrix["durations"]
+
+    departure = request.departure_time
+    if departure and departure.tzinfo is None:
+        departure = departure.replace(tzinfo=timezone.utc)
+    windows = None
+    unscheduled: List[int] = []
+    first_round = min(OPTIMIZATION_JOB_ROUND_SECONDS, job.budget)
+    if has_windows(entries):
+        departure = departure or datetime.now(timezone.utc)
+        service, earliest, latest = window_constraints(entries, departure)
+        windows = (durations, service, earliest, latest)
+        order, unscheduled = await _next_round(
+            solve_with_time_windows, durations, service, earliest, latest, first_round
+        )
+        initial_meters = None
+    else:
+        order, initial_meters, _ = await _next_round(solve_stop_order, distances, first_round)
+
+    def response(order: List[int]) -> RouteResponse:
+        if departure is None:
+            stops, total_distance, total_eta = route_stops_from_order(
+                entries, order, distances, durations
+            )
+        else:
+            stops, total_distance, total_eta = schedule_order(entries, order, matrix, departure)
+        initial = round(initial_meters * MILES_PER_METER, 2) if initial_meters else None
+        return RouteResponse(
+            stops=stops,
+            total_eta=total_eta,
+            total_distance_miles=total_distance,
+            initial_distance_miles=initial,
+            improvement_percent=improvement_percent(initial, total_distance) if initial else None,
+            unscheduled_stops=[entries[idx]["address"] for idx in unscheduled],
+            ungeocoded_stops=failed,
+            routing_backend=matrix["source"],
+        )
+
+    await job.publish(best=response(order), rounds=1)
+
+    best_cost = path_cost([0] + order, distances)
+    while not job.stop_requested and deadline - time.perf_counter() > 0.05:
+        budget = min(OPTIMIZATION_JOB_ROUND_SECONDS, deadline - time.perf_counter())
+        try:
+            candidate, cost = await _next_round(
+                iterated_local_search, order, distances, budget, job.rounds, windows
+            )
+        except SolverBusy:
+            # The pool stayed full; finish with the route found so far
+            logger.warning(f"Optimization job {job.id} ended early: solver pool busy")
+            break
+        job.rounds += 1
+        if cost < best_cost - 1e-9:
+            order, best_cost = candidate, cost
+            await job.publish(best=response(order))
+
+    best = job.best
+    if request.include_geometry:
+        best.geometry = await route_geometry(best.stops, backend, matrix["source"])
+    result = await on_complete(best) if on_complete else None
+    await job.publish(
+        status="stopped" if job.stop_requested else "completed",
+        best=best,
+        result=result,
+    )
+
+
+class OptimizationJobRegistry:
+    def __init__(self):
+        self._jobs = TTLCache(maxsize=1000, ttl=OPTIMIZATION_JOB_TTL_SECONDS)
+        self._tasks: set[asyncio.Task] = set()
+        self._running = asyncio.Semaphore(OPTIMIZATION_JOB_MAX_RUNNING)
+        self._unfinished: dict[str | None, int] = {}  # owner -> queued or running jobs
+
+    def submit(
+        self,
+        request: RouteRequest,
+        budget: float | None = None,
+        owner: str | None = None,
+        on_complete: OnComplete | None = None,
+    ) -> OptimizationJob:
+        """
+        Start improving request in the background for up to budget seconds, once
+        one of OPTIMIZATION_JOB_MAX_RUNNING slots is free. on_complete receives
+        the final best route (also after an early stop). Raises TooManyJobs when
+        owner already has OPTIMIZATION_JOB_MAX_PER_USER unfinished jobs.
+        """
+        if self._unfinished.get(owner, 0) >= OPTIMIZATION_JOB_MAX_PER_USER:
+            raise TooManyJobs(
+                f"At most {OPTIMIZATION_JOB_MAX_PER_USER} optimization jobs may run at once; "
+                "wait for one to finish or stop it"
+            )
+        budget = OPTIMIZATION_JOB_BUDGET_SECONDS if budget is None else budget
+        job = OptimizationJob(request, min(budget, OPTIMIZATION_JOB_MAX_BUDGET_SECONDS), owner)
+        self._jobs.set(job.id, job)
+        self._unfinished[owner] = self._unfinished.get(owner, 0) + 1
+        job.task = asyncio.create_task(self._guard(job, on_complete))
+        self._tasks.add(job.task)
+        job.task.add_done_callback(self._tasks.discard)
+        job.task.add_done_callback(lambda _: self._release(owner))
+        return job
+
+    def _release(self, owner: str | None) -> None:
+        remaining = self._unfinished.pop(owner) - 1
+        if remaining:
+            self._unfinished[owner] = remaining
+
+    async def _guard(self, job: OptimizationJob, on_complete: OnComplete | None) -> None:
+        async with self._running:
+            if job.stop_requested:
+                # Stopped while queued: there is no route to keep
+                await job.publish(status="stopped")
+                return
+            try:
+                await _run(job, on_complete)
+            except Exception as e:
+                logger.exception(f"Optimization job {job.id} failed")
+                await job.publish(status="failed", error=str(e))
+
+    def get(self, job_id: str) -> OptimizationJob | None:
+        return self._jobs.get(job_id)
+
+    def stop(self, job: OptimizationJob) -> None:
+        """Ask the job to finish after its current round, keeping the best tour so far."""
+        job.stop_requested = True
+
+    async def close(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+optimization_jobs = OptimizationJobRegistry()
@@ -1,16 +1,28 @@
-import os
+import asyncio
+from datetime import datetime, timedelta, timezone
 from math import atan2, cos, radians, sin, sqrt
 from typing import List, Tuple
 
-import httpx
-
-from app.services.geocode import geocode_address
+from app.services.exact_solver import solve_route_order
+from app.services.geocode import geocode_many
+from app.services.matrix_cache import cached_travel_matrices, matrix_generation
+from app.services.route_cache import route_cache, route_cache_key, route_cache_status
+from app.services.routing_backends import (
+    RoutingBackend,
+    get_routing_backend,
+    offline_backend,
+    routing_backends,
+)
+from app.services.solver_pool import SolverBusy, SolverTimeout, capped_budget, solver_pool
+from app.services.time_windows import (
+    WindowSchedule,
+    solve_with_time_windows,
+    window_bounds,
+)
 from app.models.route import OptimizedStop, RouteRequest, RouteResponse
 
-AVERAGE_SPEED_MPH = 32  # Conservative blended urban speed
 STOP_BUFFER_MINUTES = 5  # Loading/unloading allowance per stop
 MILES_PER_METER = 0.000621371
-OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
 
 Coordinate = Tuple[float, float]
 
@@ -31,7 +43,7 @@ def haversine_miles(origin: Coordinate, destination: Coordinate) -> float:
 
 
 def order_stops_by_distance(start: Coordinate, stops: List[dict]) -> List[dict]:
-    """Nearest-neighbor fallback when OSRM data is unavailable."""
+    """Scalar nearest-neighbor ordering; kept as the baseline for benchmarks."""
     remaining = stops.copy()
     ordered: List[dict] = []
     current = start
@@ -48,59 +60,88 @@ def order_stops_by_distance(start: Coordinate, stops: List[dict]) -> List[dict]:
     return ordered
 
 
-def nearest_neighbor_indices(dist_matrix: List[List[float]]) -> List[int]:
-    n = len(dist_matrix)
-    unvisited = set(range(1, n))
-    order: List[int] = []
-    current = 0
-
-    while unvisited:
-        next_idx = min(
-            unvisited,
-            key=lambda idx: dist_matrix[current][idx]
-            if dist_matrix[current][idx] is not None
-            else float("inf"),
+async def fetch_osrm_table(coordinates: List[Coordinate]) -> dict | None:
+    """Full N x N matrix from the public OSRM backend."""
+    if len(coordinates) < 2:
+        return None
+    everything = list(range(len(coordinates)))
+    return await routing_backends["osrm"].matrix(coordinates, everything, everything)
+
+
+async def get_travel_matrix(
+    coordinates: List[Coordinate],
+    backend: RoutingBackend | None = None,
+) -> dict:
+    """
+    Distance/duration matrix from the given (or configured) routing backend,
+    or the offline estimate when that backend is unusable. The "source" key
+    names the backend whose numbers were used.
+    """
+    return (await get_travel_matrices([coordinates], backend))[0]
+
+
+async def get_travel_matrices(
+    coordinate_sets: List[List[Coordinate]],
+    backend: RoutingBackend | None = None,
+) -> List[dict]:
+    """get_travel_matrix for several routes with one shared cache pass and fetch."""
+    backend = backend or get_routing_backend()
+    if backend.cache_matrix:
+        matrices = await cached_travel_matrices(
+            coordinate_sets, backend.matrix, source=backend.name
+        )
+    else:
+        matrices = await asyncio.gather(
+            *(
+                backend.matrix(coords, list(range(len(coords))), list(range(len(coords))))
+                for coords in coordinate_sets
+            )
         )
-        if dist_matrix[current][next_idx] is None:
-            break
-        order.append(next_idx)
-        unvisited.remove(next_idx)
-        current = next_idx
 
-    if unvisited:
-        raise ValueError("OSRM matrix could not connect all stops")
+    results = []
+    for coords, matrix in zip(coordinate_sets, matrices):
+        source = backend.name
+        if not matrix or any(val is None for row in matrix["distances"] for val in row):
+            everything = list(range(len(coords)))
+            source = offline_backend.name
+            matrix = await offline_backend.matrix(coords, everything, everything)
+        results.append({**matrix, "source": source})
+    return results
 
-    return order
 
+def improvement_percent(initial_distance: float, final_distance: float) -> float:
+    if initial_distance <= 0:
+        return 0.0
+    return round((initial_distance - final_distance) / initial_distance * 100, 2)
 
-async def fetch_osrm_table(coordinates: List[Coordinate]) -> dict | None:
-    if len(coordinates) < 2:
-        return None
 
-    coord_str = ";".join(f"{lng},{lat}" for lng, lat in coordinates)
-    url = f"{OSRM_BASE_URL}/table/v1/driving/{coord_str}"
-    params = {"annotations": "duration,distance"}
+async def build_route_from_matrix(
+    entries: List[dict],
+    distances: List[List[float]],
+    durations: List[List[float]],
+    time_budget_seconds: float | None = None,
+) -> tuple[list[OptimizedStop], float, int, float, str, bool]:
+    """
+    Solve the stop order (exactly for short routes) and lay it out. Also returns
+    the nearest-neighbor distance, the solver used and whether it is proven optimal.
+    """
+    indices, initial_meters, _, solver, optimal = await solver_pool.run(
+        solve_route_order, distances, capped_budget(time_budget_seconds)
+    )
+    optimized_stops, total_distance, total_eta = route_stops_from_order(
+        entries, indices, distances, durations
+    )
+    initial_distance = round(initial_meters * MILES_PER_METER, 2)
+    return optimized_stops, total_distance, total_eta, initial_distance, solver, optimal
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            response = await client.get(url, params=params)
-            data = response.json()
-            if response.status_code == 200 and data.get("code") == "Ok":
-                distances = data.get("distances")
-                durations = data.get("durations")
-                if distances and durations:
-                    return {"distances": distances, "durations": durations}
-        except httpx.HTTPError:
-            return None
-    return None
-
-
-def build_route_from_matrix(
+
+def route_stops_from_order(
     entries: List[dict],
+    indices: List[int],
     distances: List[List[float]],
     durations: List[List[float]],
 ) -> tuple[list[OptimizedStop], float, int]:
-    indices = nearest_neighbor_indices(distances)
+    """Lay out a solved stop order (entries[0] is the pickup) with legs and ETAs."""
     optimized_stops: list[OptimizedStop] = [
         OptimizedStop(
             address=entries[0]["address"],
@@ -133,67 +174,271 @@ def build_route_from_matrix(
     return optimized_stops, round(total_distance, 2), current_eta
 
 
-async def optimize_route_real(request: RouteRequest) -> RouteResponse:
-    pickup_coords = await geocode_address(request.pickup)
+def seconds_after(departure: datetime, moment: datetime | None) -> float | None:
+    """Offset of moment from departure; naive times are read in departure's zone."""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=departure.tzinfo)
+    return (moment - departure).total_seconds()
+
+
+def window_constraints(
+    entries: List[dict], departure: datetime
+) -> tuple[List[float], List[float], List[float]]:
+    """Service time plus earliest/latest start (seconds from departure) per entry."""
+    bounds = [
+        window_bounds(
+            seconds_after(departure, entry.get("window_start")),
+            seconds_after(departure, entry.get("window_end")),
+        )
+        for entry in entries
+    ]
+    service = [STOP_BUFFER_MINUTES * 60] * len(entries)
+    return service, [lo for lo, _ in bounds], [hi for _, hi in bounds]
+
+
+def window_route_stops(
+    entries: List[dict],
+    schedule: WindowSchedule,
+    distances: List[List[float]],
+    departure: datetime,
+) -> tuple[list[OptimizedStop], float, int]:
+    """Lay out a scheduled path (schedule.path[0] is the pickup) with real arrival times."""
+    optimized_stops = [
+        OptimizedStop(
+            address=entries[0]["address"],
+            location=entries[0]["location"],
+            eta_minutes=0,
+            distance_miles=0.0,
+            arrival_time=departure,
+        )
+    ]
+    total_distance = 0.0
+    for k, idx in enumerate(schedule.path[1:], start=1):
+        leg_distance_miles = (distances[schedule.path[k - 1]][idx] or 0.0) * MILES_PER_METER
+        total_distance += leg_distance_miles
+        optimized_stops.append(
+            OptimizedStop(
+                address=entries[idx]["address"],
+                location=entries[idx]["location"],
+                eta_minutes=int(round(schedule.start[k] / 60)),
+                distance_miles=round(leg_distance_miles, 2),
+                arrival_time=departure + timedelta(seconds=schedule.start[k]),
+            )
+        )
+    return optimized_stops, round(total_distance, 2), optimized_stops[-1].eta_minutes
+
+
+async def build_time_window_route(
+    entries: List[dict],
+    distances: List[List[float]],
+    durations: List[List[float]],
+    departure: datetime,
+    time_budget_seconds: float | None = None,
+) -> tuple[list[OptimizedStop], float, int, List[int]]:
+    """
+    Order entries so each stop is served inside its delivery window, using
+    the duration matrix plus STOP_BUFFER_MINUTES of service per stop.
+    Returns stops with real arrival times and the indices left unscheduled.
+    """
+    service, earliest, latest = window_constraints(entries, departure)
+    order, unscheduled = await solver_pool.run(
+        solve_with_time_windows, durations, service, earliest, latest, capped_budget(time_budget_seconds)
+    )
+    schedule = WindowSchedule([0] + order, durations, service, earliest, latest)
+    optimized_stops, total_distance, total_eta = window_route_stops(
+        entries, schedule, distances, departure
+    )
+    return optimized_stops, total_distance, total_eta, unscheduled
+
+
+async def route_geometry(
+    stops: List[OptimizedStop], backend: RoutingBackend, matrix_source: str
+) -> dict | None:
+    """Road geometry for the stops in order; straight lines if the backend has none."""
+    coordinates = [stop.location for stop in stops]
+    geometry = None
+    if matrix_source == backend.name:
+        geometry = await backend.route_geometry(coordinates)
+    if geometry is None:
+        geometry = await offline_backend.route_geometry(coordinates)
+    return geometry["geometry"]
+
+
+def route_addresses(request: RouteRequest) -> List[str]:
+    """Addresses that still need geocoding; pre-resolved locations are used as given."""
+    addresses = [] if request.pickup_location else [request.pickup]
+    return addresses + [stop.address for stop in request.stops if not stop.location]
+
+
+def route_entries(request: RouteRequest, locations: dict) -> tuple[List[dict], List[str]]:
+    """Pickup + geocoded stops (entries[0] is the pickup) and the addresses that failed."""
+    pickup_coords = request.pickup_location or locations.get(request.pickup)
     if not pickup_coords:
         raise ValueError("Failed to geocode pickup location")
 
     geocoded_stops: list[dict] = []
+    failed_addresses: list[str] = []
     for stop in request.stops:
-        coords = await geocode_address(stop.address)
-        if coords:
-            geocoded_stops.append({"address": stop.address, "location": coords})
+        coords = stop.location or locations.get(stop.address)
+        if not coords:
+            failed_addresses.append(stop.address)
+        else:
+            geocoded_stops.append(
+                {
+                    "address": stop.address,
+                    "location": coords,
+                    "window_start": stop.window_start,
+                    "window_end": stop.window_end,
+                }
+            )
 
     if not geocoded_stops:
         raise ValueError("No deliverable stops could be geocoded")
 
     entries = [{"address": request.pickup, "location": pickup_coords}] + geocoded_stops
-    coordinates = [entry["location"] for entry in entries]
+    return entries, failed_addresses
 
-    osrm_table = await fetch_osrm_table(coordinates)
-    if osrm_table and not any(
-        val is None for row in osrm_table["distances"] for val in row
-    ):
-        optimized, total_distance, total_eta = build_route_from_matrix(
+
+async def optimize_route_real(request: RouteRequest) -> RouteResponse:
+    """
+    Optimize one route, answering repeats of the same pickup, stop set and
+    options from route_cache. The outcome is recorded in route_cache_status.
+    """
+    backend = get_routing_backend(request.routing_backend)
+    key = route_cache_key(request, backend.name)
+    cached = route_cache.get(key, request) if key else None
+    if cached is not None:
+        response, age = cached
+        route_cache_status.set(("HIT", age))
+        return response
+    route_cache_status.set(("MISS" if key else "BYPASS", None))
+
+    locations = await geocode_many(route_addresses(request))
+    entries, failed_addresses = route_entries(request, locations)
+    locations = [entry["location"] for entry in entries]
+    matrix = await get_travel_matrix(locations, backend)
+    generation = matrix_generation()
+    response = await solve_route(request, entries, failed_addresses, matrix, backend)
+    # Offline fallbacks and routes missing stops that failed to geocode are not cached,
+    # so the route is re-solved once the backend or geocoder is back
+    if key and response.routing_backend == backend.name and not response.ungeocoded_stops:
+        route_cache.set(key, response, locations, generation)
+    return response
+
+
+async def optimize_routes_batch(
+    requests: List[RouteRequest],
+) -> List[RouteResponse | Exception]:
+    """
+    Optimize many routes with one geocoding pass, one travel matrix fetch per
+    routing backend, and solves spread over the solver pool. Each item is a
+    RouteResponse or the exception that route raised.
+    """
+    locations = await geocode_many(
+        [address for request in requests for address in route_addresses(request)]
+    )
+
+    results: List[RouteResponse | Exception | None] = [None] * len(requests)
+    prepared: dict[str, list] = {}
+    for k, request in enumerate(requests):
+        try:
+            backend = get_routing_backend(request.routing_backend)
+            entries, failed = route_entries(request, locations)
+        except ValueError as e:
+            results[k] = e
+            continue
+        prepared.setdefault(backend.name, []).append((k, entries, failed))
+
+    # Leave pool capacity for other requests rather than queueing the whole batch at once
+    semaphore = asyncio.Semaphore(max(solver_pool.workers, 1))
+
+    async def solve(k: int, entries: List[dict], failed: List[str], matrix: dict, backend) -> None:
+        async with semaphore:
+            try:
+                results[k] = await solve_route(requests[k], entries, failed, matrix, backend)
+            except (ValueError, SolverBusy, SolverTimeout) as e:
+                results[k] = e
+
+    matrix_sets = await asyncio.gather(
+        *(
+            get_travel_matrices(
+                [[entry["location"] for entry in entries] for _, entries, _ in items],
+                routing_backends[name],
+            )
+            for name, items in prepared.items()
+        )
+    )
+    await asyncio.gather(
+        *(
+            solve(k, entries, failed, matrix, routing_backends[name])
+            for (name, items), matrices in zip(prepared.items(), matrix_sets)
+            for (k, entries, failed), matrix in zip(items, matrices)
+        )
+    )
+    return results
+
+
+async def solve_route(
+    request: RouteRequest,
+    entries: List[dict],
+    failed_addresses: List[str],
+    matrix: dict,
+    backend: RoutingBackend,
+) -> RouteResponse:
+    """Order one route's geocoded entries on its travel matrix."""
+    geocoded_stops = entries[1:]
+    departure = request.departure_time
+    if departure and departure.tzinfo is None:
+        departure = departure.replace(tzinfo=timezone.utc)
+
+    if any(stop["window_start"] or stop["window_end"] for stop in geocoded_stops):
+        departure = departure or datetime.now(timezone.utc)
+        optimized, total_distance, total_eta, unscheduled = await build_time_window_route(
             entries,
-            osrm_table["distances"],
-            osrm_table["durations"],
+            matrix["distances"],
+            matrix["durations"],
+            departure,
+            request.time_budget_seconds,
+        )
+        return RouteResponse(
+            stops=optimized,
+            total_eta=total_eta,
+            total_distance_miles=total_distance,
+            map_url=None,
+            unscheduled_stops=[entries[idx]["address"] for idx in unscheduled],
+            ungeocoded_stops=failed_addresses,
+            routing_backend=matrix["source"],
+            solver="time_windows",
+            optimal=False,
+            geometry=await route_geometry(optimized, backend, matrix["source"])
+            if request.include_geometry
+            else None,
         )
-    else:
-        ordered = order_stops_by_distance(pickup_coords, geocoded_stops)
-        optimized = [
-            OptimizedStop(
-                address=request.pickup,
-                location=pickup_coords,
-                eta_minutes=0,
-                distance_miles=0.0,
-            )
-        ]
-        current_location = pickup_coords
-        current_eta = 0
-        total_distance = 0.0
-
-        for stop in ordered:
-            leg_distance = haversine_miles(current_location, stop["location"])
-            travel_minutes = (leg_distance / AVERAGE_SPEED_MPH) * 60
-            current_eta += int(round(travel_minutes + STOP_BUFFER_MINUTES))
-            total_distance += leg_distance
-            optimized.append(
-                OptimizedStop(
-                    address=stop["address"],
-                    location=stop["location"],
-                    eta_minutes=current_eta,
-                    distance_miles=round(leg_distance, 2),
-                )
-            )
-            current_location = stop["location"]
 
-        total_eta = current_eta
-        total_distance = round(total_distance, 2)
+    optimized, total_distance, total_eta, initial_distance, solver, optimal = await build_route_from_matrix(
+        entries,
+        matrix["distances"],
+        matrix["durations"],
+        request.time_budget_seconds,
+    )
+    if departure:
+        for stop in optimized:
+            stop.arrival_time = departure + timedelta(minutes=stop.eta_minutes)
 
     return RouteResponse(
         stops=optimized,
         total_eta=total_eta,
         total_distance_miles=round(total_distance, 2),
         map_url=None,
+        initial_distance_miles=initial_distance,
+        improvement_percent=improvement_percent(initial_distance, total_distance),
+        ungeocoded_stops=failed_addresses,
+        routing_backend=matrix["source"],
+        solver=solver,
+        optimal=optimal,
+        geometry=await route_geometry(optimized, backend, matrix["source"])
+        if request.include_geometry
+        else None,
     )
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.models.produce import ProduceRequest
+from app.services.geocode import geocode_many
+from app.services.request_matching import request_matcher
+
+# New requests are picked up as soon as notify() is called; the interval is a safety net
+# for rows written by other processes (sync scripts, other workers)
+REQUEST_GEOCODING_BATCH_SIZE = int(os.getenv("REQUEST_GEOCODING_BATCH_SIZE", "100"))
+REQUEST_GEOCODING_INTERVAL_SECONDS = float(os.getenv("REQUEST_GEOCODING_INTERVAL_SECONDS", "60"))
+# An address the geocoder could not resolve is not retried until this has passed
+REQUEST_GEOCODING_RETRY_SECONDS = float(os.getenv("REQUEST_GEOCODING_RETRY_SECONDS", str(6 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+def clear_request_coordinates(request: ProduceRequest) -> None:
+    """Forget stored coordinates so the geocoder resolves the new address."""
+    request.delivery_latitude = None
+    request.delivery_longitude = None
+    request_geocoder.retry(request.id)
+
+
+def _pending_batch(limit: int, after_id: int) -> list[tuple[int, str]]:
+    """The next pending requests by id, after after_id."""
+    db = SessionLocal()
+    try:
+        query = db.query(ProduceRequest.id, ProduceRequest.delivery_address).filter(
+            or_(ProduceRequest.delivery_latitude.is_(None), ProduceRequest.delivery_longitude.is_(None)),
+            ProduceRequest.id > after_id,
+        )
+        return [tuple(row) for row in query.order_by(ProduceRequest.id).limit(limit).all()]
+    finally:
+        db.close()
+
+
+def _pending_count() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(ProduceRequest).filter(
+            or_(ProduceRequest.delivery_latitude.is_(None), ProduceRequest.delivery_longitude.is_(None))
+        ).count()
+    finally:
+        db.close()
+
+
+def _store(resolved: list[tuple[int, str, tuple[float, float]]]) -> int:
+    db = SessionLocal()
+    try:
+        stored = 0
+        for request_id, address, (lng, lat) in resolved:
+            # Skipped if the address changed while it was being geocoded
+            stored += db.query(ProduceRequest).filter(
+                ProduceRequest.id == request_id,
+                ProduceRequest.delivery_address == address,
+            ).update(
+                {"delivery_latitude": lat, "delivery_longitude": lng},
+                synchronize_session=False,
+            )
+        db.commit()
+        return stored
+    finally:
+        db.close()
+
+
+class RequestGeocoder:
+    """Fills ProduceRequest.delivery_latitude/longitude in batches, off the request path."""
+
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._retry_at: dict[int, float] = {}  # Request id -> when a failed address may be retried
+        self._counters = {"batches": 0, "geocoded": 0, "failed": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def notify(self) -> None:
+        """Geocode new or changed requests now instead of at the next interval."""
+        self._wake.set()
+
+    def retry(self, request_id: int | None) -> None:
+        self._retry_at.pop(request_id, None)
+
+    def _backing_off(self) -> set[int]:
+        now = time.monotonic()
+        self._retry_at = {k: at for k, at in self._retry_at.items() if at > now}
+        return set(self._retry_at)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except SQLAlchemyError as e:
+                logger.warning(f"Request geocoding pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def run_once(self) -> int:
+        """Geocode every pending request, one batch at a time; returns how many were stored."""
+        stored = 0
+        # An id cursor scans the pending set once per pass; requests backing off after a
+        # failed lookup are skipped here rather than excluded in SQL
+        backing_off = self._backing_off()
+        last_id = 0
+        while True:
+            rows = await asyncio.to_thread(_pending_batch, self.batch_size, last_id)
+            if not rows:
+                return stored
+            last_id = rows[-1][0]
+            batch = [(request_id, address) for request_id, address in rows if request_id not in backing_off]
+            if not batch:
+                continue
+
+            locations = await geocode_many(address for _, address in batch)
+            resolved = []
+            for request_id, address in batch:
+                coords = locations.get(address)
+                if coords:
+                    resolved.append((request_id, address, coords))
+                else:
+                    self._retry_at[request_id] = time.monotonic() + REQUEST_GEOCODING_RETRY_SECONDS
+            stored += await asyncio.to_thread(_store, resolved)
+            # Bulk updates skip ORM events, so tell the matcher directly
+            for request_id, _, _ in resolved:
+                request_matcher.mark_request(request_id)
+            self._counters["batches"] += 1
+            self._counters["geocoded"] += len(resolved)
+            self._counters["failed"] += len(batch) - len(resolved)
+
+    async def stats(self) -> dict:
+        return {
+            "pending": await asyncio.to_thread(_pending_count),
+            "batch_size": self.batch_size,
+            "interval_seconds": self.interval,
+            "running": self._task is not None and not self._task.done(),
+            "backing_off": len(self._retry_at),
+            **self._counters,
+        }
+
+
+request_geocoder = RequestGeocoder(REQUEST_GEOCODING_BATCH_SIZE, REQUEST_GEOCODING_INTERVAL_SECONDS)
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import chain
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.produce import ProduceInventory, ProduceRequest
+from app.services.vrp import demand_in_kg
+from app.utils.cache import TTLCache
+from app.utils.geo import bounding_box, grid_cell, grid_cells, haversine_km
+
+MATCH_MAX_DISTANCE_KM = float(os.getenv("MATCH_MAX_DISTANCE_KM", "150"))
+# This process's own writes are applied incrementally as they commit; writes from other
+# processes are picked up by a full rebuild in the background every interval
+MATCH_INDEX_REFRESH_SECONDS = float(os.getenv("MATCH_INDEX_REFRESH_SECONDS", "300"))
+MATCH_BUCKET_DEGREES = 1.0  # ~111 km buckets; a 150 km search touches a few dozen
+MATCH_WEIGHTS = {"quantity": 0.4, "price": 0.3, "distance": 0.3}
+
+logger = logging.getLogger(__name__)
+
+
+def produce_key(produce_type: str | None) -> str:
+    """Comparable produce type: case, spacing and simple plurals ignored."""
+    key = " ".join((produce_type or "").lower().split())
+    if key.endswith("oes"):
+        return key[:-2]
+    if key.endswith("s") and not key.endswith("ss"):
+        return key[:-1]
+    return key
+
+
+def _utc(moment: datetime | None) -> datetime | None:
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def _load_requests(ids: List[int] | None = None) -> List[dict]:
+    """Matchable requests: pending, unassigned and geocoded."""
+    db = SessionLocal()
+    try:
+        query = db.query(
+            ProduceRequest.id,
+            ProduceRequest.produce_type,
+            ProduceRequest.quantity_needed,
+            ProduceRequest.unit,
+            ProduceRequest.max_price_per_unit,
+            ProduceRequest.delivery_latitude,
+            ProduceRequest.delivery_longitude,
+            ProduceRequest.delivery_window_end,
+        ).filter(
+            ProduceRequest.status == "pending",
+            ProduceRequest.assigned_seller_id.is_(None),
+            ProduceRequest.delivery_latitude.isnot(None),
+            ProduceRequest.delivery_longitude.isnot(None),
+        )
+        if ids is not None:
+            query = query.filter(ProduceRequest.id.in_(ids))
+        return [
+            {
+                "id": row.id,
+                "produce_key": produce_key(row.produce_type),
+                "quantity_kg": demand_in_kg(row.quantity_needed, row.unit),
+                "max_price": row.max_price_per_unit,
+                "latitude": row.delivery_latitude,
+                "longitude": row.delivery_longitude,
+                "window_end": _utc(row.delivery_window_end),
+            }
+            for row in query
+        ]
+    finally:
+        db.close()
+
+
+def _load_inventory(seller_id: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(ProduceInventory).filter(
+            ProduceInventory.seller_id == seller_id,
+            ProduceInventory.is_available == True,
+            ProduceInventory.quantity_available > 0,
+            ProduceInventory.latitude.isnot(None),
+            ProduceInventory.longitude.isnot(None),
+        ).all()
+        return [
+            {
+                "id": item.id,
+                "produce_key": produce_key(item.produce_type),
+                "quantity_kg": demand_in_kg(item.quantity_available, item.unit),
+                "price": item.price_per_unit,
+                "latitude": item.latitude,
+                "longitude": item.longitude,
+            }
+            for item in rows
+        ]
+    finally:
+        db.close()
+
+
+def score_match(item: dict, request: dict, max_distance_km: float) -> dict | None:
+    """
+    Score (0-100) of serving request from inventory item, or None if it cannot:
+    over the price ceiling or further than max_distance_km. Quantity coverage,
+    price headroom under the ceiling and closeness are weighted by MATCH_WEIGHTS.
+    """
+    distance = haversine_km(item["latitude"], item["longitude"], request["latitude"], request["longitude"])
+    if distance > max_distance_km:
+        return None
+    max_price = request["max_price"]
+    if max_price and item["price"] > max_price:
+        return None
+
+    needed = request["quantity_kg"]
+    coverage = min(1.0, item["quantity_kg"] / needed) if needed > 0 else 1.0
+    price = 1.0 - item["price"] / max_price if max_price else 0.5  # No ceiling: neutral
+    closeness = 1.0 - distance / max_distance_km
+    score = (
+        MATCH_WEIGHTS["quantity"] * coverage
+        + MATCH_WEIGHTS["price"] * price
+        + MATCH_WEIGHTS["distance"] * closeness
+    )
+    return {
+        "request_id": request["id"],
+        "inventory_id": item["id"],
+        "score": round(100 * score, 1),
+        "distance_km": round(distance, 2),
+        "quantity_coverage": round(coverage, 3),
+        "window_end": request["window_end"],
+    }
+
+
+class RequestMatcher:
+    """
+    Pending requests bucketed by produce type and coarse grid cell, so a farmer's
+    matches only look at requests of the types they stock near their listings.
+    Per-farmer results are cached until a request of one of their types or
+    their own inventory changes.
+    """
+
+    def __init__(self, max_distance_km: float, refresh_seconds: float):
+        self.max_distance_km = max_distance_km
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._requests: dict[int, dict] = {}
+        self._buckets: dict[str, dict[int, set[int]]] = {}  # produce key -> cell -> request ids
+        self._versions: dict[str, int] = {}  # produce key -> bumped on every change
+        self._dirty: set[int] = set()
+        self._built_at: float | None = None
+        self._task: asyncio.Task | None = None
+        self._inventory = TTLCache(maxsize=10000, ttl=refresh_seconds)  # seller id -> listings
+        self._results = TTLCache(maxsize=10000, ttl=refresh_seconds)  # seller id -> (versions, matches)
+        self._counters = {"rebuilds": 0, "request_updates": 0}
+
+    def mark_request(self, request_id: int | None) -> None:
+        """Re-read this request before the next lookup."""
+        if request_id is not None:
+            with self._dirty_lock:
+                self._dirty.add(request_id)
+
+    def mark_seller(self, seller_id: int | None) -> None:
+        """Drop this farmer's cached listings and matches."""
+        self._inventory.pop(seller_id)
+        self._results.pop(seller_id)
+
+    def _add(self, entry: dict) -> None:
+        key = entry["produce_key"]
+        cell = grid_cell(entry["latitude"], entry["longitude"], MATCH_BUCKET_DEGREES)
+        self._requests[entry["id"]] = entry
+        self._buckets.setdefault(key, {}).setdefault(cell, set()).add(entry["id"])
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _remove(self, request_id: int) -> None:
+        entry = self._requests.pop(request_id, None)
+        if entry is None:
+            return
+        key = entry["produce_key"]
+        cell = grid_cell(entry["latitude"], entry["longitude"], MATCH_BUCKET_DEGREES)
+        self._buckets[key][cell].discard(request_id)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def rebuild(self) -> None:
+        """Reload every matchable request; picks up writes made by other processes."""
+        entries = _load_requests()
+        with self._lock:
+            # Marks made while loading stay queued; re-reading them is harmless
+            self._requests, self._buckets = {}, {}
+            for entry in entries:
+                self._add(entry)
+            self._inventory.clear()
+            self._results.clear()
+            self._built_at = time.monotonic()
+            self._counters["rebuilds"] += 1
+
+    async def start(self) -> None:
+        if self._task is None:
+            # Built before serving so no lookup pays for the first load
+            await self._rebuild_logged()
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _rebuild_logged(self) -> None:
+        try:
+            await asyncio.to_thread(self.rebuild)
+        except SQLAlchemyError as e:
+            logger.warning(f"Match index rebuild failed: {e}")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self._rebuild_logged()
+
+    def _sync(self) -> None:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        fresh = {entry["id"]: entry for entry in _load_requests(sorted(dirty))}
+        for request_id in dirty:
+            self._remove(request_id)
+            if request_id in fresh:
+                self._add(fresh[request_id])
+        self._counters["request_updates"] += len(dirty)
+
+    def _match(self, items: List[dict]) -> List[dict]:
+        best: dict[int, dict] = {}
+        for item in items:
+            bucket = self._buckets.get(item["produce_key"])
+            if not bucket:
+                continue
+            box = bounding_box(item["latitude"], item["longitude"], self.max_distance_km)
+            cells = grid_cells(box, len(bucket), MATCH_BUCKET_DEGREES) or list(bucket)
+            for cell in cells:
+                for request_id in bucket.get(cell, ()):
+                    match = score_match(item, self._requests[request_id], self.max_distance_km)
+                    if match and (request_id not in best or match["score"] > best[request_id]["score"]):
+                        best[request_id] = match
+        return sorted(best.values(), key=lambda match: (-match["score"], match["distance_km"]))
+
+    def best_requests(
+        self,
+        seller_id: int,
+        limit: int = 20,
+        max_distance_km: float | None = None,
+    ) -> List[dict]:
+        """The seller's best-scoring open requests, highest score first."""
+        if self._built_at is None:
+            self.rebuild()
+        with self._lock:
+            self._sync()
+            items = self._inventory.get(seller_id)
+            if items is None:
+                items = _load_inventory(seller_id)
+                self._inventory.set(seller_id, items)
+            versions = {key: self._versions.get(key, 0) for key in {item["produce_key"] for item in items}}
+            cached = self._results.get(seller_id)
+            if cached is not None and cached[0] == versions:
+                matches = cached[1]
+            else:
+                matches = self._match(items)
+                self._results.set(seller_id, (versions, matches))
+
+        now = datetime.now(timezone.utc)
+        return [
+            match for match in matches
+            if (match["window_end"] is None or match["window_end"] >= now)
+            and (max_distance_km is None or match["distance_km"] <= max_distance_km)
+        ][:limit]
+
+    def stats(self) -> dict:
+        return {
+            "requests": len(self._requests),
+            "produce_types": len(self._buckets),
+            "pending_updates": len(self._dirty),
+            "index_age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+            "results": self._results.stats(),
+            **self._counters,
+        }
+
+
+request_matcher = RequestMatcher(MATCH_MAX_DISTANCE_KM, MATCH_INDEX_REFRESH_SECONDS)
+
+
+# Changes are collected per session at flush and applied only once the transaction commits,
+# so a lookup never re-reads a row before its new state is visible
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    requests, sellers = session.info.setdefault("request_matching", (set(), set()))
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, ProduceRequest):
+            requests.add(obj.id)
+        elif isinstance(obj, ProduceInventory):
+            sellers.add(obj.seller_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    requests, sellers = session.info.pop("request_matching", (set(), set()))
+    for request_id in requests:
+        request_matcher.mark_request(request_id)
+    for seller_id in sellers:
+        request_matcher.mark_seller(seller_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("request_matching", None)
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import List
+
+from app.models.route import RouteRequest, RouteResponse
+from app.services.matrix_cache import Coordinate, coordinate_key, legs_changed_since
+from app.utils.cache import TTLCache
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "2000"))
+ROUTE_CACHE_TTL_SECONDS = float(os.getenv("ROUTE_CACHE_TTL_SECONDS", "900"))
+
+# (HIT, MISS or BYPASS, age of a hit) for the route optimized in the current request;
+# endpoints turn it into response headers without threading it through every caller
+route_cache_status: ContextVar[tuple[str, float | None] | None] = ContextVar(
+    "route_cache_status", default=None
+)
+
+
+def _normalize(address: str) -> str:
+    return " ".join(address.split()).casefold()
+
+
+def _place(address: str, location: Coordinate | None) -> list:
+    return [_normalize(address), coordinate_key(location) if location else None]
+
+
+def _moment(value) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _with_request_addresses(response: RouteResponse, request: RouteRequest) -> RouteResponse:
+    """Spell addresses the way this request did; the key only matched them normalized."""
+    spellings: dict[str, List[str]] = {}
+    for address in [request.pickup] + [stop.address for stop in request.stops]:
+        spellings.setdefault(_normalize(address), []).append(address)
+
+    def respell(address: str) -> str:
+        options = spellings.get(_normalize(address))
+        if not options:
+            return address
+        return options.pop(0) if len(options) > 1 else options[0]
+
+    for stop in response.stops:
+        stop.address = respell(stop.address)
+    response.unscheduled_stops = [respell(address) for address in response.unscheduled_stops]
+    response.ungeocoded_stops = [respell(address) for address in response.ungeocoded_stops]
+    return response
+
+
+def route_cache_key(request: RouteRequest, backend_name: str) -> str | None:
+    """
+    Hash of the normalized pickup, the stops sorted by place and window, and the
+    solver options; stop order in the request does not matter. None when the
+    result depends on the clock (windowed stops without a departure_time).
+    """
+    if request.departure_time is None and any(
+        stop.window_start or stop.window_end for stop in request.stops
+    ):
+        return None
+    stops = sorted(
+        _place(stop.address, stop.location) + [_moment(stop.window_start), _moment(stop.window_end)]
+        for stop in request.stops
+    )
+    payload = [
+        _place(request.pickup, request.pickup_location),
+        stops,
+        backend_name,
+        request.time_budget_seconds,
+        _moment(request.departure_time),
+        request.include_geometry,
+    ]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+class RouteResultCache:
+    """
+    Optimized routes by route_cache_key. An entry is dropped once any travel
+    matrix leg between its stops is replaced, as well as on TTL and LRU eviction.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.invalidations = 0
+
+    def get(self, key: str, request: RouteRequest) -> tuple[RouteResponse, float] | None:
+        """A copy of the cached route for request and its age in seconds."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        response, source, keys, generation, stored_at = entry
+        if legs_changed_since(source, keys, generation):
+            self._cache.pop(key)
+            self.invalidations += 1
+            return None
+        response = _with_request_addresses(response.model_copy(deep=True), request)
+        return response, time.monotonic() - stored_at
+
+    def set(
+        self,
+        key: str,
+        response: RouteResponse,
+        locations: List[Coordinate],
+        generation: int,
+    ) -> None:
+        """Cache response, solved on the matrix legs between locations as of generation."""
+        keys = sorted({coordinate_key(location) for location in locations})
+        self._cache.set(
+            key,
+            (
+                response.model_copy(deep=True),
+                response.routing_backend,
+                keys,
+                generation,
+                time.monotonic(),
+            ),
+        )
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "invalidations": self.invalidations}
+
+
+route_cache = RouteResultCache(ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL_SECONDS)
+
+
+def route_cache_headers() -> dict[str, str]:
+    """X-Route-Cache (and Age on a hit) for the route optimized in this request."""
+    status = route_cache_status.get()
+    if status is None:
+        return {}
+    result, age = status
+    headers = {"X-Route-Cache": result}
+    if age is not None:
+        headers["Age"] = str(int(age))
+    return headers
+
@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+
+from app.models.route import OptimizedStop
+from app.services.local_search import improve_suffix
+from app.services.optimizer import (
+    route_stops_from_order,
+    window_constraints,
+    window_route_stops,
+)
+from app.services.solver_pool import solver_pool
+from app.services.time_windows import WindowSchedule
+
+# Removing one stop leaves a near-optimal tour; a short local pass around it is enough
+ROUTE_REPAIR_TIME_BUDGET_SECONDS = float(os.getenv("ROUTE_REPAIR_TIME_BUDGET_SECONDS", "0.05"))
+
+
+def has_windows(entries: List[dict]) -> bool:
+    return any(entry.get("window_start") or entry.get("window_end") for entry in entries[1:])
+
+
+def insert_stop(
+    entries: List[dict],
+    order: List[int],
+    node: int,
+    matrix: dict,
+    departure: datetime,
+    fixed: int = 0,
+) -> List[int] | None:
+    """
+    Insert entries[node] at its cheapest position after the first `fixed`
+    stops. With delivery windows the position must keep every window;
+    returns None when there is no such position.
+    """
+    if has_windows(entries):
+        service, earliest, latest = window_constraints(entries, departure)
+        schedule = WindowSchedule([0] + order, matrix["durations"], service, earliest, latest)
+        best = schedule.insertion(node, first=fixed)
+        if best is None:
+            return None
+        position = best[1]
+    else:
+        dist = matrix["distances"]
+        path = [0] + order
+        best_cost, position = float("inf"), fixed
+        for k in range(fixed, len(path)):
+            cost = dist[path[k]][node]
+            if k + 1 < len(path):
+                cost += dist[node][path[k + 1]] - dist[path[k]][path[k + 1]]
+            if cost < best_cost:
+                best_cost, position = cost, k
+    return order[:position] + [node] + order[position:]
+
+
+async def remove_stop(
+    entries: List[dict],
+    order: List[int],
+    node: int,
+    matrix: dict,
+    departure: datetime,
+    fixed: int = 0,
+) -> List[int]:
+    """
+    Drop node from order and repair the remaining unfixed stops with a short
+    local search. With delivery windows the repaired order is kept only if
+    every window still holds; plain removal always does, since later stops
+    can only be reached earlier.
+    """
+    remaining = [idx for idx in order if idx != node]
+    if len(remaining) - fixed < 3:
+        return remaining
+    repaired = await solver_pool.run(
+        improve_suffix,
+        remaining,
+        fixed,
+        matrix["distances"],
+        ROUTE_REPAIR_TIME_BUDGET_SECONDS,
+    )
+    if has_windows(entries):
+        service, earliest, latest = window_constraints(entries, departure)
+        schedule = WindowSchedule([0] + repaired, matrix["durations"], service, earliest, latest)
+        if not schedule.feasible():
+            return remaining
+    return repaired
+
+
+def schedule_order(
+    entries: List[dict],
+    order: List[int],
+    matrix: dict,
+    departure: datetime,
+) -> tuple[list[OptimizedStop], float, int]:
+    """Stops (stops[0] is the pickup) with ETAs and arrival times for a fixed order."""
+    if has_windows(entries):
+        service, earliest, latest = window_constraints(entries, departure)
+        schedule = WindowSchedule(
+            [0] + order, matrix["durations"], service, earliest, latest
+        )
+        return window_route_stops(entries, schedule, matrix["distances"], departure)
+
+    stops, total_distance, total_eta = route_stops_from_order(
+        entries, order, matrix["distances"], matrix["durations"]
+    )
+    for stop in stops:
+        stop.arrival_time = departure + timedelta(minutes=stop.eta_minutes)
+    return stops, total_distance, total_eta
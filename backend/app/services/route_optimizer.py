@@ -1,4 +1,7 @@
-from app.models.route import RouteRequest, RouteResponse
+from typing import List
+
+from app.models.produce import ProduceRequest
+from app.models.route import RouteRequest, RouteResponse, Stop
 from app.services.geocode import geocode_address
 from app.services.optimizer import optimize_route_real
 
@@ -8,3 +11,65 @@ async def optimize_route_from_requests(route_request: RouteRequest) -> RouteResp
     Uses the existing optimizer but with additional context
     """
     return await optimize_route_real(route_request)
+
+def stored_coordinates(latitude, longitude):
+    """[lng, lat] from nullable latitude/longitude columns"""
+    if latitude is None or longitude is None:
+        return None
+    return (longitude, latitude)
+
+def delivery_route_request(
+    pickup_location: str,
+    delivery_date,
+    requests: List[ProduceRequest],
+    pickup_coords=None
+):
+    """
+    RouteRequest for delivering requests from pickup_location, departing at delivery_date.
+    Coordinates already stored on the requests are passed through, so only the rest are geocoded.
+    """
+    stops_data = [
+        Stop(
+            address=req.delivery_address,
+            window_start=req.delivery_window_start,
+            window_end=req.delivery_window_end,
+            location=stored_coordinates(req.delivery_latitude, req.delivery_longitude)
+        )
+        for req in requests
+    ]
+    return RouteRequest(
+        pickup=pickup_location,
+        pickup_location=pickup_coords,
+        stops=stops_data,
+        departure_time=delivery_date
+    )
+
+def optimized_stop_rows(route_id: int, optimized: RouteResponse, requests: List[ProduceRequest]):
+    """
+    DeliveryStop column values for each request in optimized order (stops[0] is
+    the pickup), and the requests left off the route. Requests geocoded by the
+    optimizer get their coordinates stored.
+    """
+    rows = []
+    unmatched = list(requests)
+    for i, optimized_stop in enumerate(optimized.stops[1:], start=1):
+        # Find matching request by address
+        matching_request = next(
+            (req for req in unmatched if req.delivery_address == optimized_stop.address),
+            None
+        )
+        
+        if matching_request:
+            unmatched.remove(matching_request)
+            if matching_request.delivery_latitude is None:
+                matching_request.delivery_longitude, matching_request.delivery_latitude = optimized_stop.location
+            rows.append({
+                "route_id": route_id,
+                "request_id": matching_request.id,
+                "stop_order": i,
+                "address": optimized_stop.address,
+                "latitude": optimized_stop.location[1],
+                "longitude": optimized_stop.location[0],
+                "estimated_arrival": optimized_stop.arrival_time
+            })
+    return rows, unmatched
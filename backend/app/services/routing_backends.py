@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Protocol, Tuple
+
+import httpx
+import numpy as np
+
+from app.services.distance_matrix import METERS_PER_MILE, haversine_distance_array
+from app.services.http_clients import get_http_client
+from app.utils.cache import TTLCache
+
+AVERAGE_SPEED_MPH = 32  # Conservative blended urban speed
+# Road distance / straight-line distance for the offline estimator; 1.2-1.4 is typical
+ROUTING_CIRCUITY_FACTOR = float(os.getenv("ROUTING_CIRCUITY_FACTOR", "1.0"))
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm")
+
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
+# The public OSRM server rejects tables above ~100 coordinates
+OSRM_MAX_TABLE_SIZE = int(os.getenv("OSRM_MAX_TABLE_SIZE", "100"))
+OSRM_TILE_CONCURRENCY = int(os.getenv("OSRM_TILE_CONCURRENCY", "4"))
+OSRM_TILE_RETRIES = int(os.getenv("OSRM_TILE_RETRIES", "2"))
+OSRM_TILE_RETRY_BACKOFF_SECONDS = float(os.getenv("OSRM_TILE_RETRY_BACKOFF_SECONDS", "0.25"))
+
+# Self-hosted osrm-routed; raise --max-table-size on the server to match
+OSRM_LOCAL_BASE_URL = os.getenv("OSRM_LOCAL_BASE_URL", "http://localhost:5000")
+OSRM_LOCAL_MAX_TABLE_SIZE = int(os.getenv("OSRM_LOCAL_MAX_TABLE_SIZE", "1000"))
+# Backends are probed at most this often; health checks in between are answered from memory
+ROUTING_HEALTH_TTL_SECONDS = float(os.getenv("ROUTING_HEALTH_TTL_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+Coordinate = Tuple[float, float]
+
+
+class RoutingBackend(Protocol):
+    """Source of travel matrices and route shapes for the optimizer."""
+
+    name: str
+    cache_matrix: bool  # Whether legs are worth persisting in the travel matrix cache
+
+    async def matrix(
+        self, coordinates: List[Coordinate], sources: List[int], destinations: List[int]
+    ) -> dict | None:
+        """Distances (m) and durations (s) for sources x destinations, or None."""
+        ...
+
+    async def route_geometry(self, coordinates: List[Coordinate]) -> dict | None:
+        """GeoJSON LineString plus distance/duration for visiting coordinates in order."""
+        ...
+
+    async def health(self) -> dict:
+        ...
+
+
+class OSRMBackend:
+    """OSRM HTTP API, either the public server or a self-hosted osrm-routed."""
+
+    cache_matrix = True
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        upstream: str,
+        max_table_size: int,
+        tile_concurrency: int = OSRM_TILE_CONCURRENCY,
+        tile_retries: int = OSRM_TILE_RETRIES,
+        retry_backoff_seconds: float = OSRM_TILE_RETRY_BACKOFF_SECONDS,
+        profile: str = "driving",
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.upstream = upstream
+        self.max_table_size = max_table_size
+        self.tile_concurrency = tile_concurrency
+        self.tile_retries = tile_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.profile = profile
+
+    async def matrix(
+        self, coordinates: List[Coordinate], sources: List[int], destinations: List[int]
+    ) -> dict | None:
+        """
+        Requests touching more than max_table_size coordinates are split into
+        tiles that are fetched concurrently and stitched back together; only
+        failed tiles are retried.
+        """
+        if len(set(sources) | set(destinations)) <= self.max_table_size:
+            pending = [(0, 0, sources, destinations)]
+        else:
+            block = max(self.max_table_size // 2, 1)
+            pending = [
+                (row, col, sources[row:row + block], destinations[col:col + block])
+                for row in range(0, len(sources), block)
+                for col in range(0, len(destinations), block)
+            ]
+
+        distances: List[List[float | None]] = [[None] * len(destinations) for _ in sources]
+        durations: List[List[float | None]] = [[None] * len(destinations) for _ in sources]
+        # Decided once: on a retry pass pending holds only the failed tiles, and each of
+        # those must still be fetched with its own sources and destinations
+        whole_table = len(pending) == 1 and sources == destinations == list(range(len(coordinates)))
+        semaphore = asyncio.Semaphore(self.tile_concurrency)
+
+        async def fetch(tile: tuple[int, int, List[int], List[int]]) -> dict | None:
+            _, _, tile_sources, tile_destinations = tile
+            async with semaphore:
+                if whole_table:
+                    return await self._table(coordinates)
+                return await self._table(coordinates, tile_sources, tile_destinations)
+
+        for attempt in range(self.tile_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            results = await asyncio.gather(*(fetch(tile) for tile in pending))
+            failed = []
+            for tile, result in zip(pending, results):
+                if result is None:
+                    failed.append(tile)
+                    continue
+                row_offset, col_offset, tile_sources, tile_destinations = tile
+                for row in range(len(tile_sources)):
+                    for col in range(len(tile_destinations)):
+                        distances[row_offset + row][col_offset + col] = result["distances"][row][col]
+                        durations[row_offset + row][col_offset + col] = result["durations"][row][col]
+            if not failed:
+                return {"distances": distances, "durations": durations}
+            pending = failed
+
+        logger.warning(f"{self.name} table failed for {len(pending)} tile(s) after retries")
+        return None
+
+    async def _table(
+        self,
+        coordinates: List[Coordinate],
+        sources: List[int] | None = None,
+        destinations: List[int] | None = None,
+    ) -> dict | None:
+        """One OSRM table request; sources/destinations index into coordinates."""
+        params = {"annotations": "duration,distance"}
+        if sources is not None and destinations is not None:
+            # Send only the coordinates this tile needs, re-indexed locally
+            subset = list(dict.fromkeys(sources + destinations))
+            local = {idx: pos for pos, idx in enumerate(subset)}
+            coordinates = [coordinates[idx] for idx in subset]
+            params["sources"] = ";".join(str(local[idx]) for idx in sources)
+            params["destinations"] = ";".join(str(local[idx]) for idx in destinations)
+
+        coord_str = ";".join(f"{lng},{lat}" for lng, lat in coordinates)
+        url = f"{self.base_url}/table/v1/{self.profile}/{coord_str}"
+
+        client = get_http_client(self.upstream)
+        try:
+            response = await client.get(url, params=params)
+            data = response.json()
+            if response.status_code == 200 and data.get("code") == "Ok":
+                distances = data.get("distances")
+                durations = data.get("durations")
+                if distances and durations:
+                    return {"distances": distances, "durations": durations}
+        except (httpx.HTTPError, ValueError):
+            return None
+        return None
+
+    async def route_geometry(self, coordinates: List[Coordinate]) -> dict | None:
+        coord_str = ";".join(f"{lng},{lat}" for lng, lat in coordinates)
+        url = f"{self.base_url}/route/v1/{self.profile}/{coord_str}"
+        params = {"overview": "full", "geometries": "geojson"}
+
+        client = get_http_client(self.upstream)
+        try:
+            response = await client.get(url, params=params)
+            data = response.json()
+            if response.status_code == 200 and data.get("code") == "Ok" and data.get("routes"):
+                route = data["routes"][0]
+                return {
+                    "geometry": route["geometry"],
+                    "distance": route["distance"],
+                    "duration": route["duration"],
+                }
+        except (httpx.HTTPError, ValueError, KeyError):
+            return None
+        return None
+
+    async def health(self) -> dict:
+        start = time.perf_counter()
+        probe = [(-85.6681, 42.9634), (-85.6366, 42.9561)]
+        result = await self._table(probe)
+        return {
+            "name": self.name,
+            "ok": result is not None,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "base_url": self.base_url,
+        }
+
+
+class OfflineBackend:
+    """Haversine distance scaled by a road-circuity factor at a fixed speed; no network."""
+
+    name = "offline"
+    cache_matrix = False
+
+    def __init__(self, circuity_factor: float, speed_mph: float):
+        self.circuity_factor = circuity_factor
+        self.speed_mph = speed_mph
+
+    async def matrix(
+        self, coordinates: List[Coordinate], sources: List[int], destinations: List[int]
+    ) -> dict | None:
+        if sources == destinations == list(range(len(coordinates))):
+            # The usual whole-route request: one n x n pass, nothing to slice off
+            miles = haversine_distance_array(coordinates) * self.circuity_factor
+        else:
+            coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+            rows = coords[sources]
+            cols = coords[destinations]
+            miles = haversine_distance_array(np.vstack([rows, cols]).tolist())
+            miles = miles[: len(sources), len(sources):] * self.circuity_factor
+        return {
+            "distances": (miles * METERS_PER_MILE).tolist(),
+            "durations": (miles / self.speed_mph * 3600).tolist(),
+        }
+
+    async def route_geometry(self, coordinates: List[Coordinate]) -> dict | None:
+        miles = haversine_distance_array(coordinates)
+        total = sum(miles[i][i + 1] for i in range(len(coordinates) - 1)) * self.circuity_factor
+        return {
+            "geometry": {"type": "LineString", "coordinates": [list(c) for c in coordinates]},
+            "distance": float(total * METERS_PER_MILE),
+            "duration": float(total / self.speed_mph * 3600),
+        }
+
+    async def health(self) -> dict:
+        return {"name": self.name, "ok": True, "latency_ms": 0.0}
+
+
+offline_backend = OfflineBackend(ROUTING_CIRCUITY_FACTOR, AVERAGE_SPEED_MPH)
+
+routing_backends: dict[str, RoutingBackend] = {
+    "osrm": OSRMBackend("osrm", OSRM_BASE_URL, "osrm", OSRM_MAX_TABLE_SIZE),
+    "osrm-local": OSRMBackend(
+        "osrm-local", OSRM_LOCAL_BASE_URL, "osrm_local", OSRM_LOCAL_MAX_TABLE_SIZE
+    ),
+    "offline": offline_backend,
+}
+
+
+health_cache = TTLCache(maxsize=len(routing_backends), ttl=ROUTING_HEALTH_TTL_SECONDS)
+
+
+async def _cached_health(backend: RoutingBackend) -> dict:
+    health = health_cache.get(backend.name)
+    if health is None:
+        health = await backend.health()
+        health_cache.set(backend.name, health)
+    return health
+
+
+async def backend_health() -> List[dict]:
+    """Health of every backend, probing each at most once per ROUTING_HEALTH_TTL_SECONDS."""
+    return list(await asyncio.gather(*(_cached_health(backend) for backend in routing_backends.values())))
+
+
+def get_routing_backend(name: str | None = None) -> RoutingBackend:
+    """Backend by name, defaulting to ROUTING_BACKEND."""
+    backend = routing_backends.get(name or ROUTING_BACKEND)
+    if backend is None:
+        raise ValueError(
+            f"Unknown routing backend {name!r}; choose from {', '.join(routing_backends)}"
+        )
+    return backend
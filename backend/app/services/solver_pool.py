@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+# Route solving is pure CPU; running it here keeps the event loop free for other requests.
+# OPTIMIZER_WORKERS=0 runs jobs on a thread instead (no extra processes).
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", str(min(4, os.cpu_count() or 1))))
+OPTIMIZER_MAX_PENDING = int(os.getenv("OPTIMIZER_MAX_PENDING", str(max(OPTIMIZER_WORKERS, 1) * 4)))
+OPTIMIZER_JOB_TIMEOUT_SECONDS = float(os.getenv("OPTIMIZER_JOB_TIMEOUT_SECONDS", "30"))
+# A timed-out job keeps its worker until it finishes, so requested solve budgets are
+# capped well inside the timeout; an oversized one cannot pin a worker
+OPTIMIZER_MAX_BUDGET_SECONDS = float(
+    os.getenv("OPTIMIZER_MAX_BUDGET_SECONDS", str(OPTIMIZER_JOB_TIMEOUT_SECONDS / 2))
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SolverBusy(RuntimeError):
+    """Raised when OPTIMIZER_MAX_PENDING jobs are already queued or running."""
+
+
+class SolverTimeout(TimeoutError):
+    """Raised when a job does not finish within its timeout."""
+
+
+def capped_budget(seconds: float | None) -> float | None:
+    """A requested solve budget limited to OPTIMIZER_MAX_BUDGET_SECONDS; None keeps the default."""
+    return None if seconds is None else min(seconds, OPTIMIZER_MAX_BUDGET_SECONDS)
+
+
+def _warm_worker() -> None:
+    # Workers leave Ctrl+C to the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import app.services.anytime  # noqa: F401
+    import app.services.exact_solver  # noqa: F401
+    import app.services.local_search  # noqa: F401
+    import app.services.time_windows  # noqa: F401
+    import app.services.vrp  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _run_job(deadline: float, fn: Callable, args: tuple) -> Any:
+    # A job that waited in the queue past its caller's timeout is skipped
+    if time.time() >= deadline:
+        return None
+    return fn(*args)
+
+
+class SolverPool:
+    """Process pool with bounded queue depth and per-job timeouts."""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._counters = {"completed": 0, "rejected": 0, "timeouts": 0, "failures": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # One round trip per worker so processes exist and modules are imported
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(executor, _ping) for _ in range(self.workers))
+        )
+        logger.info(f"Solver pool ready ({len(set(pids))} workers)")
+
+    async def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def run(self, fn: Callable, *args: Any, timeout: float | None = None) -> Any:
+        """
+        Run fn(*args) off the event loop. fn must be a module-level function
+        taking and returning plain (picklable) data.
+        """
+        if self._pending >= self.max_pending:
+            self._counters["rejected"] += 1
+            raise SolverBusy(f"{self._pending} optimization jobs already pending")
+
+        timeout = OPTIMIZER_JOB_TIMEOUT_SECONDS if timeout is None else timeout
+        self._pending += 1
+        try:
+            if self.workers <= 0:
+                job = asyncio.to_thread(fn, *args)
+            else:
+                deadline = time.time() + timeout
+                job = asyncio.wrap_future(
+                    self._get_executor().submit(_run_job, deadline, fn, args)
+                )
+            # wait_for cancels the job if it is still queued when time runs out
+            result = await asyncio.wait_for(job, timeout)
+            self._counters["completed"] += 1
+            return result
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise SolverTimeout(f"Optimization did not finish within {timeout:g}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for the next job
+            self._counters["failures"] += 1
+            self._executor = None
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            **self._counters,
+        }
+
+
+solver_pool = SolverPool(OPTIMIZER_WORKERS, OPTIMIZER_MAX_PENDING)
@@ -0,0 +1,154 @@
+import math
+import time
+from typing import List, Sequence
+
+from app.services.local_search import LOCAL_SEARCH_TIME_BUDGET_SECONDS, Matrix
+
+
+class WindowSchedule:
+    """
+    Service start times and latest feasible start times along an open path.
+    With both arrays, checking whether a stop fits between two neighbours
+    is O(1): the new stop must start before its own window closes, and the
+    pushed-back successor must still start before its latest start.
+    """
+
+    def __init__(
+        self,
+        path: List[int],
+        durations: Matrix,
+        service: Sequence[float],
+        earliest: Sequence[float],
+        latest: Sequence[float],
+    ):
+        self.path = path
+        self.durations = durations
+        self.service = service
+        self.earliest = earliest
+        self.latest = latest
+        self.start: List[float] = []
+        self.latest_start: List[float] = []
+        self.refresh()
+
+    def refresh(self) -> None:
+        path, t, s = self.path, self.durations, self.service
+        start = [max(0.0, self.earliest[path[0]])]
+        for prev, node in zip(path, path[1:]):
+            arrival = start[-1] + s[prev] + t[prev][node]
+            start.append(max(arrival, self.earliest[node]))
+
+        latest_start = [0.0] * len(path)
+        latest_start[-1] = self.latest[path[-1]]
+        for k in range(len(path) - 2, -1, -1):
+            node, nxt = path[k], path[k + 1]
+            latest_start[k] = min(
+                self.latest[node], latest_start[k + 1] - s[node] - t[node][nxt]
+            )
+
+        self.start = start
+        self.latest_start = latest_start
+
+    def feasible(self) -> bool:
+        return all(
+            start <= self.latest[node] for node, start in zip(self.path, self.start)
+        )
+
+    def insertion(self, node: int, first: int = 0) -> tuple[float, int] | None:
+        """Cheapest feasible (added travel time, position) to insert node after, from path[first] on."""
+        path, t, s = self.path, self.durations, self.service
+        best = None
+        for k in range(first, len(path)):
+            prev = path[k]
+            arrival = self.start[k] + s[prev] + t[prev][node]
+            node_start = max(arrival, self.earliest[node])
+            if node_start > self.latest[node]:
+                continue
+
+            cost = t[prev][node]
+            if k + 1 < len(path):
+                nxt = path[k + 1]
+                next_start = max(node_start + s[node] + t[node][nxt], self.earliest[nxt])
+                if next_start > self.latest_start[k + 1]:
+                    continue
+                cost += t[node][nxt] - t[prev][nxt]
+
+            if best is None or cost < best[0]:
+                best = (cost, k)
+        return best
+
+
+def solve_with_time_windows(
+    durations: Matrix,
+    service: Sequence[float],
+    earliest: Sequence[float],
+    latest: Sequence[float],
+    time_budget_seconds: float | None = None,
+) -> tuple[List[int], List[int]]:
+    """
+    Order stops 1..n from depot 0 so each service starts inside its window
+    (seconds from departure; waiting is allowed). Stops are inserted in order
+    of window close at their cheapest feasible position, then relocate moves
+    shorten total travel time while keeping every window.
+    Returns (order, unscheduled stops).
+    """
+    budget = (
+        LOCAL_SEARCH_TIME_BUDGET_SECONDS
+        if time_budget_seconds is None
+        else time_budget_seconds
+    )
+    deadline = time.perf_counter() + budget
+    schedule = WindowSchedule([0], durations, service, earliest, latest)
+    unscheduled: List[int] = []
+
+    def insert(node: int) -> bool:
+        best = schedule.insertion(node)
+        if best is None:
+            return False
+        schedule.path.insert(best[1] + 1, node)
+        schedule.refresh()
+        return True
+
+    for node in sorted(range(1, len(durations)), key=lambda i: (latest[i], earliest[i])):
+        if not insert(node):
+            unscheduled.append(node)
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for pos in range(1, len(schedule.path)):
+            path = schedule.path
+            node = path[pos]
+            prev = path[pos - 1]
+            gain = durations[prev][node]
+            if pos + 1 < len(path):
+                nxt = path[pos + 1]
+                gain += durations[node][nxt] - durations[prev][nxt]
+
+            trial = WindowSchedule(
+                path[:pos] + path[pos + 1:], durations, service, earliest, latest
+            )
+            best = trial.insertion(node)
+            if best is not None and best[0] < gain - 1e-9:
+                trial.path.insert(best[1] + 1, node)
+                trial.refresh()
+                schedule = trial
+                improved = True
+                break
+            if time.perf_counter() >= deadline:
+                break
+
+        # Shorter tours can open room for stops that did not fit earlier
+        for node in list(unscheduled):
+            if insert(node):
+                unscheduled.remove(node)
+                improved = True
+
+    return schedule.path[1:], unscheduled
+
+
+def window_bounds(earliest: float | None, latest: float | None) -> tuple[float, float]:
+    """Normalize an optional window (seconds from departure) to finite/infinite bounds."""
+    return (
+        0.0 if earliest is None else max(earliest, 0.0),
+        math.inf if latest is None else latest,
+    )
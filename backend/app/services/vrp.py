@@ -0,0 +1,315 @@
+import os
+import time
+from typing import List, Sequence
+
+from app.services.local_search import Matrix, improve_route, path_cost
+
+FLEET_TIME_BUDGET_SECONDS = float(os.getenv("FLEET_TIME_BUDGET_SECONDS", "2.0"))
+# Extra distance (fraction of the plan total) we accept to even out truck loads
+FLEET_BALANCE_TOLERANCE = float(os.getenv("FLEET_BALANCE_TOLERANCE", "0.1"))
+
+UNIT_TO_KG = {
+    "kg": 1.0,
+    "kgs": 1.0,
+    "kilogram": 1.0,
+    "kilograms": 1.0,
+    "g": 0.001,
+    "grams": 0.001,
+    "lb": 0.453592,
+    "lbs": 0.453592,
+    "pound": 0.453592,
+    "pounds": 0.453592,
+    "oz": 0.0283495,
+    "ton": 907.185,
+    "tons": 907.185,
+    "tonne": 1000.0,
+    "tonnes": 1000.0,
+}
+
+
+def demand_in_kg(quantity: float, unit: str | None) -> float:
+    """Convert a request quantity to kg; unknown units (cases, bunches) count as-is."""
+    return quantity * UNIT_TO_KG.get((unit or "").strip().lower(), 1.0)
+
+
+def _removal_gain(route: List[int], pos: int, dist_matrix: Matrix) -> float:
+    prev = route[pos - 1] if pos > 0 else 0
+    node = route[pos]
+    gain = dist_matrix[prev][node]
+    if pos + 1 < len(route):
+        nxt = route[pos + 1]
+        gain += dist_matrix[node][nxt] - dist_matrix[prev][nxt]
+    return gain
+
+
+def _cheapest_insertion(route: List[int], node: int, dist_matrix: Matrix) -> tuple[float, int]:
+    """Cheapest position to insert node into an open route; returns (cost, index)."""
+    path = [0] + route
+    best_cost, best_pos = float("inf"), 0
+    for k, c in enumerate(path):
+        cost = dist_matrix[c][node]
+        if k + 1 < len(path):
+            e = path[k + 1]
+            cost += dist_matrix[node][e] - dist_matrix[c][e]
+        if cost < best_cost:
+            best_cost, best_pos = cost, k
+    return best_cost, best_pos
+
+
+def savings_routes(dist_matrix: Matrix, demands: Sequence[float], capacity: float) -> List[List[int]]:
+    """
+    Clarke-Wright savings for open routes from depot 0. Joining the route
+    ending at i to the route starting at j saves the depot->j leg and adds i->j.
+    """
+    n = len(dist_matrix)
+    routes = {i: [i] for i in range(1, n)}
+    loads = {i: demands[i] for i in range(1, n)}
+    route_of = list(range(n))
+
+    savings = [
+        (dist_matrix[0][j] - dist_matrix[i][j], i, j)
+        for i in range(1, n)
+        for j in range(1, n)
+        if i != j
+    ]
+    savings.sort(reverse=True)
+
+    for saving, i, j in savings:
+        if saving <= 0:
+            break
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj:
+            continue
+        head, tail = routes[ri], routes[rj]
+        if head[-1] != i or tail[0] != j:
+            continue
+        if loads[ri] + loads[rj] > capacity:
+            continue
+        head.extend(tail)
+        loads[ri] += loads.pop(rj)
+        for node in tail:
+            route_of[node] = ri
+        del routes[rj]
+
+    return list(routes.values())
+
+
+def _insert_stops(
+    routes: List[List[int]],
+    loads: List[float],
+    stops: Sequence[int],
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    capacity: float,
+) -> bool:
+    """
+    Cheapest-insert stops (heaviest first) into routes with spare capacity, in
+    place. Returns False, leaving routes partly filled, if a stop fits nowhere.
+    """
+    for node in sorted(stops, key=lambda i: -demands[i]):
+        best = None
+        for b, target in enumerate(routes):
+            if loads[b] + demands[node] > capacity:
+                continue
+            cost, insert_at = _cheapest_insertion(target, node, dist_matrix)
+            if best is None or cost < best[0]:
+                best = (cost, b, insert_at)
+        if best is None:
+            return False
+        _, b, insert_at = best
+        routes[b].insert(insert_at, node)
+        loads[b] += demands[node]
+    return True
+
+
+def _pack_fleet(
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    capacity: float,
+    vehicle_count: int,
+) -> List[List[int]] | None:
+    """
+    Best-fit decreasing: each stop, heaviest first, goes to the fullest truck it
+    still fits in, at its cheapest position. None if some stop fits nowhere.
+    """
+    routes: List[List[int]] = [[] for _ in range(vehicle_count)]
+    loads = [0.0] * vehicle_count
+    for node in sorted(range(1, len(demands)), key=lambda i: -demands[i]):
+        fits = [b for b in range(vehicle_count) if loads[b] + demands[node] <= capacity]
+        if not fits:
+            return None
+        b = max(fits, key=loads.__getitem__)
+        _, insert_at = _cheapest_insertion(routes[b], node, dist_matrix)
+        routes[b].insert(insert_at, node)
+        loads[b] += demands[node]
+    return routes
+
+
+def _merge_down_to_fleet(
+    routes: List[List[int]],
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    capacity: float,
+    vehicle_count: int,
+) -> List[List[int]]:
+    """
+    Concatenate the cheapest capacity-feasible route pairs until the fleet
+    suffices. When no pair fits together, the lightest route is dissolved into
+    the others; if its stops fit nowhere, all stops are packed from scratch.
+    """
+    loads = [sum(demands[i] for i in route) for route in routes]
+    while len(routes) > vehicle_count:
+        best = None
+        for a, head in enumerate(routes):
+            for b, tail in enumerate(routes):
+                if a == b or loads[a] + loads[b] > capacity:
+                    continue
+                delta = dist_matrix[head[-1]][tail[0]] - dist_matrix[0][tail[0]]
+                if best is None or delta < best[0]:
+                    best = (delta, a, b)
+        if best is not None:
+            _, a, b = best
+            routes[a] = routes[a] + routes[b]
+            loads[a] += loads[b]
+            del routes[b]
+            del loads[b]
+            continue
+
+        light = min(range(len(routes)), key=loads.__getitem__)
+        rest = [list(route) for k, route in enumerate(routes) if k != light]
+        rest_loads = [load for k, load in enumerate(loads) if k != light]
+        if _insert_stops(rest, rest_loads, routes[light], dist_matrix, demands, capacity):
+            routes, loads = rest, rest_loads
+            continue
+
+        packed = _pack_fleet(dist_matrix, demands, capacity, vehicle_count)
+        if packed is None:
+            raise ValueError(
+                f"Requests do not fit in {vehicle_count} vehicle(s) of capacity {capacity:g}"
+            )
+        return [route for route in packed if route]
+    return routes
+
+
+def _relocate_between_routes(
+    routes: List[List[int]],
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    capacity: float,
+    deadline: float,
+) -> None:
+    """Move single stops to another route whenever that shortens the plan."""
+    loads = [sum(demands[i] for i in route) for route in routes]
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for a, source in enumerate(routes):
+            for pos in range(len(source)):
+                node = source[pos]
+                gain = _removal_gain(source, pos, dist_matrix)
+                best = None
+                for b, target in enumerate(routes):
+                    if a == b or loads[b] + demands[node] > capacity:
+                        continue
+                    cost, insert_at = _cheapest_insertion(target, node, dist_matrix)
+                    if cost - gain < -1e-9 and (best is None or cost < best[0]):
+                        best = (cost, b, insert_at)
+                if best:
+                    _, b, insert_at = best
+                    source.pop(pos)
+                    routes[b].insert(insert_at, node)
+                    loads[a] -= demands[node]
+                    loads[b] += demands[node]
+                    improved = True
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+
+
+def _balance_loads(
+    routes: List[List[int]],
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    capacity: float,
+    allowance: float,
+    deadline: float,
+) -> None:
+    """
+    Shift stops from the heaviest to the lightest truck while that narrows
+    the load spread, spending at most `allowance` extra distance overall.
+    """
+    spent = 0.0
+    while time.perf_counter() < deadline:
+        loads = [sum(demands[i] for i in route) for route in routes]
+        heavy = max(range(len(routes)), key=loads.__getitem__)
+        light = min(range(len(routes)), key=loads.__getitem__)
+        spread = loads[heavy] - loads[light]
+        if heavy == light or spread <= 0:
+            return
+
+        best = None
+        for pos, node in enumerate(routes[heavy]):
+            demand = demands[node]
+            if demand <= 0 or demand >= spread or loads[light] + demand > capacity:
+                continue
+            cost, insert_at = _cheapest_insertion(routes[light], node, dist_matrix)
+            delta = cost - _removal_gain(routes[heavy], pos, dist_matrix)
+            if best is None or delta < best[0]:
+                best = (delta, pos, insert_at)
+
+        if best is None or spent + max(best[0], 0.0) > allowance:
+            return
+        delta, pos, insert_at = best
+        routes[light].insert(insert_at, routes[heavy].pop(pos))
+        spent += max(delta, 0.0)
+
+
+def solve_cvrp(
+    dist_matrix: Matrix,
+    demands: Sequence[float],
+    vehicle_count: int,
+    capacity: float,
+    time_budget_seconds: float | None = None,
+) -> List[List[int]]:
+    """
+    Split stops 1..n across at most vehicle_count open routes from depot 0
+    without exceeding capacity. Savings construction, merge down to the fleet
+    size, inter-route relocate, load balancing, then per-route local search.
+    Returns one stop order per non-empty route.
+    """
+    if vehicle_count < 1 or capacity <= 0:
+        raise ValueError("vehicle_count and capacity must be positive")
+    if any(demands[i] > capacity for i in range(1, len(demands))):
+        raise ValueError("A single request exceeds the vehicle capacity")
+    if sum(demands[1:]) > vehicle_count * capacity:
+        raise ValueError("Total demand exceeds the fleet capacity")
+
+    budget = (
+        FLEET_TIME_BUDGET_SECONDS if time_budget_seconds is None else time_budget_seconds
+    )
+    start = time.perf_counter()
+    deadline = start + budget
+
+    routes = savings_routes(dist_matrix, demands, capacity)
+    routes = _merge_down_to_fleet(routes, dist_matrix, demands, capacity, vehicle_count)
+    routes += [[] for _ in range(vehicle_count - len(routes))]
+
+    # Spend roughly half the budget on moving stops between trucks
+    _relocate_between_routes(
+        routes, dist_matrix, demands, capacity, start + budget / 2
+    )
+    total = sum(path_cost([0] + route, dist_matrix) for route in routes)
+    _balance_loads(
+        routes,
+        dist_matrix,
+        demands,
+        capacity,
+        FLEET_BALANCE_TOLERANCE * total,
+        start + budget * 3 / 4,
+    )
+
+    routes = [route for route in routes if route]
+    for i, route in enumerate(routes):
+        remaining = max(deadline - time.perf_counter(), 0.0)
+        routes[i] = improve_route(route, dist_matrix, remaining / (len(routes) - i))
+    return routes
@@ -2,7 +2,7 @@ import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException, Depends, Header
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from app.db.database import get_db
 from app.models.user import User
 import os
 
@@ -12,13 +12,6 @@ path_to_json = os.path.join(BASE_DIR,"../core/routecast-49fd2-firebase-adminsdk-
 cred = credentials.Certificate(path_to_json)
 firebase_admin.initialize_app(cred)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=403, detail="Invalid auth header")
@@ -1,22 +1,56 @@
+import asyncio
+import hashlib
+import os
+import time
+
 from fastapi import HTTPException, Header
 from firebase_admin import auth as firebase_auth
-import app.utils.auth 
+import app.utils.auth
+from app.utils.cache import TTLCache
+
+# Firebase ID tokens live an hour, so this bounds the cache by active sessions
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+# sha256 of the token -> decoded claims, each entry expiring at the token's own exp
+token_cache = TTLCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttl=3600)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cached_claims(key: str) -> dict | None:
+    decoded = token_cache.get(key)
+    if decoded is None or decoded["exp"] <= time.time():
+        return None
+    return dict(decoded)
 
 
-def verify_firebase_token(authorization: str = Header(...)):
-    print(f"🔑 Auth header received: {authorization[:20]}..." if authorization else "❌ No auth header")
-    
+def _verify_and_cache(token: str, key: str) -> dict:
+    decoded = firebase_auth.verify_id_token(token)
+    lifetime = decoded["exp"] - time.time()
+    if lifetime > 0:
+        token_cache.set(key, decoded, ttl=lifetime)
+    return dict(decoded)
+
+
+def token_cache_stats() -> dict:
+    return token_cache.stats()
+
+
+async def verify_firebase_token(authorization: str = Header(...)):
     if not authorization.startswith("Bearer "):
-        print("❌ Invalid authorization header format")
         raise HTTPException(status_code=403, detail="Invalid authorization header format")
-    
+
     token = authorization.split(" ")[1]
-    print(f"🎫 Token extracted: {token[:20]}...")
-    
+    key = _token_key(token)
+    decoded = _cached_claims(key)
+    if decoded is not None:
+        return decoded  # contains 'uid', 'email', etc.
+
+    # The signature check (and the SDK's occasional, HTTP-cached certificate fetch)
+    # stays off the event loop
     try:
-        decoded_token = firebase_auth.verify_id_token(token)
-        print(f"✅ Token verified for user: {decoded_token.get('uid', 'unknown')}")
-        return decoded_token  # contains 'uid', 'email', etc.
+        return await asyncio.to_thread(_verify_and_cache, token, key)
     except Exception as e:
-        print("❌ Token verification error:", repr(e))
-        raise HTTPException(status_code=403, detail=f"Invalid token: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=403, detail=f"Invalid token: {str(e)}")
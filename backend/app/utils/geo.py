@@ -0,0 +1,69 @@
+from math import asin, cos, floor, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# Grid buckets stored on rows (ProduceInventory.grid_cell). Changing the cell size
+# invalidates stored values, so it is not configurable at runtime.
+GRID_CELL_DEGREES = 0.1  # ~11 km north-south
+
+BoundingBox = tuple[float, float, float, float]  # min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def _row(lat: float, degrees: float) -> int:
+    return min(max(floor((lat + 90) / degrees), 0), round(180 / degrees) - 1)
+
+
+def _column(lng: float, degrees: float) -> int:
+    return floor((lng + 180) / degrees) % round(360 / degrees)
+
+
+def grid_cell(lat: float | None, lng: float | None, degrees: float = GRID_CELL_DEGREES) -> int | None:
+    """Bucket id for a coordinate; None when either part is missing."""
+    if lat is None or lng is None:
+        return None
+    return _row(lat, degrees) * round(360 / degrees) + _column(lng, degrees)
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> BoundingBox:
+    """
+    Box containing every point within radius_km. The longitude span may cross
+    the antimeridian (min_lng > max_lng) and covers all longitudes near the poles.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Longitude degrees shrink towards the poles; use the box edge closest to one
+    widest = cos(radians(max(abs(min_lat), abs(max_lat))))
+    if widest <= 0 or radius_km / (KM_PER_DEGREE_LAT * widest) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = radius_km / (KM_PER_DEGREE_LAT * widest)
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180:
+        min_lng += 360
+    if max_lng > 180:
+        max_lng -= 360
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def grid_cells(box: BoundingBox, max_cells: int, degrees: float = GRID_CELL_DEGREES) -> list[int] | None:
+    """Every cell overlapping box, or None when there would be more than max_cells."""
+    min_lat, max_lat, min_lng, max_lng = box
+    columns_total = round(360 / degrees)
+    rows = range(_row(min_lat, degrees), _row(max_lat, degrees) + 1)
+    first, last = _column(min_lng, degrees), _column(max_lng, degrees)
+    if (min_lng, max_lng) == (-180.0, 180.0):
+        columns = list(range(columns_total))
+    elif first <= last:
+        columns = list(range(first, last + 1))
+    else:
+        columns = list(range(first, columns_total)) + list(range(0, last + 1))
+    if len(rows) * len(columns) > max_cells:
+        return None
+    return [row * columns_total + column for row in rows for column in columns]
@@ -0,0 +1,113 @@
+import os
+from itertools import chain
+from typing import NamedTuple
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import event, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.database import get_async_db
+from app.models.user import User
+from app.utils.auth_dependency import verify_firebase_token
+from app.utils.cache import TTLCache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# This process's own user updates and deletes evict at once; the TTL bounds how long
+# another process's role change takes to show up
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+
+class Principal(NamedTuple):
+    """The signed-in user, as much of them as most handlers need."""
+
+    id: int
+    role: str
+    email: str
+
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+async def _load_principal(db: AsyncSession, firebase_uid: str) -> Principal | None:
+    row = (await db.execute(
+        select(User.id, User.role, User.email).where(User.firebase_uid == firebase_uid)
+    )).first()
+    return Principal(*row) if row else None
+
+
+async def _create_user(db: AsyncSession, firebase_user: dict) -> Principal:
+    """A basic farmer account for a Firebase user signing in for the first time."""
+    firebase_uid = firebase_user["uid"]
+    user = User(
+        firebase_uid=firebase_uid,
+        email=firebase_user.get("email", f"{firebase_uid}@example.com"),
+        full_name=firebase_user.get("name", "Unknown User"),
+        role="farmer",  # Default to farmer, can be changed later
+        organization="Auto-Generated",
+        country="Unknown"
+    )
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request created them first
+        await db.rollback()
+        return await _load_principal(db, firebase_uid)
+    return Principal(user.id, user.role, user.email)
+
+
+async def resolve_principal(db: AsyncSession, firebase_user: dict, create: bool = False) -> Principal:
+    firebase_uid = firebase_user["uid"]
+    principal = principal_cache.get(firebase_uid)
+    if principal is None:
+        principal = await _load_principal(db, firebase_uid)
+        if principal is None:
+            if not create:
+                raise HTTPException(status_code=404, detail="User not found")
+            principal = await _create_user(db, firebase_user)
+        principal_cache.set(firebase_uid, principal)
+    return principal
+
+
+async def get_principal(
+    db: AsyncSession = Depends(get_async_db),
+    firebase_user: dict = Depends(verify_firebase_token)
+) -> Principal:
+    """The signed-in user's id, role and email; 404 if they have no account yet."""
+    return await resolve_principal(db, firebase_user)
+
+
+async def get_or_create_principal(
+    db: AsyncSession = Depends(get_async_db),
+    firebase_user: dict = Depends(verify_firebase_token)
+) -> Principal:
+    """get_principal, creating a basic account on first sign-in."""
+    return await resolve_principal(db, firebase_user, create=True)
+
+
+def principal_cache_stats() -> dict:
+    return principal_cache.stats()
+
+
+# Like request matching, evictions wait for the commit so a concurrent lookup cannot
+# re-cache the old row in between
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session, flush_context):
+    changed = session.info.setdefault("principal_changes", set())
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.firebase_uid)
+            changed.update(inspect(obj).attrs.firebase_uid.history.deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_changed_users(session):
+    for firebase_uid in session.info.pop("principal_changes", ()):
+        principal_cache.pop(firebase_uid)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session):
+    session.info.pop("principal_changes", None)
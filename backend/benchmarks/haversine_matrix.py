@@ -0,0 +1,52 @@
+# Benchmark: scalar haversine nearest-neighbor loop vs vectorized matrix pipeline
+# Run from backend/: python -m benchmarks.haversine_matrix
+
+import random
+import time
+
+from app.services.distance_matrix import haversine_matrix
+from app.services.local_search import nearest_neighbor_indices
+from app.services.optimizer import order_stops_by_distance
+from app.services.routing_backends import AVERAGE_SPEED_MPH
+
+SIZES = [10, 100, 1000]
+REPEATS = 3
+
+
+def random_coordinates(n: int, seed: int = 42) -> list[tuple[float, float]]:
+    rng = random.Random(seed)
+    return [(rng.uniform(-86.0, -85.3), rng.uniform(42.7, 43.2)) for _ in range(n)]
+
+
+def best_of(fn, repeats: int = REPEATS) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run():
+    print(f"{'n':>6} {'scalar loop (ms)':>18} {'matrix build (ms)':>18} {'matrix + NN (ms)':>18} {'speedup':>8}")
+    for n in SIZES:
+        coordinates = random_coordinates(n + 1)
+        start, rest = coordinates[0], coordinates[1:]
+        stops = [{"address": str(i), "location": c} for i, c in enumerate(rest)]
+
+        scalar = best_of(lambda: order_stops_by_distance(start, stops))
+        build = best_of(lambda: haversine_matrix(coordinates, AVERAGE_SPEED_MPH))
+        pipeline = best_of(
+            lambda: nearest_neighbor_indices(
+                haversine_matrix(coordinates, AVERAGE_SPEED_MPH)["distances"]
+            )
+        )
+
+        print(
+            f"{n:>6} {scalar * 1000:>18.2f} {build * 1000:>18.2f} "
+            f"{pipeline * 1000:>18.2f} {scalar / pipeline:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run()
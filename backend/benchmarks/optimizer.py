@@ -0,0 +1,337 @@
+# Benchmark: speed and tour quality of every route construction/improvement strategy
+# Run from backend/:
+#   python -m benchmarks.optimizer --output results.json
+#   python -m benchmarks.optimizer --sizes 10,100 --tsplib ~/tsplib/berlin52.tsp
+#   python -m benchmarks.optimizer --output new.json --compare results.json
+#
+# Synthetic families (uniform, clustered, corridor) are open routes from a
+# depot in lng/lat, costed with the production haversine matrix. "Reference"
+# instances have a provably optimal closed tour (grid, circle) and, like
+# TSPLIB files, are solved as closed tours: the matrix is rewritten to
+# d(i,j) + d(j,0) - d(i,0) so the open-path solvers minimise the full cycle.
+# Gap is versus the known optimum where there is one, otherwise versus the
+# best tour any strategy found in the same run.
+
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.services.distance_matrix import haversine_matrix
+from app.services.exact_solver import solve_route_order
+from app.services.local_search import (
+    nearest_neighbor_indices,
+    path_cost,
+    solve_stop_order,
+    two_opt,
+)
+from app.services.routing_backends import AVERAGE_SPEED_MPH
+from app.services.vrp import solve_cvrp
+
+SIZES = [10, 50, 100, 200, 500, 1000, 2000]
+TIME_BUDGET_SECONDS = 1.0
+
+# Optimal tour lengths for common TSPLIB instances (symmetric, closed tours)
+TSPLIB_OPTIMA = {
+    "att48": 10628,
+    "berlin52": 7542,
+    "eil51": 426,
+    "eil76": 538,
+    "st70": 675,
+    "pr76": 108159,
+    "rat99": 1211,
+    "kroA100": 21282,
+    "ch130": 6110,
+    "a280": 2579,
+    "pcb442": 50778,
+}
+
+
+def uniform(n: int, rng: random.Random) -> list[tuple[float, float]]:
+    return [(rng.uniform(-86.0, -85.3), rng.uniform(42.7, 43.2)) for _ in range(n)]
+
+
+def clustered(n: int, rng: random.Random) -> list[tuple[float, float]]:
+    centers = uniform(max(2, n // 40), rng)
+    points = []
+    for _ in range(n):
+        lng, lat = rng.choice(centers)
+        points.append((rng.gauss(lng, 0.02), rng.gauss(lat, 0.015)))
+    return points
+
+
+def corridor(n: int, rng: random.Random) -> list[tuple[float, float]]:
+    # Stops strung along a ~60 mile highway with a little lateral spread
+    points = []
+    for _ in range(n):
+        t = rng.random()
+        points.append((-86.0 + 1.1 * t + rng.gauss(0, 0.01), 42.6 + 0.5 * t + rng.gauss(0, 0.01)))
+    return points
+
+
+GENERATORS = {"uniform": uniform, "clustered": clustered, "corridor": corridor}
+
+
+def closed_tour_matrix(dist: list[list[float]]) -> list[list[float]]:
+    """Open-path costs that sum to the closed tour length through node 0."""
+    n = len(dist)
+    return [[dist[i][j] + dist[j][0] - dist[i][0] for j in range(n)] for i in range(n)]
+
+
+def euclidean(points: list[tuple[float, float]], rounded: bool) -> list[list[float]]:
+    dist = []
+    for x1, y1 in points:
+        row = [math.hypot(x1 - x2, y1 - y2) for x2, y2 in points]
+        dist.append([float(int(d + 0.5)) for d in row] if rounded else row)
+    return dist
+
+
+def grid_instance(side: int) -> dict:
+    # An even side length has a Hamiltonian cycle of unit steps: n * spacing
+    points = [(10.0 * x, 10.0 * y) for y in range(side) for x in range(side)]
+    return {
+        "name": f"grid{side}x{side}",
+        "family": "reference",
+        "closed": True,
+        "dist": euclidean(points, rounded=False),
+        "best_known": 10.0 * len(points),
+    }
+
+
+def circle_instance(n: int) -> dict:
+    # Points in convex position: the hull order is optimal
+    points = [
+        (1000 * math.cos(2 * math.pi * k / n), 1000 * math.sin(2 * math.pi * k / n))
+        for k in range(n)
+    ]
+    random.Random(n).shuffle(points)
+    return {
+        "name": f"circle{n}",
+        "family": "reference",
+        "closed": True,
+        "dist": euclidean(points, rounded=False),
+        "best_known": n * 2000 * math.sin(math.pi / n),
+    }
+
+
+def read_tsplib(path: Path) -> dict:
+    """Parse a TSPLIB .tsp file with EUC_2D, CEIL_2D, ATT or GEO coordinates."""
+    header, points = {}, []
+    in_coords = False
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line == "EOF":
+            continue
+        if line.startswith("NODE_COORD_SECTION"):
+            in_coords = True
+            continue
+        if in_coords:
+            _, x, y = line.split()[:3]
+            points.append((float(x), float(y)))
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            header[key.strip()] = value.strip()
+
+    weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    if weight_type == "EUC_2D":
+        dist = euclidean(points, rounded=True)
+    elif weight_type == "CEIL_2D":
+        dist = [[float(math.ceil(math.hypot(x1 - x2, y1 - y2))) for x2, y2 in points] for x1, y1 in points]
+    elif weight_type == "ATT":
+        dist = []
+        for x1, y1 in points:
+            row = []
+            for x2, y2 in points:
+                r = math.sqrt(((x1 - x2) ** 2 + (y1 - y2) ** 2) / 10.0)
+                t = int(r + 0.5)
+                row.append(float(t + 1 if t < r else t))
+            dist.append(row)
+    elif weight_type == "GEO":
+        def radians(v: float) -> float:
+            deg = int(v)
+            return math.pi * (deg + 5.0 * (v - deg) / 3.0) / 180.0
+
+        geo = [(radians(x), radians(y)) for x, y in points]
+        dist = []
+        for i, (lat1, lng1) in enumerate(geo):
+            row = []
+            for j, (lat2, lng2) in enumerate(geo):
+                if i == j:
+                    row.append(0.0)
+                    continue
+                q1 = math.cos(lng1 - lng2)
+                q2 = math.cos(lat1 - lat2)
+                q3 = math.cos(lat1 + lat2)
+                row.append(float(int(6378.388 * math.acos(0.5 * ((1 + q1) * q2 - (1 - q1) * q3)) + 1.0)))
+            dist.append(row)
+    else:
+        raise ValueError(f"{path.name}: unsupported EDGE_WEIGHT_TYPE {weight_type}")
+
+    name = header.get("NAME", path.stem)
+    return {
+        "name": name,
+        "family": "tsplib",
+        "closed": True,
+        "dist": dist,
+        "best_known": TSPLIB_OPTIMA.get(name),
+    }
+
+
+def synthetic_instance(family: str, n: int, seed: int) -> dict:
+    rng = random.Random(f"{family}-{n}-{seed}")
+    depot = (-85.6681, 42.9634)
+    coordinates = [depot] + GENERATORS[family](n, rng)
+    return {
+        "name": f"{family}{n}",
+        "family": family,
+        "closed": False,
+        "dist": haversine_matrix(coordinates, AVERAGE_SPEED_MPH)["distances"],
+        "best_known": None,
+    }
+
+
+def nn_two_opt(dist: list[list[float]], budget: float) -> list[int]:
+    path = [0] + nearest_neighbor_indices(dist)
+    two_opt(path, dist, time.perf_counter() + budget)
+    return path[1:]
+
+
+def savings_single_vehicle(dist: list[list[float]], budget: float) -> list[int]:
+    routes = solve_cvrp(dist, [0.0] * len(dist), 1, 1.0, budget)
+    return routes[0] if routes else []
+
+
+STRATEGIES = {
+    "nearest_neighbor": lambda dist, budget: nearest_neighbor_indices(dist),
+    "nn+2opt": nn_two_opt,
+    "nn+local_search": lambda dist, budget: solve_stop_order(dist, budget)[0],
+    "auto (held_karp when small)": lambda dist, budget: solve_route_order(dist, budget)[0],
+    "savings": lambda dist, budget: savings_single_vehicle(dist, 0.0),
+    "savings+local_search": savings_single_vehicle,
+}
+
+
+def run_strategy(instance: dict, strategy: str, budget: float) -> dict:
+    dist = closed_tour_matrix(instance["dist"]) if instance["closed"] else instance["dist"]
+    start = time.perf_counter()
+    order = STRATEGIES[strategy](dist, budget)
+    wall = time.perf_counter() - start
+
+    # Separate pass for memory: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    STRATEGIES[strategy](dist, budget)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if sorted(order) != list(range(1, len(dist))):
+        raise AssertionError(f"{strategy} returned an invalid tour for {instance['name']}")
+    # Lengths are reported on the original matrix (closed tours include the return leg)
+    path = [0] + order + ([0] if instance["closed"] else [])
+    return {
+        "instance": instance["name"],
+        "family": instance["family"],
+        "n": len(dist),
+        "strategy": strategy,
+        "wall_seconds": round(wall, 4),
+        "peak_memory_mb": round(peak / 2**20, 3),
+        "length": round(path_cost(path, instance["dist"]), 3),
+    }
+
+
+def add_gaps(results: list[dict], instances: list[dict]) -> None:
+    for instance in instances:
+        rows = [row for row in results if row["instance"] == instance["name"]]
+        best = instance["best_known"] or min(row["length"] for row in rows)
+        for row in rows:
+            row["best_known"] = round(best, 3)
+            row["best_known_is_optimal"] = instance["best_known"] is not None
+            row["gap_percent"] = round((row["length"] - best) / best * 100, 3) if best else 0.0
+
+
+def compare(results: list[dict], baseline_path: Path) -> None:
+    baseline = {
+        (row["instance"], row["strategy"]): row
+        for row in json.loads(baseline_path.read_text())["results"]
+    }
+    print(f"{'instance':>16} {'strategy':>22} {'time x':>8} {'gap delta':>10}")
+    for row in results:
+        old = baseline.get((row["instance"], row["strategy"]))
+        if old is None:
+            continue
+        ratio = row["wall_seconds"] / old["wall_seconds"] if old["wall_seconds"] else float("nan")
+        delta = row["gap_percent"] - old["gap_percent"]
+        print(f"{row['instance']:>16} {row['strategy']:>22} {ratio:>8.2f} {delta:>+10.2f}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> dict:
+    instances = [
+        synthetic_instance(family, n, args.seed)
+        for family in args.families.split(",")
+        for n in (int(size) for size in args.sizes.split(","))
+    ]
+    if not args.no_reference:
+        instances += [grid_instance(10), grid_instance(20), circle_instance(100)]
+    instances += [read_tsplib(Path(path)) for path in args.tsplib]
+
+    strategies = args.strategies.split(",") if args.strategies else list(STRATEGIES)
+    results = []
+    for instance in instances:
+        for strategy in strategies:
+            row = run_strategy(instance, strategy, args.budget)
+            results.append(row)
+            print(
+                f"{row['instance']:>16} {strategy:>22} {row['wall_seconds']:>9.3f}s "
+                f"{row['peak_memory_mb']:>8.1f}MB {row['length']:>14.1f}",
+                flush=True,
+            )
+        instance["dist"] = None  # Free large matrices as we go
+    add_gaps(results, instances)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time_budget_seconds": args.budget,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--families", default=",".join(GENERATORS))
+    parser.add_argument("--strategies", default=None, help=f"subset of {', '.join(STRATEGIES)}")
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET_SECONDS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tsplib", nargs="*", default=[], help="TSPLIB .tsp files to include")
+    parser.add_argument("--no-reference", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="earlier --output file")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.compare:
+        compare(report["results"], args.compare)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,84 @@
+# Local OSRM stand-in serving /table/v1/driving and /route/v1/driving from
+# haversine estimates.
+# Mirrors the public server's table size cap and can inject failures so the
+# tiled fetch and its retries can be exercised without network access.
+#
+#   uvicorn benchmarks.osrm_standin:app --port 5005
+#   OSRM_BASE_URL=http://127.0.0.1:5005 OSRM_MAX_TABLE_SIZE=100 ...
+#
+# STANDIN_MAX_TABLE_SIZE   reject tables with more coordinates (default 100)
+# STANDIN_FAILURE_RATE     fraction of requests answered with a 503 (default 0)
+
+import os
+import random
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+from app.services.distance_matrix import haversine_matrix
+
+STANDIN_MAX_TABLE_SIZE = int(os.getenv("STANDIN_MAX_TABLE_SIZE", "100"))
+STANDIN_FAILURE_RATE = float(os.getenv("STANDIN_FAILURE_RATE", "0"))
+STANDIN_SPEED_MPH = 32
+
+app = FastAPI(title="OSRM stand-in")
+stats = {"requests": 0, "failures": 0, "too_big": 0}
+
+
+def _indices(value: str | None, n: int) -> list[int]:
+    if value is None or value == "all":
+        return list(range(n))
+    return [int(part) for part in value.split(";")]
+
+
+@app.get("/table/v1/driving/{coordinates}")
+def table(
+    coordinates: str,
+    sources: str | None = Query(None),
+    destinations: str | None = Query(None),
+    annotations: str = Query("duration"),
+):
+    stats["requests"] += 1
+    coords = [tuple(map(float, pair.split(","))) for pair in coordinates.split(";")]
+
+    if len(coords) > STANDIN_MAX_TABLE_SIZE:
+        stats["too_big"] += 1
+        return JSONResponse(
+            {"code": "TooBig", "message": "Too many table coordinates"}, status_code=400
+        )
+    if random.random() < STANDIN_FAILURE_RATE:
+        stats["failures"] += 1
+        return JSONResponse({"code": "Unavailable"}, status_code=503)
+
+    matrix = haversine_matrix(coords, STANDIN_SPEED_MPH)
+    rows = _indices(sources, len(coords))
+    cols = _indices(destinations, len(coords))
+    body = {"code": "Ok"}
+    if "distance" in annotations:
+        body["distances"] = [[matrix["distances"][r][c] for c in cols] for r in rows]
+    if "duration" in annotations:
+        body["durations"] = [[matrix["durations"][r][c] for c in cols] for r in rows]
+    return body
+
+
+@app.get("/route/v1/driving/{coordinates}")
+def route(coordinates: str):
+    stats["requests"] += 1
+    coords = [tuple(map(float, pair.split(","))) for pair in coordinates.split(";")]
+    matrix = haversine_matrix(coords, STANDIN_SPEED_MPH)
+    legs = range(len(coords) - 1)
+    return {
+        "code": "Ok",
+        "routes": [
+            {
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in coords]},
+                "distance": sum(matrix["distances"][i][i + 1] for i in legs),
+                "duration": sum(matrix["durations"][i][i + 1] for i in legs),
+            }
+        ],
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
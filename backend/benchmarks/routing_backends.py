@@ -0,0 +1,68 @@
+# Benchmark: matrix latency and route quality for every routing backend
+# Run from backend/: python -m benchmarks.routing_backends [--sizes 10,50,100]
+#
+# Each backend builds an uncached matrix for the same coordinates; the stop
+# order it produces is then re-costed on the reference backend's matrix, so
+# "distance vs ref" shows how much an approximate backend loses on real roads.
+# Point OSRM_BASE_URL / OSRM_LOCAL_BASE_URL at benchmarks.osrm_standin to run offline.
+
+import argparse
+import asyncio
+import time
+
+from app.services.http_clients import http_clients
+from app.services.local_search import path_cost, solve_stop_order
+from app.services.optimizer import MILES_PER_METER
+from app.services.routing_backends import routing_backends
+from benchmarks.haversine_matrix import random_coordinates
+
+REPEATS = 3
+
+
+async def timed_matrix(backend, coordinates) -> tuple[dict | None, float]:
+    everything = list(range(len(coordinates)))
+    best, matrix = float("inf"), None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        matrix = await backend.matrix(coordinates, everything, everything)
+        best = min(best, time.perf_counter() - start)
+        if matrix is None:
+            break
+    return matrix, best
+
+
+async def run(sizes: list[int], reference: str):
+    print(
+        f"{'n':>5} {'backend':>11} {'matrix (ms)':>12} {'route (mi)':>11} "
+        f"{'distance vs ref':>16}"
+    )
+    for n in sizes:
+        coordinates = random_coordinates(n + 1)
+        results = {}
+        for name, backend in routing_backends.items():
+            results[name] = await timed_matrix(backend, coordinates)
+
+        ref_matrix = results.get(reference, (None, 0))[0]
+        for name, (matrix, elapsed) in results.items():
+            if matrix is None:
+                print(f"{n:>5} {name:>11} {'unavailable':>12}")
+                continue
+            order, _, cost = solve_stop_order(matrix["distances"], 0.2)
+            versus = "-"
+            if ref_matrix is not None:
+                ref_cost = path_cost([0] + order, ref_matrix["distances"])
+                ref_best = solve_stop_order(ref_matrix["distances"], 0.2)[2]
+                versus = f"{(ref_cost / ref_best - 1) * 100:+.1f}%"
+            print(
+                f"{n:>5} {name:>11} {elapsed * 1000:>12.1f} "
+                f"{cost * MILES_PER_METER:>11.1f} {versus:>16}"
+            )
+    await http_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,50,100")
+    parser.add_argument("--reference", default="osrm")
+    args = parser.parse_args()
+    asyncio.run(run([int(n) for n in args.sizes.split(",")], args.reference))
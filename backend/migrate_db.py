@@ -4,6 +4,8 @@
 from app.db.database import engine, Base
 from app.models.user import User
 from app.models.produce import ProduceInventory, ProduceRequest, DeliveryRoute, DeliveryStop
+from app.models.geocode import GeocodeCacheEntry
+from app.models.travel_matrix import TravelLeg
 
 def create_tables():
     """Create all new tables"""
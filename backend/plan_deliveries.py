@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Plan one day's delivery routes for every seller with accepted requests on that day
+# Usage: python plan_deliveries.py 2025-07-28T08:00:00+00:00 [--seller-id 3 --seller-id 7]
+#        [--max-stops 25] [--vehicle-capacity 500]
+#
+# Each seller departs from their latest route's pickup point, or a geocoded inventory
+# location if they have no routes yet.
+
+import argparse
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.db.database import AsyncSessionLocal, async_engine
+from app.models.produce import DeliveryStop, ProduceRequest
+from app.services.daily_planner import (
+    DAILY_PLAN_MAX_STOPS,
+    as_utc,
+    day_bounds,
+    plan_deliveries,
+    seller_depots,
+)
+from app.services.geocode import flush_geocode_hits
+from app.services.http_clients import http_clients
+from app.services.solver_pool import solver_pool
+
+
+async def run(delivery_date: datetime, seller_ids: list[int], max_stops: int, capacity: float | None):
+    db = AsyncSessionLocal()
+    try:
+        if not seller_ids:
+            day_start, day_end = day_bounds(delivery_date)
+            seller_ids = list(await db.scalars(select(ProduceRequest.assigned_seller_id).where(
+                ProduceRequest.status == "accepted",
+                ProduceRequest.assigned_seller_id.isnot(None),
+                ProduceRequest.delivery_window_start >= day_start,
+                ProduceRequest.delivery_window_start < day_end
+            ).distinct()))
+        depots = await seller_depots(db, seller_ids)
+        for seller_id in sorted(set(seller_ids) - set(depots)):
+            print(f"Skipping seller {seller_id}: no geocoded pickup or inventory location")
+
+        await solver_pool.start()
+        plan = await plan_deliveries(db, delivery_date, depots, max_stops=max_stops, capacity=capacity)
+        stops = await db.scalar(select(func.count(DeliveryStop.id)).where(
+            DeliveryStop.route_id.in_([route.id for route in plan["routes"]])
+        ))
+        print(f"Created {len(plan['routes'])} routes with {stops} stops for {len(depots)} sellers")
+        if plan["unscheduled_request_ids"]:
+            print(f"Unscheduled requests: {plan['unscheduled_request_ids']}")
+        if plan["ungeocoded_request_ids"]:
+            print(f"Could not geocode requests: {plan['ungeocoded_request_ids']}")
+        if plan["failed_request_ids"]:
+            print(f"Optimization failed, re-run to plan requests: {plan['failed_request_ids']}")
+    finally:
+        await flush_geocode_hits()
+        await db.close()
+        await async_engine.dispose()
+        await solver_pool.close()
+        await http_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("delivery_date", type=datetime.fromisoformat)
+    parser.add_argument("--seller-id", type=int, action="append", default=[])
+    parser.add_argument("--max-stops", type=int, default=DAILY_PLAN_MAX_STOPS)
+    parser.add_argument("--vehicle-capacity", type=float, default=None)
+    args = parser.parse_args()
+    asyncio.run(run(as_utc(args.delivery_date), args.seller_id, args.max_stops, args.vehicle_capacity))
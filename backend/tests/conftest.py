@@ -0,0 +1,4 @@
+import os
+
+# Service modules create their engines at import; unit tests never connect
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.daily_planner import day_bounds, sweep_clusters
+
+DEPOT = (-85.67, 42.96)
+LOCATIONS = [(-85.6, 43.0), (-85.7, 42.9), (-85.65, 43.05), (-85.75, 42.95)]
+
+
+def test_day_bounds_reads_naive_date_as_utc():
+    day_start, day_end = day_bounds(datetime(2026, 10, 18, 8, 30))
+
+    assert day_start == datetime(2026, 10, 18, tzinfo=timezone.utc)
+    assert day_end - day_start == timedelta(days=1)
+
+
+# DailyPlanCreate accepts a naive delivery_date while stored windows are aware
+def test_sweep_clusters_naive_date_aware_windows():
+    day_start, _ = day_bounds(datetime(2026, 10, 18))
+    morning = datetime(2026, 10, 18, 8, tzinfo=timezone.utc)
+    window_starts = [morning, morning, morning + timedelta(hours=6), morning + timedelta(hours=6)]
+
+    clusters = sweep_clusters(DEPOT, LOCATIONS, [10.0] * 4, window_starts, day_start, band_hours=4)
+
+    assert sorted(sorted(cluster) for cluster in clusters) == [[0, 1], [2, 3]]
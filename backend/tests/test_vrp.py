@@ -0,0 +1,34 @@
+import math
+import random
+
+import pytest
+
+from app.services.vrp import solve_cvrp
+
+
+def random_instance(stops: int, slack: float, seed: int):
+    """Stops on a 50 km square; three trucks with `slack` spare capacity in total."""
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 50), rng.uniform(0, 50)) for _ in range(stops + 1)]
+    dist_matrix = [[math.dist(a, b) for b in points] for a in points]
+    demands = [0.0] + [rng.uniform(5, 40) for _ in range(stops)]
+    capacity = sum(demands) / 3 * (1 + slack)
+    return dist_matrix, demands, capacity
+
+
+# Savings routes used to be merged only whole, which rejected these as not fitting
+@pytest.mark.parametrize("stops", [20, 50, 100])
+@pytest.mark.parametrize("seed", range(10))
+def test_tight_fleet_fits(stops, seed):
+    dist_matrix, demands, capacity = random_instance(stops, 0.1, seed)
+    routes = solve_cvrp(dist_matrix, demands, 3, capacity, 0.05)
+
+    assert len(routes) <= 3
+    assert sorted(stop for route in routes for stop in route) == list(range(1, stops + 1))
+    assert all(sum(demands[stop] for stop in route) <= capacity for route in routes)
+
+
+def test_fleet_too_small():
+    dist_matrix, demands, capacity = random_instance(20, 0.1, 0)
+    with pytest.raises(ValueError):
+        solve_cvrp(dist_matrix, demands, 2, capacity, 0.05)